@@ -0,0 +1,34 @@
+"""
+Линейные коды светового канала, общие для MinBackend (кодирование) и
+клиента ESP32 (декодирование сырых отсчётов датчика на хосте), и кадр,
+в котором MinBackend передаёт символы прошивке Arduino.
+
+    morse  — прежний код Морзе, A-Z и пробел; его декодирует и прошивка ESP32
+    prefix — троичный код Хаффмана по байтам UTF-8 с контрольной суммой
+    base3  — 6 символов на байт, для сравнения
+
+Передатчик и приёмник должны использовать один и тот же код.
+"""
+from .base import GREEN, START_SEQUENCE, SYMBOLS, DecodedText, LineCodec
+from .frame import FRAME_START, MAX_FRAME_SYMBOLS, frame_size, pack_frame, unpack_frame
+from .morse import MORSE_CODES, MorseCodec, clean_text, decode_morse_sequence, text_to_symbols
+from .prefix import PrefixCodec, fixed_length_codes, ternary_huffman_codes, text_weights
+
+DEFAULT_CODEC = "morse"
+
+CODECS = {
+    codec.name: codec
+    for codec in (
+        MorseCodec(),
+        PrefixCodec("prefix", ternary_huffman_codes(text_weights())),
+        PrefixCodec("base3", fixed_length_codes()),
+    )
+}
+
+
+def get_codec(name=DEFAULT_CODEC):
+    """Кодек по имени; ValueError для неизвестного"""
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown line codec {name!r}, expected one of: {', '.join(CODECS)}") from None
@@ -0,0 +1,47 @@
+"""Общая часть линейных кодов: символы линии и интерфейс кодека"""
+from dataclasses import dataclass, field
+
+# Символы линии: 1 — красный, 2 — синий, 3 — зелёный. 0 (нет света) в кодах не
+# используется: его не отличить от пропавшего сигнала
+SYMBOLS = "123"
+GREEN = "3"
+# Граница сообщения у всех кодов: приёмник (и прошивка ESP32) считает серию
+# из трёх и более зелёных началом следующего сообщения
+START_SEQUENCE = "333"
+
+
+@dataclass(frozen=True)
+class DecodedText:
+    """Результат декодирования тела сообщения (символы между двумя START_SEQUENCE)
+
+    units — пары (код, знак) в порядке передачи; unknown — сколько из них не
+    распознано. valid=False, если тело заведомо повреждено (не сошлась
+    контрольная сумма), и текст доверия не заслуживает.
+    """
+    text: str
+    units: list = field(default_factory=list)
+    unknown: int = 0
+    valid: bool = True
+
+
+class LineCodec:
+    """Линейный код: текст <-> последовательность символов 1/2/3
+
+    encode возвращает всё, что передатчик зажигает за одно сообщение,
+    начиная с START_SEQUENCE; decode получает тело без неё.
+    """
+
+    name = ""
+
+    def clean(self, text):
+        """Текст в том виде, в каком он будет передан (лишнее отбрасывается)"""
+        return text.strip()
+
+    def encode(self, text):
+        raise NotImplementedError
+
+    def decode(self, body):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name!r}>"
@@ -0,0 +1,55 @@
+"""
+Кадр передатчика: готовая последовательность символов для прошивки Arduino
+
+    0x02 | число символов (uint16 LE) | символы по 2 бита, 4 в байте | XOR байтов после 0x02
+
+Символ i лежит в битах 2*(i%4) байта i/4. Собирает кадр MinBackend, разбирает
+эмулятор передатчика; формат тот же, что в sketch_arduino.ino.
+"""
+from itertools import product
+
+FRAME_START = 0x02
+# Весь кадр должен поместиться в 64-байтный приёмный буфер Arduino, пока
+# прошивка держит цвет: 4 байта заголовка и контрольной суммы + 56 байт символов
+MAX_FRAME_SYMBOLS = 224
+
+# Четыре символа (с дополнением '0') -> байт кадра; символ i в битах 2*(i%4)
+_PACK_TABLE = {
+    "".join(group): sum(int(symbol) << (2 * i) for i, symbol in enumerate(group))
+    for group in product("0123", repeat=4)
+}
+
+
+def frame_size(count):
+    """Длина кадра в байтах для count символов"""
+    return 3 + (count + 3) // 4 + 1
+
+
+def pack_frame(symbols):
+    """Кадр передатчика для последовательности символов"""
+    if len(symbols) > MAX_FRAME_SYMBOLS:
+        raise ValueError(f"{len(symbols)} symbols, at most {MAX_FRAME_SYMBOLS} fit in a frame")
+    padded = symbols + "0" * (-len(symbols) % 4)
+    body = len(symbols).to_bytes(2, "little") + bytes(
+        _PACK_TABLE[padded[i:i + 4]] for i in range(0, len(padded), 4)
+    )
+    checksum = 0
+    for byte in body:
+        checksum ^= byte
+    return bytes((FRAME_START,)) + body + bytes((checksum,))
+
+
+def unpack_frame(frame):
+    """Символы из кадра (обратное pack_frame); ValueError, если кадр повреждён"""
+    if len(frame) < 4 or frame[0] != FRAME_START:
+        raise ValueError("not a frame")
+    count = int.from_bytes(frame[1:3], "little")
+    if count == 0 or count > MAX_FRAME_SYMBOLS or len(frame) != frame_size(count):
+        raise ValueError("corrupted frame length")
+    checksum = 0
+    for byte in frame[1:-1]:
+        checksum ^= byte
+    if checksum != frame[-1]:
+        raise ValueError("corrupted frame checksum")
+    payload = frame[3:-1]
+    return "".join(str((payload[i // 4] >> (2 * (i % 4))) & 3) for i in range(count))
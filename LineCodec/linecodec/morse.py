@@ -0,0 +1,79 @@
+"""
+Код Морзе цветами, как в sketch_arduino.ino и sketch_esp32.ino.
+
+Точка — красный, тире — синий, буквы разделяются одним зелёным, пробел —
+«2222». Поддерживаются только A-Z и пробел. Буква перед пробелом от него не
+отделяется, поэтому, например, «O W» неоднозначно и декодируется как «?».
+Этот код понимает декодер на плате ESP32, остальные — только хост.
+"""
+from functools import lru_cache
+
+from .base import START_SEQUENCE, DecodedText, LineCodec
+
+# Таблица из sketch_arduino.ino: 1 — красный, 2 — синий
+MORSE_CODES = {
+    'A': "12", 'B': "2111", 'C': "2121", 'D': "211", 'E': "1",
+    'F': "1121", 'G': "221", 'H': "1111", 'I': "11", 'J': "1222",
+    'K': "212", 'L': "1211", 'M': "22", 'N': "21", 'O': "222",
+    'P': "1221", 'Q': "2212", 'R': "121", 'S': "111", 'T': "2",
+    'U': "112", 'V': "1112", 'W': "122", 'X': "2112", 'Y': "2122", 'Z': "2211",
+    ' ': "2222",
+}
+MORSE_LETTERS = {code: letter for letter, code in MORSE_CODES.items() if letter != ' '}
+LETTER_SEPARATOR = "3"
+WORD_SEPARATOR = MORSE_CODES[' ']
+
+
+def clean_text(text):
+    """Фильтр ввода прошивки: только A-Z и пробел"""
+    return "".join(c for c in text.upper() if 'A' <= c <= 'Z' or c == ' ').strip()
+
+
+@lru_cache(maxsize=4096)
+def text_to_symbols(text):
+    """textToMorseCode из sketch_arduino.ino: '333', коды букв, '3' между буквами слова"""
+    text = text.upper()
+    parts = [START_SEQUENCE]
+    last = len(text) - 1
+    for i, c in enumerate(text):
+        code = MORSE_CODES.get(c)
+        if code:
+            parts.append(code)
+            if c != ' ' and i < last and text[i + 1] != ' ':
+                parts.append(LETTER_SEPARATOR)
+    return "".join(parts)
+
+
+def decode_morse_sequence(symbols):
+    """decodeMorseSequence из sketch_esp32.ino
+
+    Буквы разделены «3», слова — «2222» (берётся самое левое вхождение).
+    Возвращает (текст, список (код, буква)); нераспознанные буквы — '?'.
+    """
+    letters = []
+    words = []
+    for word_part in symbols.split(WORD_SEPARATOR):
+        word = []
+        for code in word_part.split(LETTER_SEPARATOR):
+            if not code:
+                continue
+            letter = MORSE_LETTERS.get(code, "?")
+            letters.append((code, letter))
+            word.append(letter)
+        words.append("".join(word))
+    return " ".join(words), letters
+
+
+class MorseCodec(LineCodec):
+    name = "morse"
+
+    def clean(self, text):
+        return clean_text(text)
+
+    def encode(self, text):
+        return text_to_symbols(text)
+
+    def decode(self, body):
+        text, letters = decode_morse_sequence(body)
+        unknown = sum(1 for _, letter in letters if letter == "?")
+        return DecodedText(text, letters, unknown)
@@ -0,0 +1,221 @@
+"""
+Байтовые коды: любой текст в UTF-8, каждый байт — кодовое слово из символов 1/2/3.
+
+Кодовая таблица префиксная, так что слова идут подряд без разделителей.
+«prefix» — троичный код Хаффмана по частотам байтов обычного текста: частые
+буквы занимают 2–3 символа, редкие байты длиннее. «base3» — по 6 символов на
+любой байт, для сравнения.
+
+Тело сообщения после START_SEQUENCE:
+
+    H (символ 1/2 и k троичных разрядов) | кодовые слова байтов | T (символ 1/2)
+
+H и T вместе — контрольная сумма (CRC32 байтов по модулю 2·3^k·2):
+повреждённое тело отбрасывается, а передатчик всё равно повторит сообщение.
+Разрядов тем больше, чем длиннее тело (CHECK_DIGITS, от 3 до 5, то есть от 108
+до 972 значений); приёмник узнаёт k по длине тела. Если после двух зелёных
+подряд идёт не синий, перед ним вставляется лишний красный, поэтому в теле нет
+серии из трёх зелёных, а первый и последний символы тела не зелёные, так что
+оно не сливается с START_SEQUENCE (и с простоем передатчика, который датчик
+без калибровки видит зелёным).
+"""
+import heapq
+import zlib
+from functools import lru_cache
+
+from .base import GREEN, START_SEQUENCE, SYMBOLS, DecodedText, LineCodec
+
+# После двух зелёных синий идёт как есть, а перед красным и зелёным вставляется
+# STUFFING: синий следует за парой зелёных чаще всего
+STUFFING = "1"
+UNSTUFFED = "2"
+# Троичных разрядов в H по числу символов кодовых слов тела: длинное тело чаще
+# повреждается, и ему нужна сумма шире, а короткому хватает узкой
+CHECK_DIGITS = ((30, 3), (90, 4))
+MAX_CHECK_DIGITS = 5
+# Во сколько раз заглавная буква весит больше строчной
+UPPER_CASE_WEIGHT = 32
+
+# Относительные частоты заглавных английских букв, ‰
+LETTER_FREQUENCY = {
+    'E': 127, 'T': 91, 'A': 82, 'O': 75, 'I': 70, 'N': 67, 'S': 63, 'H': 61,
+    'R': 60, 'D': 43, 'L': 40, 'C': 28, 'U': 28, 'M': 24, 'W': 24, 'F': 22,
+    'G': 20, 'Y': 20, 'P': 19, 'B': 15, 'V': 10, 'K': 8, 'J': 2, 'X': 2,
+    'Q': 1, 'Z': 1,
+}
+# Пробел в той же шкале: около 19% знаков обычного текста
+SPACE_FREQUENCY = 235
+
+
+def text_weights():
+    """Вес каждого байта 0..255 для кода «prefix»
+
+    Сообщения до сих пор шли заглавными (Морзе иначе не умел), поэтому
+    заглавные буквы и пробел весят в UPPER_CASE_WEIGHT раз больше строчных.
+    Ведущие байты кириллицы в UTF-8 (0xD0, 0xD1) и байты продолжения тоже в
+    таблице; у любого байта вес не меньше 1, так что кодируется всё.
+    """
+    weights = [1] * 256
+    for letter, frequency in LETTER_FREQUENCY.items():
+        weights[ord(letter)] = frequency * UPPER_CASE_WEIGHT
+        weights[ord(letter.lower())] = max(frequency, 1)
+    weights[ord(' ')] = SPACE_FREQUENCY * UPPER_CASE_WEIGHT
+    for c in "0123456789.,!?-:'\"()":
+        weights[ord(c)] = 10
+    weights[0xD0] = weights[0xD1] = 60
+    for byte in range(0x80, 0xC0):
+        weights[byte] = 2
+    return weights
+
+
+def ternary_huffman_codes(weights):
+    """Троичный код Хаффмана: байт -> кодовое слово из 1/2/3
+
+    Самая тяжёлая ветвь каждого узла получает «1», самая лёгкая — «3»:
+    зелёный реже всех, и вставок после «33» почти не бывает.
+    """
+    order = 0
+    heap = []
+    for byte, weight in enumerate(weights):
+        heap.append((weight, order, byte))
+        order += 1
+    # Каждое слияние убирает два узла: число листьев должно быть нечётным
+    if len(heap) % 2 == 0:
+        heap.append((0, order, None))
+        order += 1
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        lightest, middle, heaviest = (heapq.heappop(heap) for _ in range(3))
+        node = [heaviest[2], middle[2], lightest[2]]
+        heapq.heappush(heap, (lightest[0] + middle[0] + heaviest[0], order, node))
+        order += 1
+
+    codes = {}
+    stack = [(heap[0][2], "")]
+    while stack:
+        node, code = stack.pop()
+        if isinstance(node, list):
+            for digit, child in zip(SYMBOLS, node):
+                stack.append((child, code + digit))
+        elif node is not None:
+            codes[node] = code
+    return codes
+
+
+def fixed_length_codes(length=6):
+    """Каждый байт — length троичных разрядов (3**6 = 729 >= 256)"""
+    return {byte: _trits(byte, length) for byte in range(256)}
+
+
+def _trits(value, length):
+    digits = []
+    for _ in range(length):
+        value, digit = divmod(value, 3)
+        digits.append(SYMBOLS[digit])
+    return "".join(reversed(digits))
+
+
+def stuff(symbols):
+    """Вставить STUFFING после пары зелёных, если за ней идёт не UNSTUFFED"""
+    out = []
+    run = 0
+    for symbol in symbols:
+        if run == 2:
+            if symbol != UNSTUFFED:
+                out.append(STUFFING)
+            run = 0
+        out.append(symbol)
+        run = run + 1 if symbol == GREEN else 0
+    return "".join(out)
+
+
+def unstuff(symbols):
+    """Обратное stuff; None, если после пары зелёных идёт то, чего stuff не пишет"""
+    out = []
+    run = 0
+    escaped = False
+    for symbol in symbols:
+        if escaped:
+            # После STUFFING — любой символ, кроме того, что обходится без него
+            if symbol == UNSTUFFED:
+                return None
+            escaped = False
+        elif run == 2:
+            run = 0
+            if symbol == STUFFING:
+                escaped = True
+                continue
+            if symbol != UNSTUFFED:
+                return None
+        out.append(symbol)
+        run = run + 1 if symbol == GREEN else 0
+    if escaped:
+        return None
+    return "".join(out)
+
+
+def check_digits(payload_length):
+    """Число троичных разрядов H для тела с payload_length символами кодовых слов"""
+    for limit, digits in CHECK_DIGITS:
+        if payload_length <= limit:
+            return digits
+    return MAX_CHECK_DIGITS
+
+
+def body_check_digits(length):
+    """
+    Число разрядов H по длине всего тела (H, кодовые слова, T); None, если
+    тело такой длины не собрать. check_digits не убывает, поэтому подходит
+    не больше одного варианта
+    """
+    for digits in range(CHECK_DIGITS[0][1], MAX_CHECK_DIGITS + 1):
+        payload_length = length - digits - 2
+        if payload_length >= 0 and check_digits(payload_length) == digits:
+            return digits
+    return None
+
+
+def checksum_symbols(data, digits):
+    """(H, T) для байтов сообщения: CRC32 по модулю 2 * 3**digits * 2"""
+    value, trits = divmod(zlib.crc32(data) % (2 * 3 ** digits * 2), 3 ** digits)
+    tail, head = divmod(value, 2)
+    return SYMBOLS[head] + _trits(trits, digits), SYMBOLS[tail]
+
+
+class PrefixCodec(LineCodec):
+    def __init__(self, name, codes):
+        self.name = name
+        self.codes = dict(codes)
+        self.bytes_by_code = {code: byte for byte, code in self.codes.items()}
+        self.max_code_length = max(len(code) for code in self.codes.values())
+        self.encode = lru_cache(maxsize=4096)(self._encode)
+
+    def _encode(self, text):
+        data = text.encode("utf-8")
+        payload = "".join(self.codes[byte] for byte in data)
+        head, tail = checksum_symbols(data, check_digits(len(payload)))
+        return START_SEQUENCE + stuff(head + payload + tail)
+
+    def decode(self, body):
+        symbols = unstuff(body)
+        digits = body_check_digits(len(symbols)) if symbols is not None else None
+        if digits is None or symbols[0] == GREEN or symbols[-1] == GREEN:
+            return DecodedText("", [], 1, valid=False)
+
+        head_length = 1 + digits
+        units = []
+        code = ""
+        for symbol in symbols[head_length:-1]:
+            code += symbol
+            byte = self.bytes_by_code.get(code)
+            if byte is not None:
+                units.append((code, byte))
+                code = ""
+            elif len(code) >= self.max_code_length:
+                break
+        data = bytes(byte for _, byte in units)
+        text = data.decode("utf-8", errors="replace")
+        valid = not code and (symbols[:head_length], symbols[-1]) == checksum_symbols(data, digits)
+        if not valid:
+            return DecodedText(text, units, max(len(units), 1), valid=False)
+        return DecodedText(text, units)
@@ -0,0 +1,257 @@
+"""
+Сравнение линейных кодов светового канала на смоделированных или записанных трассах.
+
+Моделируется то, что видит датчик в режиме RAW_SAMPLES: передатчик зажигает
+символы кода по DOT_DURATION, приёмник берёт отсчёт каждые SAMPLE_INTERVAL
+со случайной фазой. Искажения:
+
+    noise  — разброс каналов r/g/b отсчёта (доля, как у VirtualEsp32)
+    drift  — расхождение часов передатчика и приёмника (0.02 — точка на 2% длиннее)
+    glitch — доля отсчётов, с которых начинается помеха: GLITCH_SAMPLES отсчётов
+             подряд случайного цвета (блики, посторонний свет); одиночные
+             выбросы декодер и так отбрасывает как дребезг
+
+Отсчёты декодирует LineStreamDecoder клиента, так что сравниваются коды
+вместе с настоящим декодером. Тексты приводятся к алфавиту Морзе (A-Z и
+пробел), чтобы все коды передавали одно и то же.
+
+    python codec_bench.py
+    python codec_bench.py --codecs morse prefix --glitch 0 0.01 0.03 --output bench.json
+
+Записанная трасса: строки SAMPLE: с ESP32 (RAW_SAMPLES), пока передатчик
+повторяет известные сообщения:
+
+    python codec_bench.py --trace samples.log --codecs prefix --expect "HELLO" --expect "WORLD"
+
+Отчёт по каждому коду и условию: символов на знак, знаков в секунду в эфире
+(всего и доставленных верно), доли сообщений верных, искажённых (неверный
+текст дошёл бы до сервера), отброшенных по контрольной сумме и потерянных,
+доля ошибочных знаков среди принятых.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Кодеки и декодер клиента берутся из дерева, без установки
+sys.path.insert(0, os.path.join(ROOT, "LineCodec"))
+sys.path.insert(0, os.path.join(ROOT, "SoftEsp32", "Client"))
+
+from linecodec import CODECS, START_SEQUENCE, get_codec
+from decoder import LineStreamDecoder
+
+from devices import COLOR_RGB, VirtualArduino, VirtualEsp32
+
+DOT_MS = VirtualArduino.DOT_DURATION
+SAMPLE_MS = VirtualEsp32.SAMPLE_INTERVAL
+GLITCH_SAMPLES = 8
+
+CORPUS = [
+    "HELLO WORLD",
+    "MSG AB",
+    "THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG",
+    "LIGHT LINK TEST",
+    "SENSOR READY",
+    "ROOM TEMPERATURE IS NORMAL",
+    "OPEN THE DOOR",
+    "SEND MORE DATA",
+    "ALL SYSTEMS GO",
+    "WHERE IS THE NEXT STATION",
+    "ZEBRA QUIZ JAVA",
+    "STATUS OK",
+]
+
+
+def edit_distance(a, b):
+    """Расстояние Левенштейна между строками"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def simulate_samples(symbols, noise, drift, glitch, rng):
+    """Отсчёты датчика для последовательности символов: (times[N] мс, rgbc[N×4])"""
+    dot = DOT_MS * (1 + drift)
+    colors = np.array([int(symbol) for symbol in symbols], dtype=np.int64)
+    times = np.arange(rng.uniform(0, SAMPLE_MS), len(colors) * dot, SAMPLE_MS)
+    sampled = colors[np.minimum((times // dot).astype(np.int64), len(colors) - 1)]
+    for start in np.flatnonzero(rng.random(len(sampled)) < glitch):
+        sampled[start:start + GLITCH_SAMPLES] = rng.integers(0, 4)
+    levels = np.array([COLOR_RGB[color] for color in range(4)], dtype=np.float64)
+    rgb = levels[sampled] * rng.uniform(1 - noise, 1 + noise, (len(sampled), 3))
+    rgb = rgb.astype(np.int64).astype(np.float64)
+    return times, np.column_stack((rgb, rgb.sum(axis=1)))
+
+
+def decode_samples(codec, times, rgbc, chunk=4096):
+    """Прогнать отсчёты через декодер клиента; список DecodedMessage"""
+    messages = []
+    decoder = LineStreamDecoder(messages.append, dot_ms=DOT_MS, codec=codec)
+    for start in range(0, len(times), chunk):
+        decoder.feed_samples(times[start:start + chunk], rgbc[start:start + chunk])
+    return messages
+
+
+def summarize(sent_chars, air_time_ms, symbols, correct, correct_chars, wrong, rejected, missing,
+              char_errors, accepted_chars):
+    total = correct + wrong + rejected + missing
+    air_s = air_time_ms / 1000.0
+    return {
+        "messages": total,
+        "symbols_per_char": round(symbols / max(sent_chars, 1), 3),
+        "chars_per_s": round(sent_chars / air_s, 4) if air_s else 0.0,
+        "good_chars_per_s": round(correct_chars / air_s, 4) if air_s else 0.0,
+        "correct": round(correct / max(total, 1), 4),
+        "garbled": round(wrong / max(total, 1), 4),
+        "rejected": round(rejected / max(total, 1), 4),
+        "lost": round(missing / max(total, 1), 4),
+        "char_error_rate": round(char_errors / max(accepted_chars, 1), 4),
+    }
+
+
+def run_simulated(codec, texts, noise, drift, glitch, seed):
+    rng = np.random.default_rng(seed)
+    encoded = [codec.encode(text) for text in texts]
+    # Завершающая START_SEQUENCE закрывает последнее сообщение; декодер
+    # закрывает участок, когда начинается следующий, поэтому после неё ещё два символа
+    stream = "".join(encoded) + START_SEQUENCE
+    times, rgbc = simulate_samples(stream + "12", noise, drift, glitch, rng)
+    decoded = decode_samples(codec, times, rgbc)
+
+    # Тело каждого сообщения в эфире: [начало, конец) в мс приёмника
+    dot = DOT_MS * (1 + drift)
+    bodies = []
+    position = 0
+    for symbols in encoded:
+        bodies.append(((position + len(START_SEQUENCE)) * dot, (position + len(symbols)) * dot))
+        position += len(symbols)
+
+    results = [None] * len(texts)
+    for message in decoded:
+        middle = (message.started_at + message.ended_at) / 2
+        for i, (start, end) in enumerate(bodies):
+            if start <= middle < end and results[i] is None:
+                results[i] = message
+                break
+
+    correct = correct_chars = wrong = rejected = missing = char_errors = accepted_chars = 0
+    for text, message in zip(texts, results):
+        if message is None:
+            missing += 1
+        elif not message.valid:
+            rejected += 1
+        else:
+            accepted_chars += len(text)
+            char_errors += edit_distance(text, message.text)
+            if message.text == text:
+                correct += 1
+                correct_chars += len(text)
+            else:
+                wrong += 1
+    symbols = len(stream) - len(START_SEQUENCE)
+    return summarize(sum(map(len, texts)), symbols * DOT_MS, symbols,
+                     correct, correct_chars, wrong, rejected, missing, char_errors, accepted_chars)
+
+
+def read_trace(path):
+    """Отсчёты из лога ESP32 в режиме RAW_SAMPLES"""
+    samples = []
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("SAMPLE:"):
+                try:
+                    samples.append([int(value) for value in line[len("SAMPLE:"):].split(",")])
+                except ValueError:
+                    continue
+    if not samples:
+        raise SystemExit(f"В {path} нет строк SAMPLE:")
+    samples = np.array(samples, dtype=np.float64)
+    return samples[:, 0], samples[:, 1:5]
+
+
+def run_trace(codec, times, rgbc, expected):
+    """Записанная трасса: каждое сообщение сверяется с ближайшим из ожидаемых текстов"""
+    decoded = decode_samples(codec, times, rgbc)
+    expected = {codec.clean(text) for text in expected}
+    correct = correct_chars = wrong = rejected = char_errors = accepted_chars = sent_chars = 0
+    for message in decoded:
+        nearest = min(expected, key=lambda text: edit_distance(text, message.text))
+        sent_chars += len(nearest)
+        if not message.valid:
+            rejected += 1
+            continue
+        accepted_chars += len(nearest)
+        char_errors += edit_distance(nearest, message.text)
+        if message.text == nearest:
+            correct += 1
+            correct_chars += len(nearest)
+        else:
+            wrong += 1
+    symbols = sum(len(START_SEQUENCE) + len(message.symbols) for message in decoded)
+    return summarize(sent_chars, times[-1] - times[0], symbols,
+                     correct, correct_chars, wrong, rejected, 0, char_errors, accepted_chars)
+
+
+def print_table(rows):
+    columns = ["codec", "noise", "drift", "glitch", "symbols_per_char", "chars_per_s", "good_chars_per_s",
+               "correct", "garbled", "rejected", "lost", "char_error_rate"]
+    columns = [column for column in columns if any(column in row for row in rows)]
+    widths = [max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).rjust(width) for column, width in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение линейных кодов на трассах датчика")
+    parser.add_argument("--codecs", nargs="+", default=list(CODECS), choices=list(CODECS))
+    parser.add_argument("--noise", nargs="+", type=float, default=[0.05])
+    parser.add_argument("--drift", nargs="+", type=float, default=[0.0, 0.03])
+    parser.add_argument("--glitch", nargs="+", type=float, default=[0.0, 0.001, 0.003])
+    parser.add_argument("--repeat", type=int, default=10, help="сколько раз передать корпус в каждом условии")
+    parser.add_argument("--corpus", help="файл с текстами, по одному в строке (по умолчанию встроенный)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", help="лог ESP32 со строками SAMPLE: вместо моделирования")
+    parser.add_argument("--expect", action="append", default=[], help="ожидаемый текст в трассе (можно несколько)")
+    parser.add_argument("--output", help="файл для JSON отчёта")
+    args = parser.parse_args()
+
+    rows = []
+    if args.trace:
+        if not args.expect:
+            parser.error("для --trace нужен хотя бы один --expect")
+        times, rgbc = read_trace(args.trace)
+        for name in args.codecs:
+            rows.append({"codec": name, **run_trace(get_codec(name), times, rgbc, args.expect)})
+    else:
+        if args.corpus:
+            with open(args.corpus, encoding="utf-8") as f:
+                corpus = [line.strip() for line in f if line.strip()]
+        else:
+            corpus = CORPUS
+        morse = get_codec("morse")
+        texts = [text for text in (morse.clean(line) for line in corpus) if text] * args.repeat
+        random.Random(args.seed).shuffle(texts)
+        for noise, drift, glitch in itertools.product(args.noise, args.drift, args.glitch):
+            for name in args.codecs:
+                result = run_simulated(get_codec(name), texts, noise, drift, glitch, args.seed)
+                rows.append({"codec": name, "noise": noise, "drift": drift, "glitch": glitch, **result})
+
+    print_table(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(rows, indent=2, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Виртуальные устройства Li-Fi канала на псевдотерминалах (pty).
+
+VirtualArduino повторяет sketch_arduino.ino: очередь сообщений, кодирование
+в Морзе цветами и тайминг DOT_DURATION. VirtualEsp32 повторяет sketch_esp32.ino:
+READY, опрос датчика каждые READ_INTERVAL и строки MESSAGE:. Свет между ними —
+общая временная шкала LightChannel.
+
+Время виртуальное: time_scale — сколько реальных секунд длится одна
+виртуальная, так что при time_scale=0.002 точка в 500 мс занимает 1 мс.
+Датчик берёт отсчёты в точные виртуальные моменты, поэтому задержки потоков
+влияют только на задержку вывода, но не на результат декодирования.
+"""
+import bisect
+import collections
+import os
+import random
+import threading
+import time
+import tty
+
+from linecodec import FRAME_START, MAX_FRAME_SYMBOLS, START_SEQUENCE, frame_size, get_codec, unpack_frame
+
+# Таблица из sketch_arduino.ino
+MORSE_CODES = {
+    'A': "12", 'B': "2111", 'C': "2121", 'D': "211", 'E': "1",
+    'F': "1121", 'G': "221", 'H': "1111", 'I': "11", 'J': "1222",
+    'K': "212", 'L': "1211", 'M': "22", 'N': "21", 'O': "222",
+    'P': "1221", 'Q': "2212", 'R': "121", 'S': "111", 'T': "2",
+    'U': "112", 'V': "1112", 'W': "122", 'X': "2112", 'Y': "2122", 'Z': "2211",
+    ' ': "2222",
+}
+MORSE_LETTERS = {code: letter for letter, code in MORSE_CODES.items() if letter != ' '}
+
+# Условные сырые значения TCS34725 (r, g, b) для каждого цвета светодиода
+COLOR_RGB = {
+    0: (40, 45, 40),
+    1: (900, 180, 160),
+    2: (170, 260, 880),
+    3: (190, 820, 240),
+}
+
+
+def text_to_morse(text):
+    """textToMorseCode из sketch_arduino.ino"""
+    text = text.upper()
+    result = "333"
+    for i, c in enumerate(text):
+        code = MORSE_CODES.get(c, "")
+        if code:
+            result += code
+            if c != ' ' and i < len(text) - 1 and text[i + 1] != ' ':
+                result += "3"
+    return result
+
+
+def decode_morse_sequence(seq):
+    """decodeMorseSequence из sketch_esp32.ino"""
+    words = []
+    for word_part in seq.split("2222"):
+        letters = []
+        for code in word_part.split("3"):
+            if code:
+                letters.append(MORSE_LETTERS.get(code, '?'))
+        words.append("".join(letters))
+    return " ".join(words)
+
+
+def clean_input(text):
+    """Фильтр ввода передатчика: только A-Z и пробел"""
+    return "".join(c for c in text.upper() if 'A' <= c <= 'Z' or c == ' ')
+
+
+class VirtualClock:
+    """Виртуальное время в миллисекундах, идущее в 1/time_scale раз быстрее реального"""
+
+    def __init__(self, time_scale=1.0):
+        self.time_scale = time_scale
+        self._start = time.monotonic()
+
+    def now_ms(self):
+        return (time.monotonic() - self._start) * 1000.0 / self.time_scale
+
+    def to_real(self, virtual_ms):
+        return self._start + virtual_ms * self.time_scale / 1000.0
+
+    def sleep_until(self, virtual_ms, stop_event=None):
+        delay = self.to_real(virtual_ms) - time.monotonic()
+        if delay > 0:
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+class LightChannel:
+    """Временная шкала цвета светодиода: отрезки (начало, конец, цвет) в виртуальных мс"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._starts = []
+        self._segments = []
+
+    def schedule(self, start_ms, symbols, dot_ms):
+        """Запланировать символы подряд с момента start_ms; возвращает момент окончания"""
+        with self._lock:
+            t = start_ms
+            for symbol in symbols:
+                self._starts.append(t)
+                self._segments.append((t, t + dot_ms, int(symbol)))
+                t += dot_ms
+            return t
+
+    def color_at(self, virtual_ms):
+        with self._lock:
+            i = bisect.bisect_right(self._starts, virtual_ms) - 1
+            if i < 0:
+                return 0
+            start, end, color = self._segments[i]
+            return color if virtual_ms < end else 0
+
+    def prune_before(self, virtual_ms):
+        """Забыть отрезки, закончившиеся до virtual_ms"""
+        with self._lock:
+            i = bisect.bisect_left(self._starts, virtual_ms) - 1
+            if i > 0:
+                del self._starts[:i]
+                del self._segments[:i]
+
+
+def open_pty():
+    """Пара псевдотерминалов: (fd ведущей стороны для эмулятора, путь для pyserial)"""
+    master, slave = os.openpty()
+    # Без эха: иначе эмулятор прочитает собственный вывод как входные данные
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    return master, slave, path
+
+
+class PtyDevice:
+    """Общая часть эмуляторов: поток чтения строк с pty и запись ответов"""
+
+    def __init__(self, name):
+        self.name = name
+        self.master, self._slave, self.port = open_pty()
+        self._stop = threading.Event()
+        self._threads = []
+        self._write_lock = threading.Lock()
+
+    def println(self, text):
+        with self._write_lock:
+            try:
+                os.write(self.master, (text + "\r\n").encode("utf-8"))
+            except OSError:
+                pass
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=f"{self.name}-{name}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _read_lines(self, on_line):
+        buffer = bytearray()
+        while not self._stop.is_set():
+            try:
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while True:
+                end = buffer.find(b"\n")
+                if end < 0:
+                    break
+                line = buffer[:end].decode("utf-8", errors="ignore").strip()
+                del buffer[:end + 1]
+                if line:
+                    on_line(line)
+
+    def stop(self):
+        self._stop.set()
+        for fd in (self.master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class VirtualArduino(PtyDevice):
+    """Эмулятор передатчика sketch_arduino.ino
+
+    Повторяет и ограничения прошивки: кольцевую очередь на MAX_QUEUE_SIZE
+    ожидающих сообщений и бесконечный повтор последнего сообщения. Принимает
+    и строки текста, и кадры символов от MinBackend; события называются
+    текстом сообщения (для кадра — декодированным обратно кодом codec,
+    которым кодирует MinBackend).
+    events получает (имя события, текст, виртуальное время мс).
+
+    Свет планируется на lookahead реальных секунд вперёд, чтобы опоздание
+    потока не оставляло в эфире пауз, которых у прошивки нет. Цена — новое
+    сообщение может подождать лишний повтор предыдущего.
+    """
+
+    DOT_DURATION = 500
+    MAX_QUEUE_SIZE = 10
+
+    def __init__(self, light, clock, events=None, lookahead=0.02, codec="morse"):
+        super().__init__("arduino")
+        self.light = light
+        self.clock = clock
+        self.codec = get_codec(codec)
+        self.events = events or (lambda event, text, virtual_ms: None)
+        self.lookahead_ms = max(4 * self.DOT_DURATION, lookahead * 1000.0 / clock.time_scale)
+
+        self._lock = threading.Lock()
+        self._queue = collections.deque()
+        self._last_message = None
+        self._air_end = 0.0
+
+    def start(self):
+        self.println("")
+        self.println("Передатчик Morse готов!")
+        self._spawn(self._read_input, "serial")
+        self._spawn(self._play, "led")
+
+    def _read_input(self):
+        """Строки текста и кадры (0x02, uint16 LE число символов, символы, XOR)"""
+        buffer = bytearray()
+        while not self._stop.is_set():
+            try:
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while buffer:
+                if buffer[0] == FRAME_START:
+                    if len(buffer) < 3:
+                        break
+                    count = int.from_bytes(buffer[1:3], "little")
+                    end = frame_size(count)
+                    if len(buffer) < end:
+                        break
+                    frame = bytes(buffer[:end])
+                    del buffer[:end]
+                    self._on_frame(frame)
+                    continue
+                end = buffer.find(b"\n")
+                if end < 0:
+                    break
+                line = buffer[:end].decode("utf-8", errors="ignore").strip()
+                del buffer[:end + 1]
+                if line:
+                    self._on_line(line)
+
+    def _on_frame(self, frame):
+        # Прошивка проверяет длину до чтения символов, контрольную сумму — после
+        count = int.from_bytes(frame[1:3], "little")
+        if count == 0 or count > MAX_FRAME_SYMBOLS:
+            self.println("Ошибка: повреждённый кадр (длина)")
+            return
+        try:
+            symbols = unpack_frame(frame)
+        except ValueError:
+            self.println("Ошибка: повреждённый кадр (контрольная сумма)")
+            return
+        self._enqueue(self.codec.decode(symbols[len(START_SEQUENCE):]).text, symbols)
+
+    def _on_line(self, line):
+        word = clean_input(line)
+        if not word:
+            self.println("Ошибка: введите только буквы A-Z и пробелы")
+            return
+        self.println(f"Получено слово: {word}")
+        self._enqueue(word, text_to_morse(word))
+
+    def _enqueue(self, text, symbols):
+        with self._lock:
+            if len(self._queue) < self.MAX_QUEUE_SIZE:
+                self._queue.append((text, symbols))
+                self.println(f"Сообщение добавлено в очередь. В очереди: {len(self._queue)}")
+                self.events("received", text, self.clock.now_ms())
+            else:
+                self.println("Очередь переполнена! Сообщение не добавлено.")
+                self.events("overflow", text, self.clock.now_ms())
+
+    def _next_message(self):
+        with self._lock:
+            if self._queue:
+                message = self._queue.popleft()
+                self.println(f"Начинаем воспроизведение: {len(message[1])} символов")
+                self.println(f"Осталось в очереди: {len(self._queue)}")
+                self._last_message = message
+                return message, True
+            if self._last_message is not None:
+                return self._last_message, False
+            return None, False
+
+    def _play(self):
+        while not self._stop.is_set():
+            now = self.clock.now_ms()
+            # Планируем свет немного вперёд, чтобы датчик никогда не видел пустоту
+            if self._air_end - now > self.lookahead_ms:
+                self.clock.sleep_until(self._air_end - self.lookahead_ms, self._stop)
+                continue
+            message, is_new = self._next_message()
+            if message is None:
+                self._stop.wait(0.001)
+                continue
+            text, symbols = message
+            start = max(now, self._air_end)
+            self._air_end = self.light.schedule(start, symbols, self.DOT_DURATION)
+            if is_new:
+                self.events("air_start", text, start)
+                self.events("air_end", text, self._air_end)
+            self.light.prune_before(now - 10 * self.DOT_DURATION)
+
+
+class VirtualEsp32(PtyDevice):
+    """Эмулятор приёмника sketch_esp32.ino
+
+    raw_samples=True — режим RAW_SAMPLES: строки SAMPLE: каждые SAMPLE_INTERVAL
+    вместо декодирования на плате.
+    """
+
+    READ_INTERVAL = 500
+    SAMPLE_INTERVAL = 25
+
+    def __init__(self, light, clock, events=None, raw_samples=False, phase_ms=None,
+                 noise=0.05, seed=0):
+        super().__init__("esp32")
+        self.light = light
+        self.clock = clock
+        self.events = events or (lambda event, text, virtual_ms: None)
+        self.raw_samples = raw_samples
+        self.interval = self.SAMPLE_INTERVAL if raw_samples else self.READ_INTERVAL
+        self._random = random.Random(seed)
+        self.phase_ms = self._random.uniform(0, self.interval) if phase_ms is None else phase_ms
+        self.noise = noise
+
+    def start(self):
+        self.println("READY")
+        self._spawn(self._sample_loop, "sensor")
+
+    def _sample_loop(self):
+        is_recording = False
+        green_count = 0
+        sequence = []
+        t = self.clock.now_ms() + self.phase_ms
+
+        while not self._stop.is_set():
+            self.clock.sleep_until(t, self._stop)
+            color = self.light.color_at(t)
+
+            if self.raw_samples:
+                r, g, b = (int(v * self._random.uniform(1 - self.noise, 1 + self.noise))
+                           for v in COLOR_RGB[color])
+                self.println(f"SAMPLE:{int(t)},{r},{g},{b},{r + g + b}")
+                t += self.interval
+                continue
+
+            symbol = str(color)
+            green_count = green_count + 1 if symbol == '3' else 0
+            if not is_recording:
+                if green_count >= 3:
+                    is_recording = True
+                    sequence = []
+                    green_count = 0
+            else:
+                sequence.append(symbol)
+                if green_count >= 3:
+                    message = decode_morse_sequence("".join(sequence))
+                    self.println(f"MESSAGE:{message}")
+                    self.events("emitted", message, t)
+                    sequence = []
+            t += self.interval
@@ -0,0 +1,303 @@
+"""
+Сквозной бенчмарк Li-Fi цепочки без реального железа.
+
+HTTP POST -> MinBackend -> serial (pty) -> VirtualArduino -> свет ->
+VirtualEsp32 -> serial (pty) -> Client -> сервер сообщений (SQLite).
+
+Запуск (нужны зависимости MinBackend, Client и сервера в указанных интерпретаторах):
+
+    python pipeline.py --messages 10 --time-scale 0.002 --output result.json
+    python pipeline.py --raw --codec prefix
+
+Отчёт: доставлено/потеряно/искажено, сообщений в секунду, перцентили
+сквозной задержки и задержки по этапам.
+"""
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINECODEC_DIR = os.path.join(ROOT, "LineCodec")
+# Общий пакет кодеков берётся из дерева, без установки
+sys.path.insert(0, LINECODEC_DIR)
+
+from devices import LightChannel, VirtualArduino, VirtualClock, VirtualEsp32
+
+SERVER_DIR = os.path.join(ROOT, "SoftEsp32", "forDeploy", "server")
+MINBACKEND_DIR = os.path.join(ROOT, "SoftArduino", "MinBackend")
+CLIENT_DIR = os.path.join(ROOT, "SoftEsp32", "Client")
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def message_text(index, prefix):
+    """Уникальный текст из букв A-Z для номера сообщения"""
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = ALPHABET[rest] + letters
+    return f"{prefix} {letters}"
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 6)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1], 6),
+            "count": len(values)}
+
+
+def http_json(method, url, body=None, timeout=10):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"null")
+
+
+def wait_http(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} не ответил за {timeout} с")
+
+
+def wait_log(path, marker, timeout=30):
+    """Дождаться строки marker в логе процесса"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            if marker in f.read():
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"В {path} не появилось {marker!r} за {timeout} с")
+
+
+class EventLog:
+    """Первое появление каждого события для каждого текста, в реальных секундах"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.times = {}
+        self.counts = {}
+
+    def record_virtual(self, event, text, virtual_ms):
+        self.record(event, text, self.clock.to_real(virtual_ms))
+
+    def record(self, event, text, real_time):
+        with self._lock:
+            self.times.setdefault(event, {}).setdefault(text, real_time)
+            self.counts[event] = self.counts.get(event, 0) + 1
+
+    def get(self, event, text):
+        return self.times.get(event, {}).get(text)
+
+
+class Pipeline:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="lifi-bench-")
+        self.clock = VirtualClock(args.time_scale)
+        self.events = EventLog(self.clock)
+        self.light = LightChannel()
+        self.arduino = VirtualArduino(self.light, self.clock, self.events.record_virtual, codec=args.codec)
+        self.esp32 = VirtualEsp32(self.light, self.clock, self.events.record_virtual,
+                                  raw_samples=args.raw, seed=args.seed)
+        self.processes = []
+        self.server_url = f"http://127.0.0.1:{args.server_port}"
+        self.minbackend_url = f"http://127.0.0.1:{args.minbackend_port}"
+        self.received = []
+
+    def _spawn(self, name, command, cwd, env):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        process = subprocess.Popen(command, cwd=cwd, env={**os.environ, **env},
+                                   stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append((name, process, log))
+        return process
+
+    def start(self):
+        args = self.args
+        self.arduino.start()
+        self.esp32.start()
+
+        self._spawn("server", shlex.split(args.server_python) + [
+            "-m", "uvicorn", "src.main:app", "--port", str(args.server_port), "--log-level", "warning"
+        ], cwd=self.workdir, env={
+            "PYTHONPATH": SERVER_DIR,
+            "DATABASE_URL": f"sqlite:///{os.path.join(self.workdir, 'messages.db')}",
+        })
+        self._spawn("minbackend", shlex.split(args.minbackend_python) + [
+            "-m", "uvicorn", "main:app", "--port", str(args.minbackend_port), "--log-level", "warning"
+        ], cwd=self.workdir, env={
+            "PYTHONPATH": os.pathsep.join((MINBACKEND_DIR, LINECODEC_DIR)),
+            "SERIAL_PORT": self.arduino.port,
+            "LINE_CODEC": args.codec,
+        })
+        wait_http(f"{self.server_url}/health")
+        wait_http(f"{self.minbackend_url}/openapi.json")
+
+        client_args = ["--port", self.esp32.port, "--server", f"{self.server_url}/api/data",
+                       "--codec", args.codec]
+        if args.raw:
+            client_args.append("--raw")
+        self._spawn("client", shlex.split(args.client_python) + [
+            "-u", os.path.join(CLIENT_DIR, "main.py")
+        ] + client_args, cwd=CLIENT_DIR, env={"PYTHONPATH": LINECODEC_DIR})
+        # pyserial сбрасывает входной буфер при открытии порта: до подключения
+        # клиента всё, что выдал приёмник, теряется
+        wait_log(os.path.join(self.workdir, "client.log"), f"Подключено к {self.esp32.port}")
+
+    def stop(self):
+        for name, process, log in self.processes:
+            process.terminate()
+        for name, process, log in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+        self.arduino.stop()
+        self.esp32.stop()
+
+    def _collect(self, stop_event):
+        """Забирать новые сообщения с сервера long-poll запросами"""
+        since_id = 0
+        while not stop_event.is_set():
+            try:
+                page = http_json("GET", f"{self.server_url}/api/data?since_id={since_id}&wait=1&limit=1000")
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.1)
+                continue
+            now = time.monotonic()
+            for message in reversed(page["messages"]):
+                since_id = max(since_id, message["id"])
+                self.received.append(message["message"])
+                self.events.record("stored", message["message"], now)
+
+    def run(self):
+        args = self.args
+        texts = [message_text(i, args.prefix) for i in range(args.messages)]
+        sent_at = {}
+
+        stop_collecting = threading.Event()
+        collector = threading.Thread(target=self._collect, args=(stop_collecting,), daemon=True)
+        collector.start()
+
+        started = time.monotonic()
+        for text in texts:
+            sent_at[text] = time.monotonic()
+            try:
+                http_json("POST", f"{self.minbackend_url}/", {"text": text})
+                self.events.record("posted", text, time.monotonic())
+            except (urllib.error.URLError, OSError) as e:
+                print(f"POST {text!r} не удался: {e}", file=sys.stderr)
+            if args.rate:
+                time.sleep(1.0 / args.rate)
+
+        deadline = time.monotonic() + args.drain
+        while time.monotonic() < deadline:
+            if all(self.events.get("stored", text) for text in texts):
+                break
+            time.sleep(0.05)
+        stop_collecting.set()
+        collector.join(timeout=3)
+
+        return self.report(texts, sent_at, started)
+
+    def report(self, texts, sent_at, started):
+        delivered = [text for text in texts if self.events.get("stored", text)]
+        last_arrival = max((self.events.get("stored", text) for text in delivered), default=started)
+        duration = max(last_arrival - started, 1e-9)
+
+        def stage(start, end_event):
+            """Перцентили от события start (имя или словарь текст -> время) до end_event"""
+            start_times = start if isinstance(start, dict) else self.events.times.get(start, {})
+            values = []
+            for text in delivered:
+                begin, end = start_times.get(text), self.events.get(end_event, text)
+                if begin is not None and end is not None:
+                    values.append(end - begin)
+            return percentiles(values)
+
+        sent_set = set(texts)
+        return {
+            "sent": len(texts),
+            "delivered": len(delivered),
+            "lost": len(texts) - len(delivered),
+            "loss_rate": round(1 - len(delivered) / len(texts), 4) if texts else 0.0,
+            "garbled": sum(1 for text in self.received if text not in sent_set),
+            "duplicates": sum(1 for text in self.received if text in sent_set) - len(delivered),
+            "transmitter_overflows": self.events.counts.get("overflow", 0),
+            "duration_s": round(duration, 4),
+            "messages_per_s": round(len(delivered) / duration, 4),
+            "virtual_messages_per_s": round(len(delivered) / duration * self.args.time_scale, 6),
+            "time_scale": self.args.time_scale,
+            "raw_samples": self.args.raw,
+            "codec": self.args.codec,
+            "latency_s": stage(sent_at, "stored"),
+            "stages_s": {
+                "http_to_serial": stage(sent_at, "received"),
+                "transmitter_queue": stage("received", "air_start"),
+                "air_time": stage("air_start", "air_end"),
+                "receiver_decode": stage("air_end", "emitted"),
+                "upload_and_store": stage("emitted", "stored"),
+            },
+            "logs": self.workdir,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк Li-Fi цепочки на виртуальных устройствах")
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=0, help="сообщений в секунду при отправке (0 — без паузы)")
+    parser.add_argument("--time-scale", type=float, default=0.002,
+                        help="реальных секунд на виртуальную секунду (0.002: точка 500 мс = 1 мс)")
+    parser.add_argument("--drain", type=float, default=30, help="сколько ждать доставки после отправки, с")
+    parser.add_argument("--raw", action="store_true", help="ESP32 в режиме RAW_SAMPLES, декодирование на хосте")
+    parser.add_argument("--codec", default="morse", help="линейный код (LINE_CODEC у MinBackend); кроме morse, нужен --raw")
+    parser.add_argument("--prefix", default="MSG")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-port", type=int, default=17999)
+    parser.add_argument("--minbackend-port", type=int, default=18000)
+    parser.add_argument("--server-python", default=sys.executable)
+    parser.add_argument("--minbackend-python", default=sys.executable)
+    parser.add_argument("--client-python", default=sys.executable)
+    parser.add_argument("--output", help="файл для JSON отчёта")
+    args = parser.parse_args()
+    if args.codec != "morse" and not args.raw:
+        parser.error("прошивка ESP32 декодирует только morse, для --codec нужен --raw")
+
+    pipeline = Pipeline(args)
+    try:
+        pipeline.start()
+        result = pipeline.run()
+    finally:
+        pipeline.stop()
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
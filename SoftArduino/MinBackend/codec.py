@@ -0,0 +1,46 @@
+"""
+Кадры символов для передатчика.
+
+Текст переводится в последовательность символов 1/2/3 (красный, синий,
+зелёный) здесь, на хосте, линейным кодом из linecodec (morse, prefix, ...),
+а не в прошивке: передатчику уходит готовый кадр (linecodec.frame),
+и прошивке остаётся только зажигать цвета, какой бы код ни был выбран.
+Время передачи известно заранее: каждый символ горит DOT_DURATION миллисекунд.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+from linecodec import DEFAULT_CODEC, get_codec, pack_frame
+
+# DOT_DURATION из sketch_arduino.ino
+DOT_DURATION_MS = 500
+
+
+@dataclass(frozen=True)
+class EncodedMessage:
+    text: str
+    symbols: str
+    frame: bytes
+    air_time_ms: int
+
+
+@lru_cache(maxsize=4096)
+def _encode(text, dot_ms, codec):
+    symbols = get_codec(codec).encode(text)
+    return EncodedMessage(text, symbols, pack_frame(symbols), len(symbols) * dot_ms)
+
+
+def encode(text, dot_ms=DOT_DURATION_MS, codec=DEFAULT_CODEC):
+    """Символы, кадр и время передачи текста. ValueError, если не помещается в кадр"""
+    return _encode(text, dot_ms, codec)
+
+
+
+def encode_many(texts, dot_ms=DOT_DURATION_MS, codec=DEFAULT_CODEC):
+    """encode для многих сообщений сразу; повторяющиеся тексты кодируются один раз"""
+    return [_encode(text, dot_ms, codec) for text in texts]
+
+
+def air_times_ms(texts, dot_ms=DOT_DURATION_MS, codec=DEFAULT_CODEC):
+    """Время передачи каждого сообщения — для планирования без обращения к устройству"""
+    return [encoded.air_time_ms for encoded in encode_many(texts, dot_ms, codec)]
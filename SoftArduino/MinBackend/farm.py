@@ -0,0 +1,164 @@
+"""
+Несколько передатчиков: по одному SerialWriter на порт.
+
+Световой канал медленный (каждый символ горит DOT_DURATION), поэтому общая
+пропускная способность растёт только числом передатчиков. Новое сообщение
+ставится на подключённый передатчик с наименьшей оценкой занятости —
+суммой времени в эфире всего, что у него уже ждёт (см. SerialWriter.backlog_ms).
+
+Фоновый поток раз в discovery_interval ищет новые порты (в режиме auto) и
+снимает ещё не отправленные задания с отключившихся устройств, раздавая их
+остальным; само устройство пытается переподключиться и возвращается в
+ротацию, как только порт снова открыт.
+"""
+import re
+import threading
+
+from serial.tools import list_ports
+
+from codec import air_times_ms
+from serial_writer import QueueFull, SerialWriter
+
+
+def discover_ports(pattern):
+    """USB-порты, у которых описание, производитель или hwid подходят под pattern"""
+    regex = re.compile(pattern, re.IGNORECASE)
+    ports = []
+    for info in list_ports.comports():
+        if info.vid is None:
+            continue
+        fields = (info.description, info.manufacturer, info.product, info.hwid)
+        if any(field and regex.search(field) for field in fields):
+            ports.append(info.device)
+    return sorted(ports)
+
+
+class TransmitterFarm:
+    def __init__(self, ports, auto_pattern=None, discovery_interval=2.0, **writer_options):
+        """ports — явный список портов; auto_pattern — искать порты по шаблону (режим auto)"""
+        self.auto_pattern = auto_pattern
+        self.discovery_interval = discovery_interval
+        self.writer_options = writer_options
+        self.writers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        for port in ports:
+            self.writers[port] = SerialWriter(port, **writer_options)
+
+    @property
+    def connected(self):
+        with self._lock:
+            return any(writer.connected for writer in self.writers.values())
+
+    def start(self):
+        for writer in list(self.writers.values()):
+            writer.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="transmitter-farm", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for writer in list(self.writers.values()):
+            writer.stop()
+
+    def _choose(self, exclude=None):
+        """Подключённый передатчик, который раньше всех освободится"""
+        candidates = [
+            writer for port, writer in sorted(self.writers.items())
+            if writer.connected and port != exclude
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda writer: writer.backlog_ms())
+
+    def submit(self, text):
+        """Поставить текст на наименее загруженный передатчик. QueueFull, если мест нет"""
+        with self._lock:
+            writer = self._choose()
+            if writer is None:
+                raise QueueFull()
+            return writer.submit(text)
+
+    def get_job(self, job_id):
+        with self._lock:
+            writers = list(self.writers.values())
+        for writer in writers:
+            job = writer.get_job(job_id)
+            if job is not None:
+                return job
+        return None
+
+    def stats(self):
+        with self._lock:
+            writers = [writer for port, writer in sorted(self.writers.items())]
+        return [writer.stats() for writer in writers]
+
+    def _run(self):
+        while not self._stop.wait(self.discovery_interval):
+            try:
+                if self.auto_pattern:
+                    self._discover()
+                self._rebalance()
+            except Exception as e:
+                print(f"Transmitter farm error: {e}")
+
+    def _discover(self):
+        found = set(discover_ports(self.auto_pattern))
+        with self._lock:
+            for port in found - set(self.writers):
+                print(f"Found transmitter port {port}")
+                writer = SerialWriter(port, **self.writer_options)
+                self.writers[port] = writer
+                writer.start()
+            for port in set(self.writers) - found:
+                writer = self.writers[port]
+                if not writer.connected:
+                    # Порт исчез из системы: задания отдаём другим, устройство убираем.
+                    # Если переложить некуда, поток остаётся и ждёт возвращения порта
+                    self._move_pending(writer)
+                    if writer.stats()["pending"] == 0:
+                        writer.stop()
+                        print(f"Transmitter port {port} removed")
+                        del self.writers[port]
+
+    def _rebalance(self):
+        """Раздать ещё не отправленные задания отключившихся устройств остальным"""
+        with self._lock:
+            for port, writer in list(self.writers.items()):
+                if not writer.connected and self._choose(exclude=port) is not None:
+                    self._move_pending(writer)
+
+    def _move_pending(self, writer):
+        """
+        Разложить неотправленные задания writer по подключённым передатчикам.
+
+        Занятость каждого передатчика оценивается один раз, время в эфире всех
+        заданий — одним вызовом air_times_ms; дальше раскладка идёт по этим
+        оценкам: задание достаётся тому, кто раньше всех освободится.
+        """
+        jobs = writer.take_pending()
+        if not jobs:
+            return
+        targets = {
+            port: target for port, target in sorted(self.writers.items())
+            if target.connected and target is not writer
+        }
+        backlog = {port: target.backlog_ms() for port, target in targets.items()}
+        air_times = air_times_ms([job["text"] for job in jobs], writer.dot_ms, writer.codec)
+        for job, air_time in zip(jobs, air_times):
+            for port in sorted(backlog, key=backlog.get):
+                try:
+                    targets[port].adopt(job)
+                except QueueFull:
+                    del backlog[port]
+                    continue
+                backlog[port] += air_time
+                break
+            else:
+                # Некуда переложить: пусть ждёт переподключения своего устройства
+                writer.adopt(job)
@@ -1,15 +1,35 @@
+import os
 from fastapi import FastAPI, HTTPException
 import uvicorn
-import serial
 from schemas import Message
+from codec import encode
+from farm import TransmitterFarm
+from serial_writer import QueueFull
 from fastapi.middleware.cors import CORSMiddleware
+from linecodec import get_codec
 
 DEBUG = True
 app = FastAPI()
 
-SERIAL_PORT = 'COM10'
+SERIAL_PORT = os.environ.get('SERIAL_PORT', 'COM10')
+# Передатчики через запятую, или auto — искать USB-порты по SERIAL_PORT_MATCH
+SERIAL_PORTS = os.environ.get('SERIAL_PORTS', SERIAL_PORT)
+SERIAL_PORT_MATCH = os.environ.get('SERIAL_PORT_MATCH', 'Arduino|CH340|wchusbserial')
 BAUD_RATE = 9600
-TIMEOUT = 1
+# DOT_DURATION из sketch_arduino.ino: по нему оценивается время в эфире
+DOT_DURATION_MS = int(os.environ.get('DOT_DURATION_MS', 500))
+# binary — готовые кадры символов (codec.py), text — строки для прошивки без поддержки кадров
+FRAME_MODE = os.environ.get('FRAME_MODE', 'binary')
+# Линейный код: morse (его декодирует и прошивка ESP32), prefix, base3 — см. linecodec.
+# Клиент ESP32 должен декодировать тем же кодом (--codec, вместе с --raw)
+LINE_CODEC = os.environ.get('LINE_CODEC', 'morse')
+line_codec = get_codec(LINE_CODEC)
+if FRAME_MODE != 'binary' and LINE_CODEC != 'morse':
+    raise RuntimeError(f"FRAME_MODE={FRAME_MODE} supports only LINE_CODEC=morse")
+# Размер очереди в прошивке (MAX_QUEUE_SIZE в sketch_arduino.ino)
+TRANSMITTER_QUEUE_SIZE = int(os.environ.get('TRANSMITTER_QUEUE_SIZE', 10))
+# Сколько сообщений может ждать отправки в порт каждого передатчика
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 1000))
 
 # CORS
 app.add_middleware(
@@ -20,62 +40,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Глобальный объект Serial
-arduino_ser = None
+# По потоку на каждый порт: запросы только ставят сообщения в очередь
+auto_discovery = SERIAL_PORTS.strip().lower() == 'auto'
+farm = TransmitterFarm(
+    [] if auto_discovery else [port.strip() for port in SERIAL_PORTS.split(',') if port.strip()],
+    auto_pattern=SERIAL_PORT_MATCH if auto_discovery else None,
+    baudrate=BAUD_RATE,
+    transmitter_capacity=TRANSMITTER_QUEUE_SIZE,
+    max_jobs=JOB_QUEUE_SIZE,
+    dot_ms=DOT_DURATION_MS,
+    binary_frames=FRAME_MODE == 'binary',
+    codec=LINE_CODEC,
+    debug=DEBUG,
+)
 
 @app.on_event("startup")
 def startup_event():
-    global arduino_ser
-    try:
-        arduino_ser = serial.Serial(port=SERIAL_PORT, baudrate=BAUD_RATE, timeout=TIMEOUT)
-        if DEBUG:
-            print(f"Connected to Arduino on {SERIAL_PORT}")
-    except Exception as e:
-        print(f"Failed to connect to Arduino: {e}")
+    farm.start()
 
 @app.on_event("shutdown")
 def shutdown_event():
-    global arduino_ser
-    if arduino_ser and arduino_ser.is_open:
-        arduino_ser.close()
-        if DEBUG:
-            print("Arduino port closed")
-
-def send_to_arduino(text: str) -> bool:
-    """Send text directly to Arduino"""
-    global arduino_ser
-    if not arduino_ser or not arduino_ser.is_open:
-        print("Serial port is not open")
-        return False
-    try:
-        # Отправляем текст с переводом строки для удобства Arduino
-        arduino_ser.write((text + '\n').encode('utf-8'))
-        if DEBUG:
-            print(f"Sent to Arduino: {text}")
-        return True
-    except Exception as e:
-        print(f"Send error: {str(e)}")
-        return False
+    farm.stop()
+    if DEBUG:
+        print("Arduino ports closed")
 
-@app.post("/")
+@app.post("/", status_code=202)
 def DataToArduino(message: Message):
     if DEBUG:
         print(f"Text: {message.text}")
-    if send_to_arduino(message.text):
-        # Вычисляем количество байт в тексте
-        text_bytes = len(message.text.encode('utf-8'))
-        return {
-            "status": "success",
-            "message": "Text sent to Arduino",
-            "original_text": message.text,
-            "sent_bytes": message.text.encode('utf-8'),
-            "bytes_count": text_bytes
-        }
-    else:
+    if not farm.connected:
         raise HTTPException(
-            status_code=500,
-            detail="Failed to send data to Arduino"
+            status_code=503,
+            detail="No Arduino is connected"
         )
+    # Morse передаёт только A-Z и пробел, остальное отбрасывается; пустое сообщение передатчик не примет
+    text = line_codec.clean(message.text)
+    if not text:
+        raise HTTPException(
+            status_code=400,
+            detail="Text must contain letters A-Z or spaces" if LINE_CODEC == 'morse' else "Text must not be empty"
+        )
+    try:
+        encoded = encode(text, DOT_DURATION_MS, LINE_CODEC)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Message is too long: {e}"
+        )
+    try:
+        job = farm.submit(text)
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Send queue is full, retry later",
+            headers={"Retry-After": "1"}
+        )
+    # Вычисляем количество байт в тексте
+    text_bytes = len(text.encode('utf-8'))
+    return {
+        "status": "queued",
+        "message": "Text queued for Arduino",
+        "job_id": job["id"],
+        "device": job["device"],
+        "position": job.get("position"),
+        "original_text": message.text,
+        "sent_bytes": text.encode('utf-8'),
+        "bytes_count": text_bytes,
+        "codec": LINE_CODEC,
+        "symbols": len(encoded.symbols),
+        "frame_bytes": len(encoded.frame),
+        "air_time_ms": encoded.air_time_ms
+    }
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = farm.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found"
+        )
+    return job
+
+@app.get("/devices")
+def get_devices():
+    """Состояние передатчиков: подключение, очередь, оценка занятости и загрузка"""
+    return {"devices": farm.stats()}
 
 if __name__ == "__main__":
     uvicorn.run("main:app", port=8000, reload=True)
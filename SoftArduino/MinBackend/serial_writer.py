@@ -0,0 +1,385 @@
+"""
+Поток, владеющий последовательным портом передатчика.
+
+HTTP-обработчики только ставят задания в очередь; запись в порт и чтение
+ответов прошивки идут в одном потоке. Прошивка хранит не больше
+MAX_QUEUE_SIZE сообщений и сообщает, сколько их ждёт, поэтому новое
+сообщение отправляется только когда у неё есть место, и только после
+подтверждения предыдущего: по строкам 'В очереди: N' и 'Осталось в
+очереди: N' поток знает занятость очереди передатчика.
+
+Если устройство отключается, поток закрывает порт и пытается открыть его
+снова; ещё не отправленные задания забирает TransmitterFarm.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import serial
+
+from codec import DOT_DURATION_MS, encode
+from linecodec import DEFAULT_CODEC
+
+# Строки sketch_arduino.ino
+READY_LINE = "Передатчик Morse готов!"
+ACCEPTED_PREFIX = "Сообщение добавлено в очередь. В очереди: "
+REMAINING_PREFIX = "Осталось в очереди: "
+STARTED_PREFIX = "Начинаем воспроизведение: "
+OVERFLOW_LINE = "Очередь переполнена! Сообщение не добавлено."
+INVALID_PREFIX = "Ошибка: введите только буквы"
+BAD_FRAME_PREFIX = "Ошибка: повреждённый кадр"
+TOO_LONG_PREFIX = "Ошибка: сообщение слишком длинное"
+
+# Состояния задания
+QUEUED = "queued"        # ждёт в очереди MinBackend
+SENT = "sent"            # записано в порт, ждём подтверждения
+ACCEPTED = "accepted"    # в очереди передатчика
+PLAYING = "playing"      # передаётся светом (последнее повторяется, пока нет новых)
+DONE = "done"            # передано, передатчик перешёл к следующему
+REJECTED = "rejected"    # передатчик отказал
+FAILED = "failed"        # не удалось доставить на передатчик
+FINISHED = (DONE, REJECTED, FAILED)
+
+
+class QueueFull(Exception):
+    """Очередь заданий заполнена"""
+
+
+class SerialWriter:
+    def __init__(self, port, baudrate, transmitter_capacity=10, max_jobs=1000,
+                 ack_timeout=3.0, ready_timeout=3.0, max_attempts=3, history=1000,
+                 dot_ms=DOT_DURATION_MS, reconnect_interval=2.0, binary_frames=True,
+                 codec=DEFAULT_CODEC, debug=False):
+        self.port = port
+        self.baudrate = baudrate
+        self.transmitter_capacity = transmitter_capacity
+        self.max_jobs = max_jobs
+        # Прошивка читает порт только между символами (DOT_DURATION), так что ответ не мгновенный
+        self.ack_timeout = ack_timeout
+        self.ready_timeout = ready_timeout
+        self.max_attempts = max_attempts
+        self.history = history
+        self.dot_ms = dot_ms
+        self.reconnect_interval = reconnect_interval
+        # Готовые кадры (linecodec.pack_frame) или текст строкой для старой прошивки
+        self.binary_frames = binary_frames
+        # Линейный код кадров (linecodec); текстом прошивка принимает только morse
+        self.codec = codec
+        self.debug = debug
+
+        self.ser = None
+        self.transmitter_queued = 0
+        self.ready = False
+        self.last_error = None
+        self.connected_since = None
+        # Оценка времени в эфире новых сообщений с момента подключения
+        self.air_time_started_ms = 0
+        self.counts = {SENT: 0, ACCEPTED: 0, DONE: 0, REJECTED: 0, FAILED: 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._jobs = OrderedDict()
+        self._pending = deque()      # id заданий, ещё не отправленных в порт
+        self._on_transmitter = deque()  # id принятых передатчиком, в порядке воспроизведения
+        self._playing = None
+        self._in_flight = None
+        self._ack_deadline = 0.0
+        self._opened_at = 0.0
+
+    @property
+    def connected(self):
+        return self.ser is not None and self.ser.is_open
+
+    def start(self):
+        """Запустить поток; порт открывается в нём и переоткрывается после отключения"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"serial-writer-{self.port}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self.connected:
+            self.ser.close()
+
+    def _open(self):
+        try:
+            # Короткий таймаут чтения: поток проверяет очередь между строками
+            self.ser = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=0.05)
+        except Exception as e:
+            if self.last_error != str(e):
+                print(f"Failed to connect to Arduino on {self.port}: {e}")
+            self.last_error = str(e)
+            return False
+        print(f"Connected to Arduino on {self.port}")
+        with self._lock:
+            # Открытие порта перезагружает плату; ждём строку готовности или ready_timeout
+            self._opened_at = time.monotonic()
+            self.ready = False
+            self.transmitter_queued = 0
+            self.connected_since = time.time()
+            self.air_time_started_ms = 0
+            self.last_error = None
+        return True
+
+    def _disconnect(self, error):
+        """Порт пропал: закрыть его, отправленное вернуть в очередь, принятое платой потеряно"""
+        print(f"Arduino on {self.port} disconnected: {error}")
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.last_error = str(error)
+            self.ready = False
+            self.transmitter_queued = 0
+            self.connected_since = None
+            self._lose_transmitter_jobs("transmitter disconnected")
+            if self._in_flight is not None:
+                self._retry_in_flight()
+
+    def _new_job(self, text):
+        encoded = encode(text, self.dot_ms, self.codec)
+        return {
+            "id": uuid.uuid4().hex,
+            "text": text,
+            "device": self.port,
+            "symbols": len(encoded.symbols),
+            "air_time_ms": encoded.air_time_ms,
+            "status": QUEUED,
+            "attempts": 0,
+            "error": None,
+            "created_at": time.time(),
+            "sent_at": None,
+            "accepted_at": None,
+            "started_at": None,
+            "finished_at": None,
+        }
+
+    def submit(self, text):
+        """
+        Поставить текст в очередь; возвращает задание. QueueFull, если мест нет,
+        ValueError, если текст не помещается в кадр
+        """
+        return self.adopt(self._new_job(text))
+
+    def adopt(self, job):
+        """Поставить в очередь готовое задание (в том числе снятое с другого устройства)"""
+        with self._lock:
+            if len(self._pending) >= self.max_jobs:
+                raise QueueFull()
+            job["device"] = self.port
+            job["status"] = QUEUED
+            self._jobs[job["id"]] = job
+            self._pending.append(job["id"])
+            self._forget_old_jobs()
+            return self._describe(job)
+
+    def take_pending(self):
+        """Снять все ещё не отправленные задания, чтобы отдать их другим устройствам"""
+        with self._lock:
+            jobs = [self._jobs.pop(job_id) for job_id in self._pending]
+            self._pending.clear()
+            return jobs
+
+    def backlog_ms(self):
+        """Оценка времени до того, как передатчик возьмётся за новое сообщение"""
+        with self._lock:
+            return self._backlog_ms()
+
+    def _backlog_ms(self):
+        waiting = list(self._pending) + list(self._on_transmitter)
+        if self._in_flight is not None:
+            waiting.append(self._in_flight)
+        backlog = sum(self._jobs[job_id]["air_time_ms"] for job_id in waiting if job_id in self._jobs)
+        playing = self._jobs.get(self._playing)
+        if playing is not None and playing["status"] == PLAYING:
+            # Следующее сообщение начнётся после текущего повтора
+            elapsed = (time.time() - playing["started_at"]) * 1000
+            backlog += playing["air_time_ms"] - elapsed % playing["air_time_ms"]
+        return backlog
+
+    def stats(self):
+        with self._lock:
+            utilisation = None
+            if self.connected_since is not None:
+                elapsed_ms = max((time.time() - self.connected_since) * 1000, 1.0)
+                utilisation = round(min(1.0, self.air_time_started_ms / elapsed_ms), 4)
+            return {
+                "port": self.port,
+                "connected": self.connected,
+                "ready": self.ready,
+                "connected_since": self.connected_since,
+                "last_error": self.last_error,
+                "transmitter_queued": self.transmitter_queued,
+                "transmitter_capacity": self.transmitter_capacity,
+                "pending": len(self._pending),
+                "in_flight": self._in_flight is not None,
+                "backlog_ms": round(self._backlog_ms()),
+                "utilisation": utilisation,
+                "jobs": dict(self.counts),
+            }
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._describe(job) if job is not None else None
+
+    def _describe(self, job):
+        result = dict(job)
+        if job["status"] == QUEUED and job["id"] in self._pending:
+            result["position"] = self._pending.index(job["id"])
+        result["transmitter_queued"] = self.transmitter_queued
+        return result
+
+    def _forget_old_jobs(self):
+        """Держать в памяти не больше history завершённых заданий"""
+        finished = sum(1 for job in self._jobs.values() if job["status"] in FINISHED)
+        for job_id in list(self._jobs):
+            if finished <= self.history:
+                break
+            if self._jobs[job_id]["status"] in FINISHED:
+                del self._jobs[job_id]
+                finished -= 1
+
+    def _finish(self, job, status, error=None):
+        self.counts[status] += 1
+        job["status"] = status
+        job["error"] = error
+        job["finished_at"] = time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.connected and not self._open():
+                self._stop.wait(self.reconnect_interval)
+                continue
+            try:
+                raw = self.ser.readline()
+            except Exception as e:
+                self._disconnect(e)
+                continue
+            if raw:
+                line = raw.decode("utf-8", errors="ignore").strip()
+                if line:
+                    self._handle_line(line)
+            self._check_ack_timeout()
+            self._send_next()
+
+    def _handle_line(self, line):
+        if self.debug:
+            print(f"Arduino: {line}")
+        with self._lock:
+            if line == READY_LINE:
+                # Плата перезагрузилась: её очередь пуста, принятые сообщения потеряны
+                self.ready = True
+                self.transmitter_queued = 0
+                self._lose_transmitter_jobs("transmitter restarted")
+                if self._in_flight is not None:
+                    self._retry_in_flight()
+            elif line.startswith(ACCEPTED_PREFIX):
+                self.transmitter_queued = self._number(line[len(ACCEPTED_PREFIX):])
+                job = self._take_in_flight()
+                if job is not None:
+                    self.counts[ACCEPTED] += 1
+                    job["status"] = ACCEPTED
+                    job["accepted_at"] = time.time()
+                    self._on_transmitter.append(job["id"])
+            elif line.startswith(REMAINING_PREFIX):
+                self.transmitter_queued = self._number(line[len(REMAINING_PREFIX):])
+            elif line.startswith(STARTED_PREFIX):
+                previous = self._jobs.get(self._playing)
+                if previous is not None and previous["status"] == PLAYING:
+                    self._finish(previous, DONE)
+                self._playing = self._on_transmitter.popleft() if self._on_transmitter else None
+                job = self._jobs.get(self._playing)
+                if job is not None:
+                    job["status"] = PLAYING
+                    job["started_at"] = time.time()
+                    self.air_time_started_ms += job["air_time_ms"]
+            elif line == OVERFLOW_LINE:
+                self.transmitter_queued = self.transmitter_capacity
+                if self._in_flight is not None:
+                    self._retry_in_flight()
+            elif line.startswith(BAD_FRAME_PREFIX):
+                # Кадр испорчен по дороге: отправим ещё раз
+                if self._in_flight is not None:
+                    self._retry_in_flight()
+            elif line.startswith(INVALID_PREFIX) or line.startswith(TOO_LONG_PREFIX):
+                job = self._take_in_flight()
+                if job is not None:
+                    self._finish(job, REJECTED, line)
+
+    def _lose_transmitter_jobs(self, error):
+        """Сообщения из памяти платы пропали вместе с ней"""
+        playing = self._jobs.get(self._playing)
+        if playing is not None and playing["status"] == PLAYING:
+            # Успело прозвучать целиком хотя бы раз — считаем переданным
+            if (time.time() - playing["started_at"]) * 1000 >= playing["air_time_ms"]:
+                self._finish(playing, DONE)
+            else:
+                self._finish(playing, FAILED, error)
+        for job_id in self._on_transmitter:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == ACCEPTED:
+                self._finish(job, FAILED, error)
+        self._on_transmitter.clear()
+        self._playing = None
+
+    @staticmethod
+    def _number(text):
+        try:
+            return int(text.strip())
+        except ValueError:
+            return 0
+
+    def _take_in_flight(self):
+        job = self._jobs.get(self._in_flight)
+        self._in_flight = None
+        return job
+
+    def _retry_in_flight(self):
+        """Вернуть отправленное задание в начало очереди или отказаться после max_attempts"""
+        job = self._take_in_flight()
+        if job is None:
+            return
+        if job["attempts"] >= self.max_attempts:
+            self._finish(job, FAILED, "transmitter did not accept the message")
+        else:
+            job["status"] = QUEUED
+            self._pending.appendleft(job["id"])
+
+    def _check_ack_timeout(self):
+        with self._lock:
+            if self._in_flight is not None and time.monotonic() > self._ack_deadline:
+                self._retry_in_flight()
+            if not self.ready and time.monotonic() - self._opened_at > self.ready_timeout:
+                # Плата без автосброса: строки готовности не будет
+                self.ready = True
+
+    def _send_next(self):
+        with self._lock:
+            if (not self.ready or self._in_flight is not None or not self._pending
+                    or self.transmitter_queued >= self.transmitter_capacity):
+                return
+            job = self._jobs[self._pending.popleft()]
+            self.counts[SENT] += 1
+            job["status"] = SENT
+            job["attempts"] += 1
+            job["sent_at"] = time.time()
+            self._in_flight = job["id"]
+            self._ack_deadline = time.monotonic() + self.ack_timeout
+            text = job["text"]
+        try:
+            if self.binary_frames:
+                self.ser.write(encode(text, self.dot_ms, self.codec).frame)
+            else:
+                # Одна строка на сообщение: прошивка читает до перевода строки
+                self.ser.write((text + '\n').encode('utf-8'))
+            if self.debug:
+                print(f"Sent to Arduino: {text}")
+        except Exception as e:
+            print(f"Send error: {str(e)}")
+            self._disconnect(e)
@@ -0,0 +1,244 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from linecodec import get_codec
+
+# Символы линии: 0 — нет сигнала, 1 — красный, 2 — синий, 3 — зелёный (разделитель)
+OFF, RED, BLUE, GREEN = 0, 1, 2, 3
+
+# Каналы сырого отсчёта TCS34725: r, g, b (c — общая освещённость, отдельно)
+CHANNEL_SYMBOLS = np.array([RED, GREEN, BLUE], dtype=np.int8)
+
+
+def parse_sample_line(line):
+    """Разобрать строку 'SAMPLE:<millis>,<r>,<g>,<b>,<c>' в кортеж чисел или None"""
+    if not line.startswith("SAMPLE:"):
+        return None
+    try:
+        t, r, g, b, c = (int(value) for value in line[len("SAMPLE:"):].split(","))
+    except ValueError:
+        return None
+    return t, r, g, b, c
+
+
+class ColorClassifier:
+    """Векторная классификация сырых RGBC отсчётов в символы 0..3
+
+    Каналы умножаются на калибровочные коэффициенты, побеждает доминирующий.
+    Отсчёт считается «нет сигнала», если общая яркость ниже min_clear или
+    лидер превосходит второй канал меньше чем в min_margin раз.
+    """
+
+    def __init__(self, gains=(0.85, 1.1, 0.95), min_clear=0, min_margin=1.0):
+        self.gains = np.asarray(gains, dtype=np.float64)
+        self.min_clear = min_clear
+        self.min_margin = min_margin
+
+    def classify(self, rgbc):
+        """rgbc: массив N×4 (r, g, b, c) -> (символы int8[N], отношение лидера ко второму float[N])"""
+        rgbc = np.asarray(rgbc, dtype=np.float64)
+        corrected = rgbc[:, :3] * self.gains
+        order = np.argsort(corrected, axis=1)
+        top = np.take_along_axis(corrected, order[:, 2:3], axis=1)[:, 0]
+        second = np.take_along_axis(corrected, order[:, 1:2], axis=1)[:, 0]
+        margin = top / np.maximum(second, 1e-9)
+
+        symbols = CHANNEL_SYMBOLS[order[:, 2]]
+        off = (rgbc[:, 3] < self.min_clear) | (margin <= self.min_margin)
+        symbols[off] = OFF
+        return symbols, margin
+
+    @classmethod
+    def calibrate(cls, rgbc, labels, min_margin=1.05):
+        """Подобрать коэффициенты и порог яркости по размеченным отсчётам
+
+        labels — символ 0..3 для каждой строки rgbc (например, записанная
+        последовательность известного тестового сигнала).
+        """
+        rgbc = np.asarray(rgbc, dtype=np.float64)
+        labels = np.asarray(labels)
+        gains = np.ones(3)
+        # Канал каждого цвета приводится к общему уровню
+        for channel, symbol in enumerate(CHANNEL_SYMBOLS):
+            selected = rgbc[labels == symbol]
+            if len(selected):
+                gains[channel] = 1.0 / max(selected[:, channel].mean(), 1e-9)
+        gains /= gains.max()
+
+        min_clear = 0
+        on = rgbc[labels != OFF][:, 3]
+        off = rgbc[labels == OFF][:, 3]
+        if len(on) and len(off):
+            min_clear = (np.percentile(off, 95) + np.percentile(on, 5)) / 2
+        return cls(gains=gains, min_clear=min_clear, min_margin=min_margin)
+
+
+@dataclass
+class Run:
+    """Непрерывный участок одного цвета"""
+    symbol: int
+    start: float
+    end: float
+    margin_sum: float
+    samples: int
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+@dataclass
+class DecodedMessage:
+    text: str
+    confidence: float
+    symbols: str
+    unknown_letters: int
+    started_at: float
+    ended_at: float
+    letters: list = field(default_factory=list)
+    valid: bool = True
+
+
+class LineStreamDecoder:
+    """Потоковый декодер сырых отсчётов датчика
+
+    Отсчёты копятся и обрабатываются пачками NumPy: классификация, разбиение
+    на участки одного цвета, подавление дребезга короче min_run_ms, перевод
+    длительности участка в число символов по dot_ms. Серия из трёх и более
+    зелёных символов — граница сообщения (как у передатчика «333»).
+    Символы между границами декодирует codec (linecodec, имя или объект),
+    готовые сообщения передаются в on_message(DecodedMessage).
+    """
+
+    def __init__(self, on_message, classifier=None, dot_ms=500, min_run_ms=None,
+                 batch_size=32, delimiter_length=3, min_margin_score=1.5, codec="morse"):
+        self.on_message = on_message
+        self.codec = get_codec(codec) if isinstance(codec, str) else codec
+        self.classifier = classifier or ColorClassifier()
+        self.dot_ms = dot_ms
+        self.min_run_ms = dot_ms * 0.3 if min_run_ms is None else min_run_ms
+        self.batch_size = batch_size
+        self.delimiter_length = delimiter_length
+        self.min_margin_score = min_margin_score
+
+        self._pending = []
+        self._open_run = None
+        self._closed_run = None
+        self._recording = False
+        self._body = []
+        self._body_scores = []
+        self._body_start = None
+
+        self.samples = 0
+        self.messages = 0
+
+    def feed_line(self, line):
+        """Принять строку от ESP32; возвращает True, если это был отсчёт"""
+        sample = parse_sample_line(line)
+        if sample is None:
+            return False
+        self._pending.append(sample)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Обработать накопленные отсчёты"""
+        if self._pending:
+            batch, self._pending = np.array(self._pending, dtype=np.float64), []
+            self.feed_samples(batch[:, 0], batch[:, 1:5])
+
+    def feed_samples(self, times, rgbc):
+        """Обработать пачку отсчётов: times[N] в мс, rgbc[N×4]"""
+        times = np.asarray(times, dtype=np.float64)
+        if len(times) == 0:
+            return
+        self.samples += len(times)
+        symbols, margins = self.classifier.classify(rgbc)
+
+        # Границы участков одного цвета внутри пачки
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(symbols)) + 1))
+        ends = np.concatenate((starts[1:], [len(symbols)]))
+        margin_sums = np.add.reduceat(margins, starts)
+        # Участок заканчивается там, где начинается следующий
+        run_ends = np.concatenate((times[starts[1:]], [times[-1]]))
+
+        for i in range(len(starts)):
+            run = Run(int(symbols[starts[i]]), float(times[starts[i]]), float(run_ends[i]),
+                      float(margin_sums[i]), int(ends[i] - starts[i]))
+            self._extend(run)
+
+    def _extend(self, run):
+        """Присоединить участок к открытому; закрытый участок финализируется на шаг позже,
+        чтобы короткий дребезг между двумя одинаковыми цветами склеил их обратно"""
+        current = self._open_run
+        if current is None:
+            self._open_run = run
+            return
+        if current.symbol == run.symbol:
+            self._merge(current, run)
+            return
+
+        current.end = run.start
+        if current.duration < self.min_run_ms:
+            # Дребезг: короткий участок не считается символом
+            previous = self._closed_run
+            if previous is not None and previous.symbol == run.symbol:
+                self._closed_run = None
+                self._merge(previous, run)
+                self._open_run = previous
+            else:
+                self._open_run = run
+            return
+
+        if self._closed_run is not None:
+            self._finish(self._closed_run)
+        self._closed_run = current
+        self._open_run = run
+
+    @staticmethod
+    def _merge(into, run):
+        into.end = run.end
+        into.margin_sum += run.margin_sum
+        into.samples += run.samples
+
+    def _finish(self, run):
+        if run.symbol == OFF:
+            return
+        ratio = run.duration / self.dot_ms
+        count = max(1, int(round(ratio)))
+        # Насколько длительность близка к целому числу точек и насколько уверенно различён цвет
+        timing_score = float(np.clip(1 - 2 * abs(ratio - count) / count, 0, 1))
+        margin_score = float(np.clip((run.margin_sum / run.samples - 1) / (self.min_margin_score - 1), 0, 1))
+        score = timing_score * margin_score
+
+        if run.symbol == GREEN and count >= self.delimiter_length:
+            if self._recording:
+                self._emit(run.start)
+            self._recording = True
+            self._body, self._body_scores, self._body_start = [], [], run.end
+            return
+        if self._recording:
+            self._body.append(str(run.symbol) * count)
+            self._body_scores.append(score)
+
+    def _emit(self, ended_at):
+        symbols = "".join(self._body)
+        if not symbols:
+            return
+        decoded = self.codec.decode(symbols)
+        units = decoded.units
+        known_ratio = (len(units) - decoded.unknown) / len(units) if units else 0.0
+        confidence = float(np.mean(self._body_scores)) * known_ratio if self._body_scores else 0.0
+        self.messages += 1
+        self.on_message(DecodedMessage(
+            text=decoded.text,
+            confidence=round(confidence, 3),
+            symbols=symbols,
+            unknown_letters=decoded.unknown,
+            started_at=self._body_start,
+            ended_at=ended_at,
+            letters=units,
+            valid=decoded.valid,
+        ))
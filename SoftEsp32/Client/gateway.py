@@ -0,0 +1,212 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from serial.tools import list_ports
+
+from reader import SerialLineReader
+
+DEFAULT_SOURCE = "esp32_color_sensor"
+# USB-UART мосты и встроенный USB плат ESP32
+DEFAULT_MATCH = "CP210|Silicon Labs|CH910|Espressif|USB JTAG"
+
+
+def discover_ports(pattern):
+    """USB-порты, у которых описание, производитель или hwid подходят под pattern"""
+    regex = re.compile(pattern, re.IGNORECASE)
+    ports = []
+    for info in list_ports.comports():
+        if info.vid is None:
+            continue
+        fields = (info.description, info.manufacturer, info.product, info.hwid)
+        if any(field and regex.search(field) for field in fields):
+            ports.append(info.device)
+    return sorted(ports)
+
+
+def default_source(port):
+    """source сообщений приёмника: общее имя и имя порта (COM12, ttyUSB0)"""
+    return f"{DEFAULT_SOURCE}:{os.path.basename(port)}"
+
+
+def parse_port_spec(spec):
+    """'PORT' или 'PORT=SOURCE' -> (порт, source)"""
+    port, _, source = spec.partition("=")
+    return port, source or default_source(port)
+
+
+def make_submitter(uploader, source=DEFAULT_SOURCE):
+    """Функция постановки декодированного текста в очередь отправки"""
+    def submit(message):
+        # Формируем данные для отправки
+        uploader.submit({
+            "message": message,
+            "timestamp": datetime.now().isoformat(),
+            "source": source
+        })
+
+    return submit
+
+
+class Receiver:
+    """Один приёмник: поток чтения порта, обработчик строк и счётчики"""
+
+    RATE_WINDOW = 60.0
+
+    def __init__(self, port, source, baudrate, uploader, make_handler):
+        self.port = port
+        self.source = source
+        self.started_at = time.monotonic()
+        self.messages = 0
+        self.unknown_letters = 0
+        self.esp32_errors = 0
+        self._line_times = deque()
+        self._submit = make_submitter(uploader, source)
+        self._handle_line = make_handler(self.submit)
+        self.reader = SerialLineReader(port, baudrate, on_line=self.handle_line)
+
+    def submit(self, message):
+        self.messages += 1
+        self.unknown_letters += message.count("?")
+        self._submit(message)
+
+    def handle_line(self, line):
+        now = time.monotonic()
+        self._line_times.append(now)
+        while self._line_times and self._line_times[0] < now - self.RATE_WINDOW:
+            self._line_times.popleft()
+        if line == "ERROR":
+            self.esp32_errors += 1
+        self._handle_line(line)
+
+    def line_rate(self):
+        """Строк в секунду за последние RATE_WINDOW секунд"""
+        now = time.monotonic()
+        window = min(self.RATE_WINDOW, max(now - self.started_at, 1e-9))
+        return sum(1 for t in list(self._line_times) if t >= now - window) / window
+
+    def stats(self):
+        return {
+            "port": self.port,
+            "source": self.source,
+            "connected": self.reader.connected,
+            "lines": self.reader.lines,
+            "line_rate": round(self.line_rate(), 3),
+            "messages": self.messages,
+            "unknown_letters": self.unknown_letters,
+            "esp32_errors": self.esp32_errors,
+            "handler_errors": self.reader.errors,
+            "reconnects": self.reader.reconnects,
+            "overflows": self.reader.overflows,
+        }
+
+
+class Gateway:
+    """Шлюз: любое число приёмников ESP32 в одном процессе
+
+    Каждый порт читает свой SerialLineReader — поток, заблокированный в read(),
+    почти не расходует CPU, — а все сообщения уходят через один Uploader с общим
+    keep-alive соединением. Сообщения помечаются source своего приёмника.
+    С auto_pattern порты ищутся каждые scan_interval секунд: новые подключаются,
+    исчезнувшие из системы отключаются.
+    """
+
+    def __init__(self, uploader, make_handler, baudrate=9600, auto_pattern=None, scan_interval=2.0):
+        self.uploader = uploader
+        self.make_handler = make_handler
+        self.baudrate = baudrate
+        self.auto_pattern = auto_pattern
+        self.scan_interval = scan_interval
+        self.receivers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._scanner = None
+
+    def add(self, port, source=None):
+        with self._lock:
+            if port in self.receivers:
+                return self.receivers[port]
+            receiver = Receiver(port, source or default_source(port), self.baudrate,
+                                self.uploader, self.make_handler)
+            self.receivers[port] = receiver
+        print(f"Приёмник {port} -> source {receiver.source}")
+        receiver.reader.start()
+        return receiver
+
+    def remove(self, port):
+        with self._lock:
+            receiver = self.receivers.pop(port, None)
+        if receiver is not None:
+            receiver.reader.stop()
+            print(f"Приёмник {port} отключён")
+
+    def start(self):
+        if self.auto_pattern:
+            self._scanner = threading.Thread(target=self._scan, name="port-scanner", daemon=True)
+            self._scanner.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._scanner is not None:
+            self._scanner.join(5)
+            self._scanner = None
+        for port in list(self.receivers):
+            self.remove(port)
+
+    def _scan(self):
+        while not self._stop.is_set():
+            try:
+                found = set(discover_ports(self.auto_pattern))
+                for port in sorted(found - set(self.receivers)):
+                    self.add(port)
+                for port in set(self.receivers) - found:
+                    self.remove(port)
+            except Exception as e:
+                print(f"Ошибка поиска портов: {e}")
+            self._stop.wait(self.scan_interval)
+
+    def stats(self):
+        with self._lock:
+            receivers = [self.receivers[port] for port in sorted(self.receivers)]
+        return {
+            "receivers": [receiver.stats() for receiver in receivers],
+            "uploader": self.uploader.stats(),
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        for item in stats["receivers"]:
+            state = "подключён" if item["connected"] else "нет связи"
+            print(f"  {item['port']} ({item['source']}, {state}): {item['line_rate']} строк/с, "
+                  f"сообщений {item['messages']}, ошибок ESP32 {item['esp32_errors']}, "
+                  f"обработки {item['handler_errors']}, переподключений {item['reconnects']}")
+        print(f"  Отправка: {stats['uploader']}")
+
+    def serve_stats(self, port, host="127.0.0.1"):
+        """GET /stats с состоянием приёмников в JSON, в фоновом потоке"""
+        gateway = self
+
+        class StatsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/stats":
+                    self.send_error(404)
+                    return
+                body = json.dumps(gateway.stats(), ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), StatsHandler)
+        threading.Thread(target=server.serve_forever, name="stats-http", daemon=True).start()
+        print(f"Статистика приёмников: http://{host}:{port}/stats")
+        return server
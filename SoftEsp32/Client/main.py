@@ -1,93 +1,123 @@
-import serial
-import requests
-import time
-import json
-from datetime import datetime
-
-# Глобальная переменная для serial соединения
-ser = None
-
-def simple_esp32_client(serial_port, server_url):
-    """Клиент для получения только декодированных сообщений"""
-    global ser
+import argparse
+import threading
+
+from linecodec import CODECS, DEFAULT_CODEC
+
+from gateway import DEFAULT_MATCH, Gateway, parse_port_spec
+from uploader import Uploader
+
+
+def make_decoder(submit, codec=DEFAULT_CODEC):
+    """Декодер сырых отсчётов датчика, отправляющий готовые сообщения через submit"""
+    from decoder import LineStreamDecoder
     
-    try:
-        # Подключаемся к serial порту
-        ser = serial.Serial(serial_port, 9600, timeout=1)
-        time.sleep(2)
-        print(f"Подключено к {serial_port}")
-        print("Ожидание декодированных сообщений...")
+    def on_message(decoded):
+        if not decoded.valid:
+            # Повреждённое сообщение не отправляем: передатчик его повторит
+            print(f"⚠️ Отброшено повреждённое сообщение ({len(decoded.symbols)} символов)")
+            return
+        print(f"📨 Получено сообщение: {decoded.text} "
+              f"(уверенность {decoded.confidence:.0%}, неизвестных букв: {decoded.unknown_letters})")
+        submit(decoded.text)
+    
+    return LineStreamDecoder(on_message, codec=codec)
+
+
+def make_line_handler(submit, decoder=None):
+    """Обработчик строк от ESP32
+
+    Если передан decoder (LineStreamDecoder), строки SAMPLE: с сырыми
+    отсчётами датчика декодируются на хосте.
+    """
+    def handle_line(line):
+        if decoder is not None and decoder.feed_line(line):
+            return
         
-        while True:
-            try:
-                if ser.in_waiting > 0:
-                    # Читаем строку
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    
-                    if line:
-                        # Фильтруем только сообщения с декодированным текстом
-                        if line.startswith("MESSAGE:"):
-                            message = line.replace("MESSAGE:", "").strip()
-                            print(f"📨 Получено сообщение: {message}")
-                            
-                            # Формируем данные для отправки
-                            data = {
-                                "message": message,
-                                "timestamp": datetime.now().isoformat(),
-                                "source": "esp32_color_sensor"
-                            }
-                            
-                            # Отправляем на сервер
-                            try:
-                                response = requests.post(
-                                    server_url,
-                                    json=data,
-                                    headers={'Content-Type': 'application/json'},
-                                    timeout=5
-                                )
-                                if response.status_code == 200:
-                                    print("✓ Сообщение отправлено на сервер")
-                                else:
-                                    print(f"✗ Ошибка отправки: {response.status_code}")
-                            except Exception as e:
-                                print(f"✗ Ошибка связи с сервером: {e}")
-                        
-                        # Также выводим статусные сообщения
-                        elif line in ["READY", "ERROR"]:
-                            print(f"Статус ESP32: {line}")
-            
-            except serial.SerialException as e:
-                print(f"Ошибка Serial порта: {e}")
-                break
-            except Exception as e:
-                print(f"Ошибка: {e}")
-            
-            time.sleep(0.1)
-            
-    except Exception as e:
-        print(f"Критическая ошибка: {e}")
-    finally:
-        close_serial()
+        # Фильтруем только сообщения с декодированным текстом
+        if line.startswith("MESSAGE:"):
+            message = line[len("MESSAGE:"):].strip()
+            print(f"📨 Получено сообщение: {message}")
+            submit(message)
+        
+        # Также выводим статусные сообщения
+        elif line in ["READY", "ERROR"]:
+            print(f"Статус ESP32: {line}")
+    
+    return handle_line
 
-def close_serial():
-    """Функция для закрытия serial соединения"""
-    global ser
-    if ser is not None and ser.is_open:
-        ser.close()
-        print("Serial соединение закрыто")
-        ser = None
 
-# Обработка завершения программы
-import atexit
-atexit.register(close_serial)
+def make_handler_factory(raw_samples=False, codec=DEFAULT_CODEC):
+    """Обработчик строк для каждого нового приёмника; submit у каждого свой"""
+    def make_handler(submit):
+        decoder = make_decoder(submit, codec) if raw_samples else None
+        return make_line_handler(submit, decoder)
+
+    return make_handler
+
+
+def esp32_gateway(ports, server_url, raw_samples=False, auto_pattern=None,
+                  stats_port=None, stats_interval=60.0, codec=DEFAULT_CODEC):
+    """Шлюз для любого числа ESP32: ports — 'PORT' или 'PORT=SOURCE'
+
+    raw_samples=True — ESP32 прошиты с RAW_SAMPLES и декодирование идёт на хосте.
+    codec — линейный код передатчика (LINE_CODEC у MinBackend); прошивка
+    ESP32 сама декодирует только morse, остальные требуют raw_samples.
+    auto_pattern — подключать найденные USB-порты на ходу.
+    """
+    # Отправка идёт в отдельном потоке, чтение serial не ждёт сервер
+    uploader = Uploader(server_url)
+    uploader.start()
+
+    gateway = Gateway(
+        uploader,
+        make_handler_factory(raw_samples, codec),
+        baudrate=115200 if raw_samples else 9600,
+        auto_pattern=auto_pattern,
+    )
+    for spec in ports:
+        gateway.add(*parse_port_spec(spec))
+    gateway.start()
+    stats_server = gateway.serve_stats(stats_port) if stats_port else None
+    print("Ожидание декодированных сообщений...")
+
+    try:
+        # Блокируется до Ctrl+C; приёмники переподключаются сами
+        stop = threading.Event()
+        while not stop.wait(stats_interval):
+            gateway.print_stats()
+    finally:
+        if stats_server is not None:
+            stats_server.shutdown()
+        gateway.stop()
+        uploader.stop()
+        gateway.print_stats()
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Шлюз ESP32: serial -> сервер сообщений")
+    parser.add_argument("--port", action="append", dest="ports",
+                        help="serial порт ESP32, можно несколько; PORT=SOURCE задаёт source сообщений")
+    parser.add_argument("--auto", action="store_true", help="подключать найденные USB-порты ESP32 на ходу")
+    parser.add_argument("--match", default=DEFAULT_MATCH, help="шаблон описания порта для --auto")
+    parser.add_argument("--server", default="http://localhost:7999/api/data", help="адрес POST /api/data")
+    parser.add_argument("--raw", action="store_true", help="ESP32 шлёт сырые отсчёты SAMPLE:, декодировать на хосте")
+    parser.add_argument("--codec", choices=list(CODECS), default=DEFAULT_CODEC,
+                        help="линейный код передатчика; кроме morse, только вместе с --raw")
+    parser.add_argument("--stats-port", type=int, help="порт HTTP для GET /stats со счётчиками приёмников")
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="период вывода статистики, с")
+    args = parser.parse_args()
+    if args.codec != "morse" and not args.raw:
+        parser.error("прошивка ESP32 декодирует только morse, для --codec нужен --raw")
+
     try:
-        simple_esp32_client(
-            serial_port="COM12",
-            server_url="http://localhost:7999/api/data"
+        esp32_gateway(
+            ports=args.ports or ([] if args.auto else ["COM12"]),
+            server_url=args.server,
+            raw_samples=args.raw,
+            auto_pattern=args.match if args.auto else None,
+            stats_port=args.stats_port,
+            stats_interval=args.stats_interval,
+            codec=args.codec
         )
     except KeyboardInterrupt:
         print("\nПрограмма завершена пользователем")
-    finally:
-        close_serial()
\ No newline at end of file
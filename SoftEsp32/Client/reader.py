@@ -0,0 +1,110 @@
+import threading
+
+import serial
+
+
+class SerialLineReader:
+    """Событийное чтение строк из serial порта
+
+    Поток блокируется в ser.read() до прихода данных (без опроса in_waiting и sleep),
+    режет строки из переиспользуемого bytearray и вызывает on_line(line) для каждой.
+    При ошибке порта (например, после переподключения USB) порт переоткрывается
+    автоматически с нарастающей задержкой.
+    """
+
+    def __init__(self, port, baudrate=9600, on_line=None, on_status=None,
+                 read_timeout=1.0, reconnect_delay=0.5, max_reconnect_delay=10.0,
+                 max_line_length=4096):
+        self.port = port
+        self.baudrate = baudrate
+        self.on_line = on_line or (lambda line: None)
+        self.on_status = on_status or (lambda status: print(status))
+        self.read_timeout = read_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.max_line_length = max_line_length
+
+        self._stop = threading.Event()
+        self._ser = None
+        self._thread = None
+
+        self.lines = 0
+        self.reconnects = 0
+        self.overflows = 0
+        self.errors = 0
+
+    @property
+    def connected(self):
+        return self._ser is not None and self._ser.is_open
+
+    def start(self):
+        """Запустить чтение в фоновом потоке"""
+        self._thread = threading.Thread(target=self.run, name=f'serial-{self.port}', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        ser = self._ser
+        if ser is not None:
+            try:
+                ser.cancel_read()
+            except Exception:
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        """Читать порт до stop(), переподключаясь при ошибках"""
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                self._ser = serial.Serial(self.port, self.baudrate, timeout=self.read_timeout)
+                self.on_status(f"Подключено к {self.port}")
+                delay = self.reconnect_delay
+                self._read_loop(self._ser)
+            except (serial.SerialException, OSError) as e:
+                if self._stop.is_set():
+                    break
+                self.reconnects += 1
+                self.on_status(f"Ошибка Serial порта {self.port}: {e}. Переподключение через {delay:.1f} с")
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                self._close()
+
+    def _read_loop(self, ser):
+        buffer = bytearray()
+        while not self._stop.is_set():
+            # Блокируется до прихода хотя бы одного байта или read_timeout
+            chunk = ser.read(ser.in_waiting or 1)
+            if not chunk:
+                continue
+            buffer += chunk
+
+            start = 0
+            while True:
+                end = buffer.find(b'\n', start)
+                if end < 0:
+                    break
+                line = buffer[start:end].strip()
+                start = end + 1
+                if line:
+                    self.lines += 1
+                    try:
+                        self.on_line(line.decode('utf-8', errors='ignore'))
+                    except Exception as e:
+                        self.errors += 1
+                        print(f"Ошибка обработки строки: {e}")
+            del buffer[:start]
+
+            # Защита от бесконечной строки без перевода строки (шум на линии)
+            if len(buffer) > self.max_line_length:
+                self.overflows += 1
+                buffer.clear()
+
+    def _close(self):
+        ser, self._ser = self._ser, None
+        if ser is not None and ser.is_open:
+            ser.close()
+            self.on_status(f"Serial соединение {self.port} закрыто")
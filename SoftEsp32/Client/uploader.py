@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Uploader:
+    """Фоновая отправка сообщений на сервер пакетами через постоянное HTTP-соединение
+
+    Чтение serial никогда не ждёт сервер: сообщения кладутся в ограниченную очередь,
+    а рабочий поток отправляет их на POST /api/data/batch, когда набирается
+    batch_size сообщений или самое старое ждёт дольше max_delay секунд.
+    """
+
+    def __init__(self, server_url, batch_size=50, max_delay=0.5, queue_size=1000,
+                 timeout=5, max_retries=5, backoff=0.5, max_backoff=30.0):
+        self.batch_url = server_url.rstrip('/') + '/batch'
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Одно keep-alive соединение на все запросы вместо нового на каждое сообщение
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.headers.update({'Content-Type': 'application/json'})
+
+        self.sent = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='uploader', daemon=True)
+        self._thread.start()
+
+    def submit(self, data):
+        """Поставить сообщение в очередь; никогда не блокирует вызывающий поток"""
+        try:
+            self._queue.put_nowait(data)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"✗ Очередь отправки переполнена, сообщение потеряно (всего потеряно: {self.dropped})")
+            return False
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth(),
+            'sent': self.sent,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+            'failed_batches': self.failed_batches,
+        }
+
+    def stop(self, timeout=10):
+        """Отправить оставшиеся сообщения и остановить поток"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._session.close()
+
+    def _collect_batch(self):
+        """Дождаться первого сообщения и добрать пакет до batch_size или max_delay"""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch):
+        delay = self.backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = self._session.post(self.batch_url, json=batch, timeout=self.timeout)
+                if response.status_code == 201:
+                    result = response.json()
+                    self.sent += result.get('accepted_count', 0)
+                    self._report_rejected(batch, result.get('results', []))
+                    print(f"✓ Отправлено на сервер: {result.get('accepted_count', 0)} "
+                          f"(в очереди: {self.queue_depth()})")
+                    return
+                if response.status_code != 429 and response.status_code < 500:
+                    # Ошибка в самих данных, повтор не поможет
+                    print(f"✗ Сервер отклонил пакет: {response.status_code} {response.text[:200]}")
+                    self.failed_batches += 1
+                    return
+                print(f"✗ Ошибка отправки: {response.status_code}, попытка {attempt}/{self.max_retries}")
+            except requests.RequestException as e:
+                print(f"✗ Ошибка связи с сервером: {e}, попытка {attempt}/{self.max_retries}")
+
+            if attempt < self.max_retries:
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+        self.failed_batches += 1
+        print(f"✗ Пакет из {len(batch)} сообщений не отправлен (в очереди: {self.queue_depth()})")
+
+    def _report_rejected(self, batch, results):
+        for item in results:
+            if item.get('status') == 'rejected':
+                self.rejected += 1
+                print(f"✗ Сообщение отклонено сервером: {batch[item['index']]!r}: {item.get('error')}")
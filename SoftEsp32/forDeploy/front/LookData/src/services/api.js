@@ -37,7 +37,7 @@ class ApiService {
 
   // Get all messages with pagination
   async getMessages(limit = 50, offset = 0) {
-    return this.request(`/api/data?limit=${limit}&offset=${offset}`)
+    return this.request(`/api/data?limit=${limit}&offset=${offset}&include_total=true`)
   }
 
   // Get latest message
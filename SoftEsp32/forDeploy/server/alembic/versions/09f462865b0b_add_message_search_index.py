@@ -0,0 +1,61 @@
+"""Add message search index
+
+Revision ID: 09f462865b0b
+Revises: 81e9169e8a30
+Create Date: 2026-10-18 11:03:17.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '09f462865b0b'
+down_revision: Union[str, Sequence[str], None] = '81e9169e8a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_messages_message_trgm "
+            "ON messages USING gin (message gin_trgm_ops)"
+        )
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+        "message, content='messages', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, message) VALUES (new.id, new.message); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.id, old.message); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF message ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+        "INSERT INTO messages_fts(rowid, message) VALUES (new.id, new.message); END"
+    )
+    # Index the rows that already exist
+    op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_messages_message_trgm")
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_ai")
+    op.execute("DROP TABLE IF EXISTS messages_fts")
@@ -0,0 +1,96 @@
+"""Add time range indexes and typed client time
+
+Revision ID: 24c8bab6de1c
+Revises: 76c2b2f79829
+Create Date: 2026-10-18 20:05:41.913027
+
+"""
+from datetime import datetime, timezone
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '24c8bab6de1c'
+down_revision: Union[str, Sequence[str], None] = '76c2b2f79829'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 10000
+
+
+def _parse_client_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Copy of crud.parse_client_timestamp as of this revision"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.astimezone(timezone.utc)
+        except (ValueError, OverflowError):
+            return None
+    if number >= 1e11:
+        number /= 1000
+    if not 1e9 <= number < 1e11:
+        return None
+    return datetime.fromtimestamp(number, timezone.utc)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    op.add_column('messages', sa.Column('client_time', sa.DateTime(timezone=True), nullable=True))
+
+    # Parse the stored client strings the way the server now does for new messages
+    messages = sa.table(
+        'messages', sa.column('id'), sa.column('client_timestamp'),
+        sa.column('client_time', sa.DateTime(timezone=True))
+    )
+    sqlite = bind.dialect.name == 'sqlite'
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(messages.c.id, messages.c.client_timestamp)
+            .where(messages.c.id > last_id, messages.c.client_timestamp.is_not(None))
+            .order_by(messages.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = []
+        for row in rows:
+            parsed = _parse_client_timestamp(row.client_timestamp)
+            if parsed is not None:
+                # SQLite stores naive UTC
+                updates.append({"row_id": row.id, "parsed": parsed.replace(tzinfo=None) if sqlite else parsed})
+        if updates:
+            bind.execute(
+                messages.update()
+                .where(messages.c.id == sa.bindparam('row_id'))
+                .values(client_time=sa.bindparam('parsed')),
+                updates
+            )
+
+    # The primary key already serves lookups by id
+    op.drop_index('ix_messages_id', table_name='messages', if_exists=True)
+    op.create_index('ix_messages_server_timestamp', 'messages', ['server_timestamp'], unique=False)
+    op.create_index('ix_messages_source_server_timestamp', 'messages', ['source', 'server_timestamp'], unique=False)
+    op.create_index('ix_messages_client_time', 'messages', ['client_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_client_time', table_name='messages')
+    op.drop_index('ix_messages_source_server_timestamp', table_name='messages')
+    op.drop_index('ix_messages_server_timestamp', table_name='messages')
+    op.create_index('ix_messages_id', 'messages', ['id'], unique=False)
+    # Plain ALTER (SQLite 3.35+): batch mode would rebuild the table and lose the search triggers
+    op.execute("ALTER TABLE messages DROP COLUMN client_time")
@@ -0,0 +1,109 @@
+"""Partition messages by month on Postgres
+
+Revision ID: 76c2b2f79829
+Revises: 09f462865b0b
+Create Date: 2026-10-18 19:40:12.204118
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '76c2b2f79829'
+down_revision: Union[str, Sequence[str], None] = '09f462865b0b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months created ahead of now; the server keeps extending this at runtime
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _month_start(timestamp: datetime) -> datetime:
+    timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite has no partitioning; retention deletes rows there
+        return
+
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER TABLE messages_unpartitioned DROP CONSTRAINT messages_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_messages_id")
+    op.execute("DROP INDEX IF EXISTS ix_messages_message_trgm")
+
+    # The primary key of a partitioned table must contain the partition key;
+    # ids stay unique because they all come from the same sequence
+    op.execute(
+        "CREATE TABLE messages ("
+        "id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'), "
+        "message TEXT NOT NULL, "
+        "client_timestamp VARCHAR, "
+        "server_timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(), "
+        "source VARCHAR NOT NULL, "
+        "PRIMARY KEY (id, server_timestamp)"
+        ") PARTITION BY RANGE (server_timestamp)"
+    )
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    now = datetime.now(timezone.utc)
+    first = bind.execute(sa.text("SELECT min(server_timestamp) FROM messages_unpartitioned")).scalar()
+    month = _month_start(first or now)
+    last = _add_months(_month_start(now), PARTITIONS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE messages_p{month:%Y%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+
+    op.execute(
+        "INSERT INTO messages (id, message, client_timestamp, server_timestamp, source) "
+        "SELECT id, message, client_timestamp, server_timestamp, source FROM messages_unpartitioned"
+    )
+    op.execute("DROP TABLE messages_unpartitioned")
+    op.execute("CREATE INDEX ix_messages_id ON messages (id)")
+    op.execute("CREATE INDEX ix_messages_message_trgm ON messages USING gin (message gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Detached partitions kept by the retention policy are left alone
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_messages_id")
+    op.execute("DROP INDEX IF EXISTS ix_messages_message_trgm")
+    op.execute(
+        "CREATE TABLE messages ("
+        "id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'), "
+        "message TEXT NOT NULL, "
+        "client_timestamp VARCHAR, "
+        "server_timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "source VARCHAR NOT NULL, "
+        "PRIMARY KEY (id)"
+        ")"
+    )
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute(
+        "INSERT INTO messages (id, message, client_timestamp, server_timestamp, source) "
+        "SELECT id, message, client_timestamp, server_timestamp, source FROM messages_partitioned"
+    )
+    op.execute("DROP TABLE messages_partitioned")
+    op.execute("CREATE INDEX ix_messages_id ON messages (id)")
+    op.execute("CREATE INDEX ix_messages_message_trgm ON messages USING gin (message gin_trgm_ops)")
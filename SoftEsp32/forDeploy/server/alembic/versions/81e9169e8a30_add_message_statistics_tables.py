@@ -0,0 +1,61 @@
+"""Add message statistics tables
+
+Revision ID: 81e9169e8a30
+Revises: 7536fb4376ee
+Create Date: 2026-10-18 10:12:40.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '81e9169e8a30'
+down_revision: Union[str, Sequence[str], None] = '7536fb4376ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('message_source_stats',
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('message_count', sa.BigInteger(), nullable=False),
+    sa.Column('total_length', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('source')
+    )
+    op.create_table('message_minute_stats',
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('bucket')
+    )
+
+    # Backfill counters from the existing rows
+    op.execute(
+        "INSERT INTO message_source_stats (source, message_count, total_length) "
+        "SELECT source, COUNT(*), COALESCE(SUM(LENGTH(message)), 0) "
+        "FROM messages GROUP BY source"
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "INSERT INTO message_minute_stats (bucket, message_count) "
+            "SELECT date_trunc('minute', server_timestamp), COUNT(*) FROM messages "
+            "WHERE server_timestamp >= now() - interval '1 day' "
+            "GROUP BY 1"
+        )
+    else:
+        # Same text format SQLAlchemy uses when it stores DateTime values in SQLite
+        op.execute(
+            "INSERT INTO message_minute_stats (bucket, message_count) "
+            "SELECT strftime('%Y-%m-%d %H:%M:00.000000', server_timestamp), COUNT(*) FROM messages "
+            "WHERE server_timestamp >= datetime('now', '-1 day') "
+            "GROUP BY 1"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('message_minute_stats')
+    op.drop_table('message_source_stats')
@@ -0,0 +1,204 @@
+"""
+Run the message server benchmark against SQLite and, when reachable, Postgres
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import httpx
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from .load import build_scenarios, run_all
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def postgres_unavailable(url: str) -> Optional[str]:
+    """None if the database accepts connections, otherwise the reason"""
+    try:
+        engine = create_engine(url)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        engine.dispose()
+        return None
+    except (SQLAlchemyError, ImportError) as e:
+        return str(e).splitlines()[0]
+
+
+def wait_ready(process: subprocess.Popen, log_path: str, url: str, timeout: float) -> Dict:
+    """Wait until the server has seeded and answers /health; returns the seeding report"""
+    deadline = time.monotonic() + timeout
+    seeded = None
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with code {process.returncode}, see {log_path}")
+        if seeded is None:
+            with open(log_path, encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    if line.startswith("BENCH_SEEDED "):
+                        seeded = json.loads(line[len("BENCH_SEEDED "):])
+        else:
+            try:
+                if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                    return seeded
+            except httpx.HTTPError:
+                pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Benchmark server did not start in {timeout} s, see {log_path}")
+
+
+def run_backend(name: str, database_url: str, args, workdir: str) -> Dict:
+    print(f"[{name}] seeding {args.rows} rows", flush=True)
+    port = free_port()
+    log_path = os.path.join(workdir, f"server-{name}.log")
+    env = {
+        **os.environ,
+        "PYTHONPATH": SERVER_DIR,
+        "DATABASE_URL": database_url,
+        "DB_ASYNC": "true" if args.db_async else "false",
+    }
+    with open(log_path, "w") as log:
+        # cwd is the scratch directory so the server log and any .env stay out of the tree
+        process = subprocess.Popen(
+            [sys.executable, "-m", "bench.server", "--port", str(port), "--rows", str(args.rows)],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            seeded = wait_ready(process, log_path, url, args.startup_timeout)
+            print(f"[{name}] seeded in {seeded['seconds']} s, running scenarios", flush=True)
+            scenarios = build_scenarios(args.rows, args.offsets, args.seed)
+            results = asyncio.run(run_all(
+                url, args.rows, scenarios, args.requests, args.concurrency, args.warmup, args.only
+            ))
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return {"seed_seconds": seeded["seconds"], **results}
+
+
+def compare(baseline: Dict, current: Dict) -> None:
+    """Print throughput and p95 changes of every scenario present in both reports"""
+    print(f"\nCompared with {baseline['meta'].get('git_revision')} ({baseline['meta'].get('started_at')})")
+    for backend, result in current["backends"].items():
+        old = baseline["backends"].get(backend, {}).get("scenarios")
+        if not old or "scenarios" not in result:
+            continue
+        print(f"[{backend}]")
+        old_digests = baseline["backends"][backend].get("response_digests", {})
+        if baseline["meta"].get("rows") != current["meta"].get("rows"):
+            print("  response bytes: not compared, different --rows")
+        elif old_digests:
+            changed = [
+                name for name, digest in result.get("response_digests", {}).items()
+                if name in old_digests and old_digests[name] != digest
+            ]
+            print(f"  response bytes: {'changed in ' + ', '.join(changed) if changed else 'identical'}")
+        for name, new in result["scenarios"].items():
+            if name not in old:
+                continue
+            rps_change = new["throughput_rps"] / old[name]["throughput_rps"] - 1
+            p95_change = new["latency_ms"]["p95"] / old[name]["latency_ms"]["p95"] - 1
+            print(
+                f"  {name:<22} throughput {rps_change:+7.1%}  p95 {p95_change:+7.1%}  "
+                f"sql/req {old[name]['db_queries_per_request']} -> {new['db_queries_per_request']}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="messages to seed")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests before each scenario")
+    parser.add_argument("--offsets", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[0, 1000, 100_000], help="comma-separated list offsets")
+    parser.add_argument("--only", type=lambda value: value.split(","), help="comma-separated scenario names")
+    parser.add_argument("--sqlite-path", help="SQLite file (default: a temporary file)")
+    parser.add_argument("--no-sqlite", action="store_true", help="skip the SQLite run")
+    parser.add_argument("--postgres-url", default=os.environ.get("BENCH_POSTGRES_URL"),
+                        help="dedicated Postgres database, dropped and re-seeded (env BENCH_POSTGRES_URL)")
+    parser.add_argument("--db-async", action="store_true", help="run the server with DB_ASYNC=true")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of request parameters")
+    parser.add_argument("--startup-timeout", type=float, default=1800, help="seconds to wait for seeding")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    args = parser.parse_args()
+    if args.requests + args.warmup >= args.rows:
+        parser.error("--rows must exceed --requests + --warmup (every delete needs its own row)")
+    return args
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="message-bench-")
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows": args.rows,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "db_async": args.db_async,
+            "logs": workdir,
+        },
+        "backends": {},
+    }
+
+    if not args.no_sqlite:
+        sqlite_path = os.path.abspath(args.sqlite_path or os.path.join(workdir, "bench.db"))
+        report["backends"]["sqlite"] = run_backend("sqlite", f"sqlite:///{sqlite_path}", args, workdir)
+
+    if args.postgres_url:
+        reason = postgres_unavailable(args.postgres_url)
+        if reason is None:
+            report["backends"]["postgresql"] = run_backend("postgresql", args.postgres_url, args, workdir)
+        else:
+            print(f"[postgresql] skipped: {reason}", flush=True)
+            report["backends"]["postgresql"] = {"skipped": reason}
+    else:
+        report["backends"]["postgresql"] = {"skipped": "no --postgres-url or BENCH_POSTGRES_URL"}
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Shape of the seeded benchmark data, shared by the seeder and the load scenarios
+"""
+
+# Message text is "<word> <word> <n>" so that searches have both common and rare hits
+WORDS = [
+    "HELLO", "WORLD", "LIFI", "MORSE", "LIGHT", "SIGNAL", "SENSOR", "COLOR",
+    "RED", "BLUE", "GREEN", "DATA", "PACKET", "FRAME", "STATUS", "READY",
+]
+# Sources besides the default one, spread evenly over the rows
+EXTRA_SOURCES = ["gateway_2", "gateway_3", "gateway_4"]
@@ -0,0 +1,237 @@
+"""
+Concurrent HTTP load scenarios for the message server endpoints
+"""
+import asyncio
+import hashlib
+import itertools
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .dataset import WORDS
+
+# Seeded row i has server_timestamp EPOCH + i seconds (see seed.EPOCH)
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# (method, path, json body) for the n-th request of a scenario
+RequestFactory = Callable[[int], Tuple[str, str, Optional[dict]]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    make_request: RequestFactory
+    expected_status: int = 200
+
+
+def build_scenarios(rows: int, offsets: List[int], seed: int = 0) -> List[Scenario]:
+    """
+    Scenarios over a database seeded with ids 1..rows, in execution order.
+
+    Deletes run last and each removes a different seeded row, so no other
+    scenario hits a missing id.
+    """
+    rng = random.Random(seed)
+
+    def create(n):
+        return "POST", "/api/data", {
+            "message": f"BENCH {rng.choice(WORDS)} {n}",
+            "timestamp": str(n),
+            "source": "bench",
+        }
+
+    def create_no_wait(n):
+        method, path, body = create(n)
+        return method, f"{path}?wait=false", body
+
+    def by_id(n):
+        return "GET", f"/api/data/{rng.randint(1, rows)}", None
+
+    def search_common(n):
+        return "GET", f"/api/search?query={WORDS[n % len(WORDS)]}", None
+
+    def search_rare(n):
+        return "GET", f"/api/search?query={rng.randint(1, rows)}", None
+
+    def time_range(n):
+        since = EPOCH + timedelta(seconds=rng.randint(1, max(1, rows - 3600)))
+        until = since + timedelta(hours=1)
+        return "GET", f"/api/data/range?since={since:%Y-%m-%dT%H:%M:%SZ}&until={until:%Y-%m-%dT%H:%M:%SZ}", None
+
+    def delete(n):
+        return "DELETE", f"/api/data/{rows - n}", None
+
+    scenarios = [
+        Scenario("create", create, 201),
+        # Queued for the group-commit writer without waiting for storage
+        Scenario("create_no_wait", create_no_wait, 202),
+        Scenario("latest", lambda n: ("GET", "/api/data/latest", None)),
+        Scenario("by_id", by_id),
+    ]
+    for offset in offsets:
+        if offset < rows:
+            scenarios.append(Scenario(
+                f"list_offset_{offset}",
+                lambda n, offset=offset: ("GET", f"/api/data?limit=50&offset={offset}", None)
+            ))
+    scenarios += [
+        Scenario("list_with_total", lambda n: ("GET", "/api/data?limit=50&include_total=true", None)),
+        Scenario(
+            "list_keyset_middle",
+            lambda n: ("GET", f"/api/data?limit=50&before_id={rows // 2}", None)
+        ),
+        # The largest page: dominated by row materialization and JSON encoding
+        Scenario(
+            "list_page_1000",
+            lambda n: ("GET", f"/api/data?limit=1000&before_id={rows // 2}", None)
+        ),
+        Scenario("stats", lambda n: ("GET", "/api/stats", None)),
+        Scenario("range_hour", time_range),
+        # One day of seeded rows, 1440 buckets x sources, grouped by the database
+        Scenario(
+            "aggregate_day_by_source",
+            lambda n: ("GET", "/api/aggregate?bucket=1m&group_by=source"
+                              "&since=2025-01-01T00:00:00Z&until=2025-01-02T00:00:00Z", None)
+        ),
+        Scenario("search_common", search_common),
+        Scenario("search_rare", search_rare),
+        Scenario("delete", delete),
+    ]
+    return scenarios
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def digest_requests(rows: int) -> Dict[str, str]:
+    """
+    GET requests over seeded rows whose responses depend only on the seed.
+
+    Their body digests are stored in the results, so a changed serializer or
+    query shows up as a mismatch against a baseline run of an earlier commit.
+    """
+    return {
+        "list_first_page": "/api/data?limit=1000&include_total=true",
+        "list_offset": f"/api/data?limit=100&offset={min(1000, rows // 2)}",
+        "list_keyset": f"/api/data?limit=1000&before_id={rows // 2}",
+        "list_after": f"/api/data?limit=1000&after_id={rows // 3}",
+        "latest": "/api/data/latest",
+        "by_id": f"/api/data/{rows // 3}",
+        "search_common": f"/api/search?query={WORDS[0]}&limit=100",
+        "search_rare": f"/api/search?query={rows // 7}&limit=100",
+        "search_short": "/api/search?query=LI&limit=100",
+        "stats_exact": "/api/stats?exact=true",
+        "range": "/api/data/range?since=2025-01-01T01:00:00Z&until=2025-01-01T02:00:00Z&limit=1000",
+        "aggregate": "/api/aggregate?bucket=5m&group_by=source&since=2025-01-01T00:00:00Z&until=2025-01-02T00:00:00Z",
+    }
+
+
+async def response_digests(client: httpx.AsyncClient, rows: int) -> Dict[str, str]:
+    """sha256 of each digest request's status and body; run before anything modifies the data"""
+    digests = {}
+    for name, path in digest_requests(rows).items():
+        response = await client.get(path)
+        digests[name] = hashlib.sha256(f"{response.status_code}\n".encode() + response.content).hexdigest()
+    return digests
+
+
+async def _read_query_count(client: httpx.AsyncClient) -> int:
+    response = await client.get("/__bench__/queries")
+    response.raise_for_status()
+    return response.json()["queries"]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+) -> Dict:
+    """Send `requests` requests from `concurrency` workers and summarize latencies"""
+    # Warmup requests are numbered after the measured ones so deletes stay unique
+    for n in range(requests, requests + warmup):
+        method, path, body = scenario.make_request(n)
+        await client.request(method, path, json=body)
+
+    numbers = itertools.count()
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def worker():
+        while True:
+            n = next(numbers)
+            if n >= requests:
+                return
+            method, path, body = scenario.make_request(n)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    queries_before = await _read_query_count(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries = await _read_query_count(client) - queries_before
+
+    latencies.sort()
+    errors = sum(count for code, count in statuses.items() if code != str(scenario.expected_status))
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": dict(statuses),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+        "db_queries": queries,
+        "db_queries_per_request": round(queries / requests, 3),
+    }
+
+
+async def run_all(
+    base_url: str,
+    rows: int,
+    scenarios: List[Scenario],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    only: Optional[List[str]] = None,
+) -> Dict[str, Dict]:
+    """Record response digests, then run the scenarios; returns both"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        results["response_digests"] = await response_digests(client, rows)
+        results["scenarios"] = {}
+        for scenario in scenarios:
+            if only and scenario.name not in only:
+                continue
+            result = await run_scenario(client, scenario, requests, concurrency, warmup)
+            results["scenarios"][scenario.name] = result
+            latency = result["latency_ms"]
+            print(
+                f"  {scenario.name:<22} {result['throughput_rps']:>9.1f} req/s  "
+                f"p50 {latency['p50']:>8.2f} ms  p95 {latency['p95']:>8.2f} ms  "
+                f"p99 {latency['p99']:>8.2f} ms  sql/req {result['db_queries_per_request']:>6.2f}  "
+                f"errors {result['errors']}",
+                flush=True
+            )
+    return results
@@ -0,0 +1,131 @@
+"""
+Fast bulk seeding of the messages table for benchmarks
+"""
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from src.database import Base
+from src.models import DEFAULT_SOURCE
+from src.search import SQLITE_SEARCH_DDL
+from .dataset import EXTRA_SOURCES, WORDS
+
+SOURCES = [DEFAULT_SOURCE] + EXTRA_SOURCES
+
+CHUNK_SIZE = 100_000
+
+# Row i is stamped EPOCH + i seconds plus a varying microsecond part, so identical
+# seeds give identical responses and runs of different commits can be compared byte for byte
+EPOCH = "2025-01-01 00:00:00"
+
+SQLITE_SEQUENCE = (
+    "WITH RECURSIVE seq(i) AS (SELECT :start UNION ALL SELECT i + 1 FROM seq WHERE i < :stop) "
+)
+SQLITE_INSERT = (
+    "INSERT INTO messages (message, client_timestamp, server_timestamp, source) "
+    "SELECT w1.word || ' ' || w2.word || ' ' || seq.i, NULL, "
+    "strftime('%Y-%m-%d %H:%M:%S', :epoch, '+' || seq.i || ' seconds') "
+    "|| '.' || printf('%06d', (seq.i * 7919) % 1000000), s.source "
+    "FROM seq "
+    "JOIN bench_words w1 ON w1.id = seq.i % :words "
+    "JOIN bench_words w2 ON w2.id = (seq.i / :words) % :words "
+    "JOIN bench_sources s ON s.id = seq.i % :sources"
+)
+POSTGRES_INSERT = (
+    "INSERT INTO messages (message, client_timestamp, server_timestamp, source) "
+    "SELECT w1.word || ' ' || w2.word || ' ' || seq.i, NULL, "
+    "CAST(:epoch || '+00' AS timestamptz) + seq.i * interval '1 second' "
+    "+ ((seq.i * 7919) % 1000000) * interval '1 microsecond', s.source "
+    "FROM generate_series(:start, :stop) AS seq(i) "
+    "JOIN bench_words w1 ON w1.id = seq.i % :words "
+    "JOIN bench_words w2 ON w2.id = (seq.i / :words) % :words "
+    "JOIN bench_sources s ON s.id = seq.i % :sources"
+)
+
+# Same backfill as the statistics migration
+SOURCE_STATS_BACKFILL = (
+    "INSERT INTO message_source_stats (source, message_count, total_length) "
+    "SELECT source, COUNT(*), COALESCE(SUM(LENGTH(message)), 0) "
+    "FROM messages GROUP BY source"
+)
+MINUTE_STATS_BACKFILL = {
+    "postgresql": (
+        "INSERT INTO message_minute_stats (bucket, message_count) "
+        "SELECT date_trunc('minute', server_timestamp), COUNT(*) FROM messages "
+        "WHERE server_timestamp >= now() - interval '1 day' "
+        "GROUP BY 1"
+    ),
+    "sqlite": (
+        "INSERT INTO message_minute_stats (bucket, message_count) "
+        "SELECT strftime('%Y-%m-%d %H:%M:00.000000', server_timestamp), COUNT(*) FROM messages "
+        "WHERE server_timestamp >= datetime('now', '-1 day') "
+        "GROUP BY 1"
+    ),
+}
+
+SQLITE_SEARCH_TRIGGERS = ["messages_fts_ai", "messages_fts_ad", "messages_fts_au"]
+
+
+def _create_lookup_tables(conn) -> None:
+    for name, column, values in (
+        ("bench_words", "word", WORDS),
+        ("bench_sources", "source", SOURCES),
+    ):
+        conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        conn.execute(text(f"CREATE TEMPORARY TABLE {name} (id INTEGER PRIMARY KEY, {column} TEXT)"))
+        conn.execute(
+            text(f"INSERT INTO {name} (id, {column}) VALUES (:id, :value)"),
+            [{"id": i, "value": value} for i, value in enumerate(values)]
+        )
+
+
+def seed_messages(engine: Engine, rows: int) -> float:
+    """
+    Recreate all tables and fill messages with `rows` rows, ids 1..rows.
+
+    Statistics counters and the search index are rebuilt to match.
+    Returns the elapsed time in seconds.
+    """
+    started = time.perf_counter()
+    dialect = engine.dialect.name
+    Base.metadata.drop_all(bind=engine)
+    if dialect == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS messages_fts"))
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        _create_lookup_tables(conn)
+        if dialect == "sqlite":
+            # Indexing row by row through the triggers is far slower than one rebuild
+            for trigger in SQLITE_SEARCH_TRIGGERS:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            statement = text(SQLITE_SEQUENCE + SQLITE_INSERT)
+        else:
+            statement = text(POSTGRES_INSERT)
+
+        for start in range(1, rows + 1, CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE - 1, rows)
+            conn.execute(statement, {
+                "start": start, "stop": stop, "epoch": EPOCH,
+                "words": len(WORDS), "sources": len(SOURCES),
+            })
+            print(f"  seeded {stop}/{rows} rows", flush=True)
+
+        if dialect == "sqlite":
+            conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+            # Recreate the triggers dropped above
+            for ddl in SQLITE_SEARCH_DDL[1:]:
+                conn.execute(text(ddl))
+
+        conn.execute(text(SOURCE_STATS_BACKFILL))
+        conn.execute(text(MINUTE_STATS_BACKFILL[dialect]))
+
+    if dialect == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE messages"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    return time.perf_counter() - started
@@ -0,0 +1,61 @@
+"""
+Benchmark target: seeds the database, counts SQL statements and serves src.main:app.
+
+Run by bench.__main__ in a subprocess with DATABASE_URL (and optionally DB_ASYNC)
+in the environment, so the app is configured exactly as in production.
+"""
+import argparse
+import json
+import threading
+
+import uvicorn
+from sqlalchemy import event
+
+from src.database import async_engine, engine
+from src.main import app
+from .seed import seed_messages
+
+
+class QueryCounter:
+    """Number of SQL statements executed by the attached engines"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def attach(self, target_engine) -> None:
+        event.listen(target_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        with self._lock:
+            self.count += 1
+
+
+query_counter = QueryCounter()
+
+
+@app.get("/__bench__/queries", include_in_schema=False)
+def bench_queries():
+    """SQL statements executed since start, read before and after each scenario"""
+    return {"queries": query_counter.count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded message server for benchmarks")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--rows", type=int, required=True)
+    args = parser.parse_args()
+
+    seconds = seed_messages(engine, args.rows)
+    # The parent reads this line from the log to report seeding time
+    print("BENCH_SEEDED " + json.dumps({"rows": args.rows, "seconds": round(seconds, 3)}), flush=True)
+
+    query_counter.attach(engine)
+    if async_engine is not None:
+        query_counter.attach(async_engine.sync_engine)
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
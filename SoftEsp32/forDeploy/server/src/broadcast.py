@@ -0,0 +1,215 @@
+"""
+Broadcast hub that fans new messages out to stream subscribers.
+
+The hub itself is per process. With several workers (src.serve) a relay
+carries every published message to the other workers over Redis pub/sub, so
+/api/stream, /ws and long-polling GET /api/data see messages posted to any
+worker.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Callable, List, Optional, Set
+
+import orjson
+
+from .config import config as conf
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    # Redis is an optional extra (pip install server[redis])
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Bounded event queue of a single subscriber.
+
+    When the subscriber falls behind, the oldest events are dropped so that
+    publishing never waits for a slow client.
+    """
+
+    def __init__(self, hub: "BroadcastHub", maxsize: int):
+        self._hub = hub
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event: Optional[dict]) -> None:
+        """Enqueue an event without blocking, dropping the oldest one when full"""
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except asyncio.QueueFull:
+                self._queue.get_nowait()
+                self.dropped += 1
+
+    async def get(self) -> Optional[dict]:
+        """Wait for the next event; None means the hub is shutting down"""
+        return await self._queue.get()
+
+    def close(self) -> None:
+        """Stop receiving events"""
+        self._hub.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class RedisRelay:
+    """
+    Carries hub messages between worker processes over a Redis channel.
+
+    Each worker delivers its own messages locally and skips them when they come
+    back from Redis. Messages published while Redis is unreachable reach only
+    the local subscribers; the listener reconnects on its own.
+    """
+
+    def __init__(self, url: str, channel: str):
+        self.client = redis.from_url(url)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._outgoing: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, deliver: Callable[[dict], None]) -> None:
+        """Start sending and listening; deliver gets messages of the other workers"""
+        self._tasks = [
+            asyncio.create_task(self._send()),
+            asyncio.create_task(self._listen(deliver)),
+        ]
+
+    def publish(self, message: dict) -> None:
+        self._outgoing.put_nowait(message)
+
+    async def _send(self) -> None:
+        while True:
+            message = await self._outgoing.get()
+            try:
+                await self.client.publish(
+                    self.channel, orjson.dumps({"origin": self.origin, "message": message})
+                )
+            except Exception as e:
+                logger.error(f"Stream relay publish failed: {e}")
+
+    async def _listen(self, deliver: Callable[[dict], None]) -> None:
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for item in pubsub.listen():
+                        if item["type"] != "message":
+                            continue
+                        event = orjson.loads(item["data"])
+                        if event["origin"] != self.origin:
+                            deliver(event["message"])
+            except Exception as e:
+                logger.error(f"Stream relay lost Redis, reconnecting: {e}")
+                await asyncio.sleep(1.0)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.client.aclose()
+
+
+def create_relay():
+    """Relay selected by Config.STREAM_RELAY_BACKEND; None keeps the hub in-process"""
+    kind = conf.STREAM_RELAY_BACKEND
+    if kind == "off":
+        return None
+    if kind == "redis":
+        if redis is None:
+            raise RuntimeError("STREAM_RELAY_BACKEND=redis требует пакет redis (pip install server[redis])")
+        return RedisRelay(conf.STREAM_RELAY_REDIS_URL, conf.STREAM_RELAY_CHANNEL)
+    raise ValueError(f"Неизвестный STREAM_RELAY_BACKEND: {kind}")
+
+
+class BroadcastHub:
+    """Publishes events from the create path to every open subscription"""
+
+    def __init__(self, queue_size: int = 100, relay: Optional[RedisRelay] = None):
+        self.queue_size = queue_size
+        self.relay = relay
+        self.last_id = 0
+        self._subscriptions: Set[Subscription] = set()
+        self._new_message: Optional[asyncio.Event] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self) -> Subscription:
+        """Open a new subscription; use it as a context manager to close it"""
+        subscription = Subscription(self, self.queue_size)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def start(self) -> None:
+        """Connect the relay, if any; call from the running event loop"""
+        if self.relay is not None:
+            self.relay.start(self._deliver)
+
+    def publish_message(self, message: dict) -> None:
+        """
+        Announce a newly created message (JSON-ready MessageResponse dict).
+
+        Must be called from the event loop thread.
+        """
+        self._deliver(message)
+        if self.relay is not None:
+            self.relay.publish(message)
+
+    def _deliver(self, message: dict) -> None:
+        """Hand a message to the subscribers and long-polls of this process"""
+        event = {"type": "new_message", "message": message}
+        for subscription in self._subscriptions:
+            subscription.put(event)
+
+        self.last_id = max(self.last_id, message["id"])
+        if self._new_message is not None:
+            self._new_message.set()
+            self._new_message = None
+
+    async def wait_for_newer(self, since_id: int, timeout: float) -> bool:
+        """
+        Wait until a message with id > since_id is published or timeout expires.
+
+        Returns True if such a message was seen.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.last_id <= since_id:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            if self._new_message is None:
+                self._new_message = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._new_message.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def close(self) -> None:
+        """Tell every subscriber to finish and stop the relay (used on shutdown)"""
+        for subscription in list(self._subscriptions):
+            subscription.put(None)
+        self._subscriptions.clear()
+        if self.relay is not None:
+            await self.relay.close()
+
+
+# Create instance for easy import
+hub = BroadcastHub(queue_size=conf.STREAM_QUEUE_SIZE, relay=create_relay())
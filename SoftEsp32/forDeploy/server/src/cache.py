@@ -0,0 +1,193 @@
+"""
+Read-through cache of hot GET responses with ETag revalidation.
+
+Every committed write bumps a data version; cache keys and ETags include it,
+so a bump invalidates everything at once without tracking which response
+depends on which rows.
+"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+
+from .config import config as conf
+from .metrics import record_cache
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    # Redis is an optional extra (pip install server[redis])
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """LRU of response bodies in this process; the version is per process too"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # Start from the clock so ETags issued before a restart do not match again
+        self.version = time.time_ns()
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get_version(self) -> int:
+        return self.version
+
+    async def bump_version(self) -> int:
+        self.version += 1
+        # Keys of older versions can never be hit again
+        self._entries.clear()
+        return self.version
+
+    async def get(self, key: str) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    async def set(self, key: str, body: bytes) -> None:
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisBackend:
+    """
+    Entries and the version in a Redis-compatible server, shared by every
+    worker process. Entries of old versions are left to expire.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float, prefix: str):
+        self.client = redis.from_url(url)
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.prefix = prefix
+        self.version_key = f"{prefix}:version"
+
+    async def get_version(self) -> int:
+        value = await self.client.get(self.version_key)
+        if value is None:
+            # First use or a flushed server: start from the clock, as MemoryBackend does
+            await self.client.set(self.version_key, time.time_ns(), nx=True)
+            value = await self.client.get(self.version_key)
+        return int(value)
+
+    async def bump_version(self) -> int:
+        return await self.client.incr(self.version_key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(f"{self.prefix}:{key}")
+
+    async def set(self, key: str, body: bytes) -> None:
+        await self.client.set(f"{self.prefix}:{key}", body, ex=self.ttl_seconds)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_backend():
+    """Backend selected by Config.RESPONSE_CACHE_BACKEND; None disables caching"""
+    kind = conf.RESPONSE_CACHE_BACKEND
+    if kind == "off":
+        return None
+    if kind == "memory":
+        return MemoryBackend(conf.RESPONSE_CACHE_MAX_ENTRIES)
+    if kind == "redis":
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis требует пакет redis (pip install server[redis])")
+        return RedisBackend(conf.RESPONSE_CACHE_REDIS_URL, conf.RESPONSE_CACHE_TTL_SECONDS, conf.RESPONSE_CACHE_PREFIX)
+    raise ValueError(f"Неизвестный RESPONSE_CACHE_BACKEND: {kind}")
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class ResponseCache:
+    """Serves cacheable GET routes from the backend and answers If-None-Match with 304"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(request: Request, version: int, slot_seconds: Optional[float]) -> str:
+        query = "&".join(sorted(f"{name}={value}" for name, value in request.query_params.multi_items()))
+        # Responses that also depend on the clock are cached per time slot
+        slot = int(time.time() // slot_seconds) if slot_seconds else 0
+        return f"{version}:{slot}:{request.url.path}?{query}"
+
+    async def respond(
+        self,
+        request: Request,
+        build: Callable[[], Awaitable[Response]],
+        slot_seconds: Optional[float] = None
+    ) -> Response:
+        """
+        Return the cached response for the request, a 304 if the client already
+        has it, or the response from build (stored when it is a 200).
+
+        The version is read before build runs, so a write that lands meanwhile
+        leaves the new entry under the old version, where nobody looks for it.
+        """
+        if self.backend is None:
+            return await build()
+        route = getattr(request.scope.get("route"), "path", request.url.path)
+        try:
+            version = await self.backend.get_version()
+        except Exception as e:
+            logger.error(f"Ошибка кэша ответов: {e}")
+            return await build()
+
+        key = self._key(request, version, slot_seconds)
+        etag = f'"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            record_cache(route, "not_modified")
+            return Response(status_code=304, headers=headers)
+
+        try:
+            body = await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Ошибка кэша ответов: {e}")
+            body = None
+        if body is not None:
+            record_cache(route, "hit")
+            return Response(body, media_type="application/json", headers=headers)
+
+        response = await build()
+        record_cache(route, "miss")
+        if response.status_code == 200:
+            try:
+                await self.backend.set(key, response.body)
+            except Exception as e:
+                logger.error(f"Ошибка кэша ответов: {e}")
+            response.headers.update(headers)
+        return response
+
+    async def invalidate(self) -> None:
+        """Bump the data version; call after every committed write"""
+        if self.backend is None:
+            return
+        try:
+            await self.backend.bump_version()
+        except Exception as e:
+            logger.error(f"Ошибка сброса кэша ответов: {e}")
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+
+
+# Create instance for easy import
+response_cache = ResponseCache(create_backend())
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
   
@@ -5,6 +7,115 @@ class Config(BaseSettings):
 
     DATABASE_URL: str
 
+    # Use AsyncEngine/AsyncSession (asyncpg or aiosqlite) instead of the sync stack
+    DB_ASYNC: bool = False
+    # Explicit async URL; derived from DATABASE_URL when not set
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # Connection pool (ignored for in-memory SQLite, which has a single connection)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # Seconds to wait for a free connection before failing the request
+    DB_POOL_TIMEOUT: float = 30.0
+    # Reopen connections older than this many seconds (-1 keeps them forever)
+    DB_POOL_RECYCLE: int = 1800
+    # Test connections on checkout so database restarts are survived (not used for SQLite)
+    DB_POOL_PRE_PING: bool = True
+
+    # Postgres session limits in milliseconds (0 disables)
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    DB_LOCK_TIMEOUT_MS: int = 5000
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS: int = 60000
+
+    # SQLite performance profile applied to every new connection
+    SQLITE_PERFORMANCE_PROFILE: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # Negative values are KiB, as in PRAGMA cache_size
+    SQLITE_CACHE_SIZE: int = -64000
+    # How long a writer waits for the lock; the SQLite counterpart of the lock timeout
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # Delete messages older than this many days (0 keeps everything). On partitioned
+    # Postgres whole monthly partitions go once they end before the cutoff
+    MESSAGE_RETENTION_DAYS: int = 0
+    # Expired Postgres partitions are dropped, or detached and kept as standalone tables
+    RETENTION_DETACH_PARTITIONS: bool = False
+    # Rows per DELETE where retention removes rows (SQLite, the Postgres default partition)
+    RETENTION_DELETE_BATCH: int = 10000
+    # Monthly Postgres partitions kept created ahead of the current month
+    PARTITIONS_AHEAD_MONTHS: int = 3
+    # How often partitions and retention are checked (0 disables the background task)
+    STORAGE_MAINTENANCE_SECONDS: float = 3600
+
+    # Most buckets one GET /api/aggregate may return (window / bucket width)
+    AGGREGATE_MAX_BUCKETS: int = 10000
+
+    # POST /api/data queues messages for a background writer that commits them in
+    # groups and answers once the group is stored (same 201 response). Off: one
+    # transaction per request. POST /api/data?wait=false (202) always uses the queue
+    INGEST_GROUP_COMMIT: bool = False
+    # Queued messages beyond this are refused with 503
+    INGEST_QUEUE_SIZE: int = 10000
+    # Largest group committed at once, and how long the writer waits for a group to fill
+    INGEST_BATCH_SIZE: int = 500
+    INGEST_LINGER_MS: float = 5.0
+
+    # Maximum number of messages accepted by POST /api/data/batch
+    BATCH_MAX_SIZE: int = 1000
+
+    # Rows per server-side cursor fetch of GET /api/export (and per Parquet row group)
+    EXPORT_BATCH_SIZE: int = 5000
+    # Rows per COPY / executemany chunk of POST /api/import
+    IMPORT_CHUNK_SIZE: int = 10000
+    # Import bodies up to this size stay in memory, larger ones spill to a temporary file
+    IMPORT_SPOOL_MEMORY_BYTES: int = 16 * 1024 * 1024
+
+    # Cache of /api/data/latest, /api/stats and the first page of /api/data:
+    # "memory" (per process LRU), "redis" (shared by all workers) or "off"
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 256
+    RESPONSE_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    RESPONSE_CACHE_PREFIX: str = "esp32:response-cache"
+    # Expiry of Redis entries, which outlive the version they were stored under
+    RESPONSE_CACHE_TTL_SECONDS: float = 300
+    # /api/stats also depends on the clock (last hour, per-minute window), so it is
+    # recomputed at least this often even without writes
+    STATS_CACHE_SECONDS: float = 5.0
+
+    # Per-subscriber event queue of /api/stream and /ws; oldest events are dropped beyond it
+    STREAM_QUEUE_SIZE: int = 100
+    # Interval of SSE keep-alive comments while no messages arrive
+    STREAM_KEEPALIVE_SECONDS: float = 15.0
+    # How new messages reach the streams of other workers: "off" (one process) or
+    # "redis" (pub/sub channel shared by all workers; src.serve turns it on for several)
+    STREAM_RELAY_BACKEND: str = "off"
+    STREAM_RELAY_REDIS_URL: str = "redis://localhost:6379/0"
+    STREAM_RELAY_CHANNEL: str = "esp32:stream"
+
+    # Create missing tables at startup. The production launcher (python -m src.serve)
+    # applies the Alembic migrations once before starting workers and turns this off
+    DB_CREATE_SCHEMA: bool = True
+    # Log file next to the console output; empty logs to the console only
+    LOG_FILE: str = "esp32_server.log"
+
+    # python -m src.serve: worker processes (0 = one per CPU available to the process).
+    # Several workers share stream events and the response cache through Redis
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 7999
+    SERVER_WORKERS: int = 0
+    # How long workers wait for in-flight requests on shutdown before closing them
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: float = 20.0
+    # Directory for the per-worker metric files (a temporary one when empty); it is
+    # emptied at every start
+    PROMETHEUS_MULTIPROC_DIR: str = ""
+
+    # Expose Prometheus metrics on /metrics and time requests and SQL statements
+    METRICS_ENABLED: bool = True
+    # How long /health reuses the result of its database probe
+    HEALTH_CACHE_SECONDS: float = 5.0
+
     class Config:
         env_file = "./.env"
 
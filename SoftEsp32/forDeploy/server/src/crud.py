@@ -1,13 +1,341 @@
 """
 Database CRUD operations
 """
+import csv
+import io
+from itertools import islice
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import (
+    Integer, Row, Select, Table, cast, column, select, func, delete, insert, literal_column, table,
+    text, tuple_, update
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from .models import Message
+from sqlalchemy.util import await_only
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+from . import partitions, search
+from .database import DBSession
+from .models import MESSAGE_COLUMNS, Message, SourceStats, MinuteStats, DEFAULT_SOURCE
 from .schemas import MessageCreate
 
+# How long per-minute activity buckets are kept
+MINUTE_STATS_RETENTION = timedelta(days=1)
+# Window reported as messages_per_minute by /api/stats
+ACTIVITY_WINDOW = timedelta(hours=1)
+
+# (source, message length, server_timestamp) of a created or deleted message
+StatsRow = Tuple[str, int, datetime]
+# (id, message, client_timestamp, server_timestamp, source) of an imported message;
+# id and server_timestamp may be None
+ImportRow = Tuple[Optional[int], str, Optional[str], Optional[datetime], Optional[str]]
+IMPORT_COLUMNS = ("id", "message", "client_timestamp", "server_timestamp", "source")
+# Columns written by imports: the file columns plus the parsed client time
+_IMPORT_INSERT_COLUMNS = IMPORT_COLUMNS + ("client_time",)
+
+# Aggregation bucket widths in seconds, by API name
+AGGREGATE_BUCKETS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+# Widths with a date_trunc unit (Postgres) and strftime format (SQLite)
+_TRUNCATE_UNITS = {60: "minute", 3600: "hour", 86400: "day"}
+_SQLITE_BUCKET_FORMATS = {60: "%Y-%m-%d %H:%M:00", 3600: "%Y-%m-%d %H:00:00", 86400: "%Y-%m-%d 00:00:00"}
+
+
+def parse_client_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    Typed form of a client timestamp string: ISO 8601 (naive values are taken
+    as UTC) or Unix time in seconds or milliseconds. Small numbers such as
+    uptime counters and anything unrecognized give None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.astimezone(timezone.utc)
+        except (ValueError, OverflowError):
+            return None
+    if number >= 1e11:
+        number /= 1000
+    if not 1e9 <= number < 1e11:
+        return None
+    return datetime.fromtimestamp(number, timezone.utc)
+
+
+def _upsert(db: Session):
+    """Dialect-specific INSERT supporting ON CONFLICT DO UPDATE"""
+    if db.get_bind().dialect.name == "postgresql":
+        return pg_insert
+    return sqlite_insert
+
+
+def _utc_now(db: Session) -> datetime:
+    """Current time comparable with stored timestamps (SQLite stores naive UTC)"""
+    now = datetime.now(timezone.utc)
+    if db.get_bind().dialect.name == "sqlite":
+        return now.replace(tzinfo=None)
+    return now
+
+
+def _stored_timestamp(db: Session, timestamp: Optional[datetime]) -> Optional[datetime]:
+    """
+    Convert a timestamp to the form the database stores: naive UTC for SQLite,
+    aware otherwise. Naive input is taken as UTC.
+    """
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    if db.get_bind().dialect.name == "sqlite":
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _copy_records(db: Session, columns: Tuple[str, ...], records: List[tuple]) -> None:
+    """
+    COPY records into messages through the raw driver connection of the session.
+
+    Runs inside the session's transaction, which must already be open on the
+    connection (asyncpg only begins it with the first statement SQLAlchemy sends).
+    """
+    connection = db.connection().connection.driver_connection
+    driver = db.get_bind().dialect.driver
+    if driver == "asyncpg":
+        await_only(connection.copy_records_to_table("messages", records=records, columns=list(columns)))
+        return
+    
+    with connection.cursor() as cursor:
+        if driver == "psycopg":
+            with cursor.copy(f"COPY messages ({', '.join(columns)}) FROM STDIN") as copy:
+                for record in records:
+                    copy.write_row(record)
+        else:
+            # psycopg2: CSV where NULL is an unquoted empty field and '' stays quoted
+            buffer = io.StringIO()
+            csv.writer(buffer, quoting=csv.QUOTE_NOTNULL).writerows(records)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY messages ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+
+
+def _minute_bucket(timestamp: datetime) -> datetime:
+    """Truncate a timestamp to the start of its minute"""
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def _minute_bucket_sql(db: Session, timestamp):
+    """SQL counterpart of _minute_bucket, in the form the dialect stores buckets"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Inline literal: a bound parameter would make GROUP BY a different expression
+        return func.date_trunc(literal_column("'minute'"), timestamp)
+    # Same text format SQLAlchemy uses when it stores DateTime values in SQLite
+    return func.strftime("%Y-%m-%d %H:%M:00.000000", timestamp)
+
+
+def _time_bucket_sql(db: Session, timestamp, seconds: int):
+    """Start of the UTC bucket of the given width containing timestamp, computed by the database"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Inline literals, as in _minute_bucket_sql
+        if seconds in _TRUNCATE_UNITS:
+            return func.date_trunc(
+                literal_column(f"'{_TRUNCATE_UNITS[seconds]}'"), timestamp, literal_column("'UTC'")
+            )
+        return func.date_bin(
+            literal_column(f"interval '{seconds} seconds'"),
+            timestamp,
+            literal_column("timestamptz '2000-01-01 00:00:00+00'")
+        )
+    if seconds in _SQLITE_BUCKET_FORMATS:
+        return func.strftime(_SQLITE_BUCKET_FORMATS[seconds], timestamp)
+    epoch = cast(func.strftime("%s", timestamp), Integer)
+    return func.datetime(epoch // seconds * seconds, "unixepoch")
+
+
+def _messages_table(name: str) -> Table:
+    """Lightweight table clause for a messages partition"""
+    return table(name, column("id"), column("message"), column("server_timestamp"), column("source"))
+
+
+class StatsCRUD:
+    """Incrementally maintained message statistics"""
+    
+    # Newest bucket for which old buckets were pruned in this process
+    _pruned_before: Optional[datetime] = None
+    
+    @staticmethod
+    def record_created(db: Session, rows: Iterable[StatsRow]) -> None:
+        """Add created messages to the counters (runs in the caller's transaction)"""
+        by_source: dict = {}
+        by_minute: Counter = Counter()
+        for source, length, server_timestamp in rows:
+            count, total_length = by_source.get(source, (0, 0))
+            by_source[source] = (count + 1, total_length + length)
+            by_minute[_minute_bucket(server_timestamp)] += 1
+        if not by_source:
+            return
+        
+        dialect_insert = _upsert(db)
+        source_table = SourceStats.__table__
+        stmt = dialect_insert(source_table).values([
+            {"source": source, "message_count": count, "total_length": total_length}
+            for source, (count, total_length) in by_source.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[source_table.c.source],
+            set_={
+                "message_count": source_table.c.message_count + stmt.excluded.message_count,
+                "total_length": source_table.c.total_length + stmt.excluded.total_length,
+            }
+        ))
+        
+        minute_table = MinuteStats.__table__
+        stmt = dialect_insert(minute_table).values([
+            {"bucket": bucket, "message_count": count}
+            for bucket, count in by_minute.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[minute_table.c.bucket],
+            set_={"message_count": minute_table.c.message_count + stmt.excluded.message_count}
+        ))
+        
+        newest = max(by_minute)
+        if StatsCRUD._pruned_before is None or newest > StatsCRUD._pruned_before:
+            db.execute(delete(MinuteStats).where(MinuteStats.bucket < newest - MINUTE_STATS_RETENTION))
+            StatsCRUD._pruned_before = newest
+    
+    @staticmethod
+    def record_deleted(db: Session, rows: Iterable[StatsRow]) -> None:
+        """Remove deleted messages from the counters (runs in the caller's transaction)"""
+        for source, length, server_timestamp in rows:
+            db.execute(
+                update(SourceStats)
+                .where(SourceStats.source == source)
+                .values(
+                    message_count=SourceStats.message_count - 1,
+                    total_length=SourceStats.total_length - length
+                )
+            )
+            db.execute(
+                update(MinuteStats)
+                .where(MinuteStats.bucket == _minute_bucket(server_timestamp))
+                .values(message_count=MinuteStats.message_count - 1)
+            )
+    
+    @staticmethod
+    def deleted_rows_updates(db: Session, rows) -> tuple:
+        """
+        UPDATE statements removing a set of messages from the counters.
+
+        rows is a FROM clause (table, subquery or CTE) with source, message and
+        server_timestamp columns, evaluated before the messages are gone.
+        """
+        by_source = (
+            select(
+                rows.c.source,
+                func.count().label("message_count"),
+                func.coalesce(func.sum(func.length(rows.c.message)), 0).label("total_length"),
+            )
+            .group_by(rows.c.source)
+            .subquery()
+        )
+        sources = (
+            update(SourceStats)
+            .where(SourceStats.source == by_source.c.source)
+            .values(
+                message_count=SourceStats.message_count - by_source.c.message_count,
+                total_length=SourceStats.total_length - by_source.c.total_length
+            )
+        )
+        # Older rows have no bucket left to correct
+        bucket = _minute_bucket_sql(db, rows.c.server_timestamp)
+        by_minute = (
+            select(bucket.label("bucket"), func.count().label("message_count"))
+            .where(rows.c.server_timestamp >= _utc_now(db) - MINUTE_STATS_RETENTION)
+            .group_by(bucket)
+            .subquery()
+        )
+        minutes = (
+            update(MinuteStats)
+            .where(MinuteStats.bucket == by_minute.c.bucket)
+            .values(message_count=MinuteStats.message_count - by_minute.c.message_count)
+        )
+        return sources, minutes
+    
+    @staticmethod
+    def reset(db: Session) -> None:
+        """Drop all counters (runs in the caller's transaction)"""
+        db.execute(delete(SourceStats))
+        db.execute(delete(MinuteStats))
+    
+    @staticmethod
+    def get_total_count(db: Session) -> int:
+        """Total number of messages from the counters"""
+        result = db.execute(select(func.coalesce(func.sum(SourceStats.message_count), 0)))
+        return int(result.scalar())
+    
+    @staticmethod
+    def get_summary(db: Session, exact: bool = False) -> dict:
+        """
+        Build the /api/stats payload from the counters.
+
+        exact=True recounts the messages table instead of trusting the counters.
+        """
+        sources = db.execute(
+            select(SourceStats.source, SourceStats.message_count, SourceStats.total_length)
+            .where(SourceStats.message_count > 0)
+            .order_by(SourceStats.message_count.desc())
+        ).all()
+        counted = sum(row.message_count for row in sources)
+        total_length = sum(row.total_length for row in sources)
+        if exact:
+            total_count = db.execute(select(func.count(Message.id))).scalar()
+        else:
+            total_count = counted
+        
+        # First and last message via the primary key index, in one round-trip
+        bounds = db.execute(
+            select(
+                select(Message.server_timestamp)
+                .order_by(Message.id.asc()).limit(1)
+                .scalar_subquery().label("first"),
+                select(Message.server_timestamp)
+                .order_by(Message.id.desc()).limit(1)
+                .scalar_subquery().label("last"),
+            )
+        ).one()
+        
+        minutes = db.execute(
+            select(MinuteStats.bucket, MinuteStats.message_count)
+            .where(
+                MinuteStats.bucket >= _minute_bucket(_utc_now(db) - ACTIVITY_WINDOW),
+                MinuteStats.message_count > 0
+            )
+            .order_by(MinuteStats.bucket.asc())
+        ).all()
+        
+        return {
+            "total_messages": total_count,
+            "first_message_time": bounds.first.isoformat() if bounds.first else None,
+            "last_message_time": bounds.last.isoformat() if bounds.last else None,
+            "server_uptime": "running",
+            "mean_message_length": round(total_length / counted, 2) if counted else None,
+            "messages_by_source": {row.source: row.message_count for row in sources},
+            "messages_last_hour": sum(row.message_count for row in minutes),
+            "messages_per_minute": [
+                {"minute": row.bucket.isoformat(), "count": row.message_count}
+                for row in minutes
+            ],
+        }
+
 
 class MessageCRUD:
     """CRUD operations for Message model"""
@@ -18,33 +346,305 @@ class MessageCRUD:
         db_message = Message(
             message=message_data.message,
             client_timestamp=message_data.timestamp,
+            client_time=_stored_timestamp(db, parse_client_timestamp(message_data.timestamp)),
             source=message_data.source
         )
         db.add(db_message)
+        db.flush()
+        StatsCRUD.record_created(
+            db, [(db_message.source, len(db_message.message), db_message.server_timestamp)]
+        )
         db.commit()
-        db.refresh(db_message)
         return db_message
     
+    @staticmethod
+    def create_messages(
+        db: Session,
+        messages_data: List[MessageCreate]
+    ) -> List[Tuple[int, datetime]]:
+        """
+        Create many messages in one transaction.
+
+        Uses a multi-row INSERT ... RETURNING and returns (id, server_timestamp)
+        pairs in the same order as the input.
+        """
+        if not messages_data:
+            return []
+        
+        result = db.execute(
+            insert(Message).returning(
+                Message.id,
+                Message.server_timestamp,
+                sort_by_parameter_order=True
+            ),
+            [
+                {
+                    "message": item.message,
+                    "client_timestamp": item.timestamp,
+                    "client_time": _stored_timestamp(db, parse_client_timestamp(item.timestamp)),
+                    "source": item.source or DEFAULT_SOURCE
+                } for item in messages_data
+            ]
+        )
+        rows = [(row.id, row.server_timestamp) for row in result]
+        StatsCRUD.record_created(db, [
+            (item.source or DEFAULT_SOURCE, len(item.message), server_timestamp)
+            for item, (_, server_timestamp) in zip(messages_data, rows)
+        ])
+        db.commit()
+        return rows
+    
     @staticmethod
     def get_message_by_id(db: Session, message_id: int) -> Optional[Message]:
         """Get message by ID"""
         result = db.execute(select(Message).where(Message.id == message_id))
         return result.scalar_one_or_none()
     
+    @staticmethod
+    def _paginate(
+        query: Select,
+        limit: int,
+        offset: int,
+        before_id: Optional[int],
+        after_id: Optional[int]
+    ) -> Tuple[Select, bool]:
+        """
+        Apply pagination to a select over messages.
+
+        Returns the statement and whether its rows come back oldest first and
+        must be reversed by the caller.
+        """
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        if after_id is not None:
+            # Take the oldest rows above after_id; the caller flips them to newest first
+            return query.where(Message.id > after_id).order_by(Message.id.asc()).limit(limit), True
+        return query.order_by(Message.id.desc()).offset(offset).limit(limit), False
+    
     @staticmethod
     def get_messages(
         db: Session, 
         limit: int = 50, 
-        offset: int = 0
+        offset: int = 0,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
     ) -> List[Message]:
-        """Get messages with pagination"""
-        result = db.execute(
-            select(Message)
-            .order_by(Message.id.desc())
-            .offset(offset)
-            .limit(limit)
+        """
+        Get messages with pagination, newest first.
+
+        before_id/after_id select a keyset page by primary key, which is served by
+        an index range scan and costs the same at any depth; offset is kept for
+        backwards compatibility.
+        """
+        query, oldest_first = MessageCRUD._paginate(select(Message), limit, offset, before_id, after_id)
+        messages = db.execute(query).scalars().all()
+        return list(reversed(messages)) if oldest_first else messages
+    
+    @staticmethod
+    def get_message_rows(
+        db: Session,
+        limit: int = 50,
+        offset: int = 0,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> List[Row]:
+        """Same page as get_messages, as MESSAGE_COLUMNS tuples without ORM objects"""
+        query, oldest_first = MessageCRUD._paginate(
+            select(*MESSAGE_COLUMNS), limit, offset, before_id, after_id
+        )
+        rows = db.execute(query).all()
+        return list(reversed(rows)) if oldest_first else rows
+    
+    @staticmethod
+    def export_statement(
+        db: Session,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Select:
+        """
+        MESSAGE_COLUMNS of the messages to export, oldest first.
+
+        since is inclusive and until exclusive, both on server_timestamp.
+        """
+        query = select(*MESSAGE_COLUMNS)
+        if after_id is not None:
+            query = query.where(Message.id > after_id)
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        if since is not None:
+            query = query.where(Message.server_timestamp >= _stored_timestamp(db, since))
+        if until is not None:
+            query = query.where(Message.server_timestamp < _stored_timestamp(db, until))
+        return query.order_by(Message.id.asc())
+    
+    @staticmethod
+    def _time_column(time_field: str):
+        """server_timestamp or the parsed client time, by API name"""
+        return Message.client_time if time_field == "client" else Message.server_timestamp
+    
+    @staticmethod
+    def get_range_rows(
+        db: Session,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        source: Optional[str] = None,
+        time_field: str = "server",
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None
+    ) -> List[Row]:
+        """
+        Messages with since <= time < until, oldest first, as MESSAGE_COLUMNS
+        tuples followed by the time they are ordered by.
+
+        after is the (time, id) of the last row of the previous page. The
+        (source, server_timestamp) and (server_timestamp) indexes serve the scan.
+        """
+        time_column = MessageCRUD._time_column(time_field)
+        query = select(*MESSAGE_COLUMNS, time_column)
+        if time_field == "client":
+            query = query.where(time_column.is_not(None))
+        if since is not None:
+            query = query.where(time_column >= _stored_timestamp(db, since))
+        if until is not None:
+            query = query.where(time_column < _stored_timestamp(db, until))
+        if source is not None:
+            query = query.where(Message.source == source)
+        if after is not None:
+            after_time, after_id = after
+            query = query.where(tuple_(time_column, Message.id) > (_stored_timestamp(db, after_time), after_id))
+        return db.execute(
+            query.order_by(time_column.asc(), Message.id.asc()).limit(limit)
+        ).all()
+    
+    @staticmethod
+    def aggregate_messages(
+        db: Session,
+        bucket_seconds: int,
+        since: datetime,
+        until: datetime,
+        source: Optional[str] = None,
+        by_source: bool = False,
+        time_field: str = "server"
+    ) -> List[dict]:
+        """
+        Message counts per time bucket (and per source with by_source) for
+        since <= time < until, grouped by the database. Buckets without
+        messages are omitted. Returns dicts with bucket (aware UTC), count
+        and, with by_source, source, ordered by bucket.
+        """
+        time_column = MessageCRUD._time_column(time_field)
+        bucket = _time_bucket_sql(db, time_column, bucket_seconds).label("bucket")
+        columns = [bucket, func.count().label("count")]
+        group_by = [bucket]
+        if by_source:
+            columns.insert(1, Message.source)
+            group_by.append(Message.source)
+        query = (
+            select(*columns)
+            .where(time_column >= _stored_timestamp(db, since), time_column < _stored_timestamp(db, until))
+            .group_by(*group_by)
+            .order_by(*group_by)
         )
-        return result.scalars().all()
+        if source is not None:
+            query = query.where(Message.source == source)
+        
+        results = []
+        for row in db.execute(query).mappings():
+            item = dict(row)
+            if isinstance(item["bucket"], str):
+                # SQLite returns the bucket as UTC text
+                item["bucket"] = datetime.fromisoformat(item["bucket"]).replace(tzinfo=timezone.utc)
+            results.append(item)
+        return results
+    
+    @staticmethod
+    def import_messages(
+        db: Session,
+        rows: Iterable[ImportRow],
+        preserve_ids: bool = True,
+        chunk_size: int = 10000
+    ) -> int:
+        """
+        Bulk-load messages in a single transaction, chunk_size rows at a time.
+
+        Postgres receives each chunk through COPY FROM STDIN, SQLite through an
+        executemany INSERT, with the search index filled per chunk instead of by
+        its per-row trigger. With preserve_ids the ids from the rows are kept
+        (and the Postgres sequence moved past them), otherwise new ids are
+        assigned. Rows without a server timestamp get the import time.
+        Returns the number of imported messages.
+        """
+        postgres = db.get_bind().dialect.name == "postgresql"
+        table = Message.__table__
+        now = _utc_now(db)
+        # Postgres: whether messages is partitioned, and the partitions seen so far
+        partitioned = None
+        known_partitions = set()
+        # SQLite: whether the FTS trigger is swapped out, and the next id to assign
+        index_suspended = None
+        next_id = None
+        imported = 0
+        rows = iter(rows)
+        while chunk := list(islice(rows, chunk_size)):
+            records = [
+                (
+                    message_id,
+                    message,
+                    client_timestamp,
+                    _stored_timestamp(db, server_timestamp) or now,
+                    source or DEFAULT_SOURCE,
+                    _stored_timestamp(db, parse_client_timestamp(client_timestamp)),
+                )
+                for message_id, message, client_timestamp, server_timestamp, source in chunk
+            ]
+            # Counters first: this opens the transaction (and on SQLite takes the
+            # write lock) that COPY and the trigger swap must run in
+            StatsCRUD.record_created(db, [
+                (source, len(message), server_timestamp)
+                for _, message, _, server_timestamp, source, _ in records
+            ])
+            
+            if postgres:
+                if partitioned is None:
+                    partitioned = partitions.is_partitioned(db)
+                if partitioned:
+                    # Attaching months the file needs keeps its rows out of the default partition
+                    timestamps = [record[3] for record in records]
+                    partitions.ensure_partitions(db, min(timestamps), max(timestamps), known_partitions)
+                if preserve_ids:
+                    _copy_records(db, _IMPORT_INSERT_COLUMNS, records)
+                else:
+                    _copy_records(db, _IMPORT_INSERT_COLUMNS[1:], [record[1:] for record in records])
+            else:
+                if index_suspended is None:
+                    index_suspended = search.suspend_sqlite_index(db)
+                    if index_suspended and not preserve_ids:
+                        # The FTS rows need the ids, so hand them out as SQLite would
+                        next_id = (db.execute(select(func.max(Message.id))).scalar() or 0) + 1
+                if next_id is not None:
+                    records = [(next_id + i,) + record[1:] for i, record in enumerate(records)]
+                    next_id += len(records)
+                if preserve_ids or next_id is not None:
+                    db.execute(insert(table), [dict(zip(_IMPORT_INSERT_COLUMNS, record)) for record in records])
+                else:
+                    db.execute(insert(table), [
+                        dict(zip(_IMPORT_INSERT_COLUMNS[1:], record[1:])) for record in records
+                    ])
+                if index_suspended:
+                    search.index_sqlite_rows(db, ((record[0], record[1]) for record in records))
+            imported += len(records)
+        
+        if index_suspended:
+            search.resume_sqlite_index(db)
+        if postgres and preserve_ids and imported:
+            db.execute(text(
+                "SELECT setval(pg_get_serial_sequence('messages', 'id'), "
+                "(SELECT max(id) FROM messages))"
+            ))
+        db.commit()
+        return imported
     
     @staticmethod
     def get_latest_message(db: Session) -> Optional[Message]:
@@ -59,23 +659,25 @@ class MessageCRUD:
     @staticmethod
     def get_total_count(db: Session) -> int:
         """Get total count of messages"""
-        result = db.execute(select(func.count(Message.id)))
-        return result.scalar()
+        return StatsCRUD.get_total_count(db)
     
     @staticmethod
     def search_messages(
         db: Session, 
         query: str, 
         limit: int = 20
-    ) -> List[Message]:
-        """Search messages by text content"""
-        result = db.execute(
-            select(Message)
-            .where(Message.message.ilike(f"%{query}%"))
-            .order_by(Message.id.desc())
-            .limit(limit)
-        )
-        return result.scalars().all()
+    ) -> Tuple[List[Message], int]:
+        """Search messages by text content, returns (ranked page, total matches)"""
+        return search.search_messages(db, query, limit)
+    
+    @staticmethod
+    def search_message_rows(
+        db: Session,
+        query: str,
+        limit: int = 20
+    ) -> Tuple[List[Row], int]:
+        """Search messages, returns (ranked MESSAGE_COLUMNS tuples, total matches)"""
+        return search.search_message_rows(db, query, limit)
     
     @staticmethod
     def delete_message(db: Session, message_id: int) -> Optional[Message]:
@@ -83,47 +685,327 @@ class MessageCRUD:
         message = MessageCRUD.get_message_by_id(db, message_id)
         if message:
             db.delete(message)
+            StatsCRUD.record_deleted(
+                db, [(message.source, len(message.message), message.server_timestamp)]
+            )
             db.commit()
         return message
     
     @staticmethod
     def delete_all_messages(db: Session) -> int:
-        """Delete all messages and return count"""
-        result = db.execute(select(func.count(Message.id)))
-        count = result.scalar()
-        
-        db.execute(delete(Message))
+        """
+        Delete all messages and return count.
+
+        Postgres empties the table (every partition) with TRUNCATE; SQLite
+        truncates it in one step with the search index cleared at once.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("TRUNCATE messages"))
+            # Writers finished before TRUNCATE got its lock, so the counters are exact
+            count = StatsCRUD.get_total_count(db)
+            StatsCRUD.reset(db)
+        else:
+            # Resetting the counters first takes the write lock the trigger swap needs
+            StatsCRUD.reset(db)
+            count = search.delete_all_sqlite(db)
         db.commit()
         return count
     
     @staticmethod
-    def get_stats(db: Session) -> dict:
-        """Get statistics about messages"""
-        total_count = MessageCRUD.get_total_count(db)
+    def _delete_where(db: Session, target: Table, conditions: list) -> int:
+        """
+        Delete the rows of target (messages or one of its partitions) matching
+        conditions with one set-based DELETE, adjusting the counters in the same
+        transaction. Returns the number of deleted messages.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            # One statement: the counters are fed from exactly the rows DELETE removed
+            deleted = (
+                delete(target).where(*conditions)
+                .returning(target.c.source, target.c.message, target.c.server_timestamp)
+                .cte("deleted")
+            )
+            sources, minutes = StatsCRUD.deleted_rows_updates(db, deleted)
+            return db.execute(
+                select(func.count()).select_from(deleted)
+                .add_cte(sources.cte("source_stats_update"))
+                .add_cte(minutes.cte("minute_stats_update"))
+            ).scalar()
         
-        # Get first and last message timestamps
-        first_result = db.execute(
-            select(Message.server_timestamp)
-            .order_by(Message.id.asc())
-            .limit(1)
+        # SQLite: the first UPDATE takes the write lock, so nothing changes in between
+        rows = (
+            select(target.c.source, target.c.message, target.c.server_timestamp)
+            .where(*conditions)
+            .subquery()
         )
-        first_timestamp = first_result.scalar_one_or_none()
-        
-        last_result = db.execute(
-            select(Message.server_timestamp)
-            .order_by(Message.id.desc())
-            .limit(1)
+        for statement in StatsCRUD.deleted_rows_updates(db, rows):
+            db.execute(statement)
+        return db.execute(delete(target).where(*conditions)).rowcount
+    
+    @staticmethod
+    def delete_messages_range(
+        db: Session,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None
+    ) -> int:
+        """Delete messages with after_id < id < before_id in one statement, return count"""
+        target = Message.__table__
+        conditions = []
+        if after_id is not None:
+            conditions.append(target.c.id > after_id)
+        if before_id is not None:
+            conditions.append(target.c.id < before_id)
+        count = MessageCRUD._delete_where(db, target, conditions)
+        db.commit()
+        return count
+    
+    @staticmethod
+    def ensure_future_partitions(db: Session, months_ahead: int) -> List[str]:
+        """
+        Create the monthly partitions from the current month to months_ahead
+        months ahead on partitioned Postgres; returns the names created
+        """
+        if not partitions.is_partitioned(db):
+            return []
+        now = datetime.now(timezone.utc)
+        created = partitions.ensure_partitions(
+            db, now, partitions.add_months(partitions.month_start(now), months_ahead)
         )
-        last_timestamp = last_result.scalar_one_or_none()
+        db.commit()
+        return created
+    
+    @staticmethod
+    def apply_retention(
+        db: Session,
+        cutoff: datetime,
+        detach: bool = False,
+        batch_size: int = 10000
+    ) -> dict:
+        """
+        Remove messages older than cutoff.
+
+        On partitioned Postgres every monthly partition that ends by the cutoff
+        is dropped (or detached and kept as a standalone table) as a whole; rows
+        in the default partition, and everything on SQLite or unpartitioned
+        Postgres, are deleted batch_size at a time with a commit after each
+        batch, so ingestion is never blocked for long. Counters are adjusted
+        either way. Returns {"partitions": [...], "deleted_count": n}.
+        """
+        report = {"partitions": [], "deleted_count": 0}
+        target = Message.__table__
+        if partitions.is_partitioned(db):
+            for name, month in partitions.list_partitions(db):
+                if partitions.add_months(month, 1) > cutoff:
+                    break
+                for statement in StatsCRUD.deleted_rows_updates(db, _messages_table(name)):
+                    db.execute(statement)
+                if detach:
+                    db.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+                else:
+                    db.execute(text(f"DROP TABLE {name}"))
+                db.commit()
+                report["partitions"].append(name)
+            target = _messages_table(partitions.DEFAULT_PARTITION)
         
-        return {
-            "total_messages": total_count,
-            "first_message_time": first_timestamp.isoformat() if first_timestamp else None,
-            "last_message_time": last_timestamp.isoformat() if last_timestamp else None,
-            "server_uptime": "running"
-        }
+        cutoff = _stored_timestamp(db, cutoff)
+        while True:
+            batch = (
+                select(target.c.id)
+                .where(target.c.server_timestamp < cutoff)
+                .order_by(target.c.id)
+                .limit(batch_size)
+                .subquery()
+            )
+            last_id = db.execute(select(func.max(batch.c.id))).scalar()
+            if last_id is None:
+                break
+            deleted = MessageCRUD._delete_where(
+                db, target, [target.c.server_timestamp < cutoff, target.c.id <= last_id]
+            )
+            db.commit()
+            report["deleted_count"] += deleted
+            if deleted < batch_size:
+                break
+        return report
+    
+    @staticmethod
+    def get_stats(db: Session, exact: bool = False) -> dict:
+        """Get statistics about messages"""
+        return StatsCRUD.get_summary(db, exact)
+
+
+async def run_db(db: DBSession, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a sync CRUD function against either session type.
+
+    AsyncSession runs it on its own connection via run_sync (greenlet, no thread);
+    a sync Session runs it in the threadpool so the event loop is never blocked.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+
+class AsyncMessageCRUD:
+    """Awaitable CRUD operations for Message model, usable in sync and async modes"""
+    
+    @staticmethod
+    async def release(db: DBSession) -> None:
+        """End the current transaction so its connection goes back to the pool"""
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            await run_in_threadpool(db.close)
+    
+    @staticmethod
+    async def create_message(db: DBSession, message_data: MessageCreate) -> Message:
+        """Create a new message"""
+        return await run_db(db, MessageCRUD.create_message, message_data)
+    
+    @staticmethod
+    async def create_messages(
+        db: DBSession,
+        messages_data: List[MessageCreate]
+    ) -> List[Tuple[int, datetime]]:
+        """Create many messages in one transaction"""
+        return await run_db(db, MessageCRUD.create_messages, messages_data)
+    
+    @staticmethod
+    async def get_message_by_id(db: DBSession, message_id: int) -> Optional[Message]:
+        """Get message by ID"""
+        return await run_db(db, MessageCRUD.get_message_by_id, message_id)
+    
+    @staticmethod
+    async def get_messages(
+        db: DBSession,
+        limit: int = 50,
+        offset: int = 0,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> List[Message]:
+        """Get messages with pagination, newest first"""
+        return await run_db(db, MessageCRUD.get_messages, limit, offset, before_id, after_id)
+    
+    @staticmethod
+    async def get_message_rows(
+        db: DBSession,
+        limit: int = 50,
+        offset: int = 0,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
+    ) -> List[Row]:
+        """Get a page of messages as column tuples, newest first"""
+        return await run_db(db, MessageCRUD.get_message_rows, limit, offset, before_id, after_id)
+    
+    @staticmethod
+    async def import_messages(
+        db: DBSession,
+        rows: Iterable[ImportRow],
+        preserve_ids: bool = True,
+        chunk_size: int = 10000
+    ) -> int:
+        """Bulk-load messages in a single transaction"""
+        return await run_db(db, MessageCRUD.import_messages, rows, preserve_ids, chunk_size)
+    
+    @staticmethod
+    async def get_latest_message(db: DBSession) -> Optional[Message]:
+        """Get the latest message"""
+        return await run_db(db, MessageCRUD.get_latest_message)
+    
+    @staticmethod
+    async def get_total_count(db: DBSession) -> int:
+        """Get total count of messages"""
+        return await run_db(db, MessageCRUD.get_total_count)
+    
+    @staticmethod
+    async def search_messages(
+        db: DBSession,
+        query: str,
+        limit: int = 20
+    ) -> Tuple[List[Message], int]:
+        """Search messages by text content, returns (ranked page, total matches)"""
+        return await run_db(db, MessageCRUD.search_messages, query, limit)
+    
+    @staticmethod
+    async def search_message_rows(
+        db: DBSession,
+        query: str,
+        limit: int = 20
+    ) -> Tuple[List[Row], int]:
+        """Search messages, returns (ranked column tuples, total matches)"""
+        return await run_db(db, MessageCRUD.search_message_rows, query, limit)
+    
+    @staticmethod
+    async def delete_message(db: DBSession, message_id: int) -> Optional[Message]:
+        """Delete message by ID"""
+        return await run_db(db, MessageCRUD.delete_message, message_id)
+    
+    @staticmethod
+    async def delete_all_messages(db: DBSession) -> int:
+        """Delete all messages and return count"""
+        return await run_db(db, MessageCRUD.delete_all_messages)
+    
+    @staticmethod
+    async def get_range_rows(
+        db: DBSession,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        source: Optional[str] = None,
+        time_field: str = "server",
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None
+    ) -> List[Row]:
+        """Messages in a time range, oldest first, with their ordering time"""
+        return await run_db(
+            db, MessageCRUD.get_range_rows, since, until, source, time_field, limit, after
+        )
+    
+    @staticmethod
+    async def aggregate_messages(
+        db: DBSession,
+        bucket_seconds: int,
+        since: datetime,
+        until: datetime,
+        source: Optional[str] = None,
+        by_source: bool = False,
+        time_field: str = "server"
+    ) -> List[dict]:
+        """Message counts per time bucket, grouped by the database"""
+        return await run_db(
+            db, MessageCRUD.aggregate_messages, bucket_seconds, since, until, source, by_source, time_field
+        )
+    
+    @staticmethod
+    async def delete_messages_range(
+        db: DBSession,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None
+    ) -> int:
+        """Delete messages with after_id < id < before_id, return count"""
+        return await run_db(db, MessageCRUD.delete_messages_range, after_id, before_id)
+    
+    @staticmethod
+    async def ensure_future_partitions(db: DBSession, months_ahead: int) -> List[str]:
+        """Create missing monthly partitions up to months_ahead on partitioned Postgres"""
+        return await run_db(db, MessageCRUD.ensure_future_partitions, months_ahead)
+    
+    @staticmethod
+    async def apply_retention(
+        db: DBSession,
+        cutoff: datetime,
+        detach: bool = False,
+        batch_size: int = 10000
+    ) -> dict:
+        """Remove messages older than cutoff"""
+        return await run_db(db, MessageCRUD.apply_retention, cutoff, detach, batch_size)
+    
+    @staticmethod
+    async def get_stats(db: DBSession, exact: bool = False) -> dict:
+        """Get statistics about messages"""
+        return await run_db(db, MessageCRUD.get_stats, exact)
 
 
-# Create instance for easy import
+# Create instances for easy import
 message_crud = MessageCRUD()
+async_message_crud = AsyncMessageCRUD()
 
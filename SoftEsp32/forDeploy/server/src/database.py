@@ -1,23 +1,152 @@
 """
 Database configuration and session management
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Union
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from src.config import config as conf
 
 DATABASE_URL = conf.DATABASE_URL
 
+# Async drivers for each supported backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Rewrite a sync database URL to use the matching async driver"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}'")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+# Allowed values of the SQLite pragmas taken from the config
+SQLITE_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def engine_options(url: str) -> dict:
+    """Pool sizing and per-backend connect arguments from the config"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options = {}
+    if backend != "sqlite":
+        # A local SQLite file cannot drop the connection, so pinging it is pure overhead
+        options["pool_pre_ping"] = conf.DB_POOL_PRE_PING
+    if not is_memory_sqlite(url):
+        options.update(
+            pool_size=conf.DB_POOL_SIZE,
+            max_overflow=conf.DB_MAX_OVERFLOW,
+            pool_timeout=conf.DB_POOL_TIMEOUT,
+            pool_recycle=conf.DB_POOL_RECYCLE,
+        )
+    
+    if backend == "postgresql":
+        settings = {
+            "statement_timeout": conf.DB_STATEMENT_TIMEOUT_MS,
+            "lock_timeout": conf.DB_LOCK_TIMEOUT_MS,
+            "idle_in_transaction_session_timeout": conf.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS,
+        }
+        # Passed at connect time, so they hold for the whole session without a SET
+        if parsed.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {name: str(value) for name, value in settings.items()}
+            }
+        else:
+            options["connect_args"] = {
+                "options": " ".join(f"-c {name}={value}" for name, value in settings.items())
+            }
+    elif backend == "sqlite":
+        options["connect_args"] = {"timeout": conf.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    return options
+
+
+def sqlite_profile_pragmas() -> list:
+    """PRAGMA statements of the SQLite performance profile"""
+    journal_mode = conf.SQLITE_JOURNAL_MODE.upper()
+    synchronous = conf.SQLITE_SYNCHRONOUS.upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"Unknown SQLITE_JOURNAL_MODE '{conf.SQLITE_JOURNAL_MODE}'")
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown SQLITE_SYNCHRONOUS '{conf.SQLITE_SYNCHRONOUS}'")
+    return [
+        # WAL lets dashboard readers run alongside the single writer
+        f"PRAGMA journal_mode={journal_mode}",
+        # With WAL, NORMAL only syncs at checkpoints; a power cut may lose the
+        # last transactions but never corrupts the database
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA busy_timeout={int(conf.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA cache_size={int(conf.SQLITE_CACHE_SIZE)}",
+        f"PRAGMA mmap_size={int(conf.SQLITE_MMAP_SIZE)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def configure_engine(target_engine: Engine) -> None:
+    """Apply the SQLite performance profile to every new connection of an engine"""
+    if target_engine.dialect.name != "sqlite" or not conf.SQLITE_PERFORMANCE_PROFILE:
+        return
+    pragmas = sqlite_profile_pragmas()
+    
+    @event.listens_for(target_engine, "connect")
+    def apply_sqlite_profile(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
 # Create sync engine
 engine = create_engine(
-    DATABASE_URL
+    DATABASE_URL,
+    **engine_options(DATABASE_URL)
 )
+configure_engine(engine)
 # Create sync session factory
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
+    expire_on_commit=False,
     bind=engine
 )
 
+# Create async engine and session factory when async mode is enabled
+async_engine = None
+AsyncSessionLocal = None
+if conf.DB_ASYNC:
+    ASYNC_URL = conf.ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        ASYNC_URL,
+        **engine_options(ASYNC_URL)
+    )
+    configure_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(
+        autoflush=False,
+        expire_on_commit=False,
+        bind=async_engine
+    )
+
+# Session type handed to CRUD operations in either mode
+DBSession = Union[Session, AsyncSession]
+
 
 class Base(DeclarativeBase):
     """Base class for all database models"""
@@ -33,3 +162,69 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Dependency to get async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependency used by the routers, selected by Config.DB_ASYNC
+get_session = get_async_db if conf.DB_ASYNC else get_db
+
+
+@asynccontextmanager
+async def open_session() -> AsyncIterator[DBSession]:
+    """
+    Short-lived session of the configured kind, for work outside request dependencies
+    """
+    if conf.DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def pool_status(target_engine, returning: int = 0) -> dict:
+    """
+    Connection pool occupancy; pools without a fixed size (e.g. for in-memory SQLite)
+    only report what they can. returning counts connections being checked in that
+    the pool does not count as idle yet (inside a checkin event)
+    """
+    pool = target_engine.pool
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            status[name] = method()
+    if returning and "checkedout" in status:
+        status["checkedout"] -= returning
+        if "checkedin" in status:
+            status["checkedin"] += returning
+    if "size" in status and "checkedout" in status:
+        capacity = status["size"] + max(getattr(pool, "_max_overflow", 0), 0)
+        status["saturation"] = round(status["checkedout"] / capacity, 3) if capacity else None
+    return status
+
+
+def probe_database() -> float:
+    """Run a trivial query on the sync engine; returns its latency in seconds"""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return time.perf_counter() - started
+
+
+async def probe_async_database() -> float:
+    """Run a trivial query on the async engine; returns its latency in seconds"""
+    started = time.perf_counter()
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return time.perf_counter() - started
@@ -0,0 +1,170 @@
+"""
+Write-behind ingestion: single-message POSTs are queued and committed in groups
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from .broadcast import hub
+from .cache import response_cache
+from .config import config as conf
+from .crud import async_message_crud
+from .database import open_session
+from .metrics import record_ingest_group, record_ingested
+from .models import DEFAULT_SOURCE
+from .schemas import MessageCreate, MessageResponse
+
+logger = logging.getLogger(__name__)
+
+# A queued message and the future waiting for its (id, server_timestamp), if anyone waits
+QueuedMessage = Tuple[MessageCreate, Optional[asyncio.Future]]
+
+
+class IngestQueueFull(Exception):
+    """The ingest queue is at capacity (or shutting down); the client should retry later"""
+
+
+class IngestQueue:
+    """
+    Bounded queue of messages drained by one background writer.
+
+    The writer takes whatever has queued up, waiting at most linger_seconds
+    for more after the first message, and stores up to batch_size messages
+    with one multi-row INSERT and one commit. While a group commits, the next
+    one builds up, so the group size follows the load.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, linger_seconds: float):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """Start the writer; must be called from the event loop"""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop accepting messages and wait until every queued one is stored"""
+        if self._task is None:
+            return
+        self._closing = True
+        # Queued after everything already accepted, so those are written first
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def submit(self, item: MessageCreate, wait: bool = True) -> Optional[asyncio.Future]:
+        """
+        Queue a message without blocking.
+
+        Returns a future resolving to (id, server_timestamp) once the message
+        is committed, or None when wait is False. Raises IngestQueueFull.
+        """
+        if self._task is None or self._closing:
+            raise IngestQueueFull()
+        future = asyncio.get_running_loop().create_future() if wait else None
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            raise IngestQueueFull()
+        return future
+
+    async def _next_group(self) -> Tuple[List[QueuedMessage], bool]:
+        """Up to batch_size queued messages and whether the stop marker was reached"""
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        group = [first]
+        deadline = loop.time() + self.linger_seconds
+        while len(group) < self.batch_size:
+            try:
+                queued = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    queued = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if queued is None:
+                return group, True
+            group.append(queued)
+        return group, False
+
+    async def _run(self) -> None:
+        while True:
+            group, stopping = await self._next_group()
+            if group:
+                try:
+                    await self._write(group)
+                except Exception as e:
+                    # Never let the writer die or leave a request waiting forever
+                    logger.error(f"Ошибка записи группы сообщений: {e}")
+                    for _, future in group:
+                        if future is not None and not future.done():
+                            future.set_exception(e)
+            if stopping:
+                return
+
+    async def _store(self, items: List[MessageCreate]) -> List[Tuple[int, datetime]]:
+        async with open_session() as db:
+            return await async_message_crud.create_messages(db, items)
+
+    async def _write(self, group: List[QueuedMessage]) -> None:
+        items = [item for item, _ in group]
+        try:
+            results: List = await self._store(items)
+        except Exception as e:
+            logger.error(f"Ошибка записи группы из {len(items)} сообщений, запись по одному: {e}")
+            # Store the rest of the group one by one so a single bad message fails alone
+            results = []
+            for item in items:
+                try:
+                    results.extend(await self._store([item]))
+                except Exception as item_error:
+                    results.append(item_error)
+
+        stored = characters = 0
+        for (item, future), result in zip(group, results):
+            if isinstance(result, Exception):
+                if future is not None and not future.done():
+                    future.set_exception(result)
+                continue
+            stored += 1
+            characters += len(item.message)
+            message_id, server_timestamp = result
+            if future is not None and not future.done():
+                future.set_result(result)
+            hub.publish_message(MessageResponse(
+                id=message_id,
+                message=item.message,
+                client_timestamp=item.timestamp,
+                server_timestamp=server_timestamp,
+                source=item.source or DEFAULT_SOURCE
+            ).model_dump(mode="json"))
+
+        if stored:
+            await response_cache.invalidate()
+        record_ingested("queued", stored, rejected=len(group) - stored, characters=characters)
+        record_ingest_group(len(group), self.depth)
+        logger.info(f"Committed group of {stored} messages ({self.depth} queued)")
+
+
+# Create instance for easy import
+ingest_queue = IngestQueue(
+    max_size=conf.INGEST_QUEUE_SIZE,
+    batch_size=conf.INGEST_BATCH_SIZE,
+    linger_seconds=conf.INGEST_LINGER_MS / 1000
+)
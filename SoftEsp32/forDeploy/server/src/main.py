@@ -1,30 +1,73 @@
+import asyncio
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import uvicorn
 
-from .database import engine, Base
+from .config import config as conf
+from .database import (
+    engine, async_engine, Base, open_session, pool_status, probe_database, probe_async_database
+)
 from .routers import router
+from .broadcast import hub
+from .cache import response_cache
+from .ingest import ingest_queue
+from .crud import async_message_crud
+from . import metrics, partitions, stream, transfer
 
 # Настройка логирования
+log_handlers = [logging.StreamHandler()]
+if conf.LOG_FILE:
+    log_handlers.append(logging.FileHandler(conf.LOG_FILE, encoding='utf-8'))
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('esp32_server.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    handlers=log_handlers
 )
 logger = logging.getLogger(__name__)
 
 # Инициализация базы данных при запуске
 def init_database():
     logger.info("Initializing database...")
+    # A fresh Postgres database gets the partitioned layout the migrations build
+    if partitions.create_partitioned_messages(engine):
+        logger.info("Created partitioned messages table.")
     Base.metadata.create_all(bind=engine)
     logger.info("Database initialized.")
 
 
+async def maintain_storage():
+    """Keep future partitions ready and apply the retention policy, once per interval"""
+    while True:
+        try:
+            async with open_session() as db:
+                created = await async_message_crud.ensure_future_partitions(db, conf.PARTITIONS_AHEAD_MONTHS)
+                if created:
+                    logger.info(f"Created partitions: {', '.join(created)}")
+                if conf.MESSAGE_RETENTION_DAYS > 0:
+                    cutoff = datetime.now(timezone.utc) - timedelta(days=conf.MESSAGE_RETENTION_DAYS)
+                    report = await async_message_crud.apply_retention(
+                        db, cutoff, conf.RETENTION_DETACH_PARTITIONS, conf.RETENTION_DELETE_BATCH
+                    )
+                    if report["partitions"] or report["deleted_count"]:
+                        await response_cache.invalidate()
+                        action = "detached" if conf.RETENTION_DETACH_PARTITIONS else "dropped"
+                        logger.info(
+                            f"Retention: {action} partitions {report['partitions']}, "
+                            f"deleted {report['deleted_count']} messages older than {cutoff.isoformat()}"
+                        )
+        except Exception as e:
+            logger.error(f"Storage maintenance failed: {e}")
+        await asyncio.sleep(conf.STORAGE_MAINTENANCE_SECONDS)
+
+
+maintenance_task = None
+
+
 # Создание приложения FastAPI
 app = FastAPI(
     title="ESP32 Message Server",
@@ -54,19 +97,58 @@ app.add_middleware(
 
 # Подключаем роутеры
 app.include_router(router)
+app.include_router(stream.router)
+app.include_router(transfer.router)
+
+if conf.METRICS_ENABLED:
+    engines = {"sync": engine}
+    if async_engine is not None:
+        engines["async"] = async_engine.sync_engine
+    metrics.setup_metrics(app, engines)
+    app.include_router(metrics.router)
 
 
 @app.on_event("startup")
 def on_startup():
     """Вызывается при запуске приложения"""
     logger.info("Server starting...")
-    init_database()
+    if conf.DB_CREATE_SCHEMA:
+        init_database()
+
+
+@app.on_event("startup")
+async def start_maintenance():
+    """Запуск фонового обслуживания хранилища (партиции, срок хранения)"""
+    global maintenance_task
+    if conf.STORAGE_MAINTENANCE_SECONDS > 0:
+        maintenance_task = asyncio.create_task(maintain_storage())
+
+
+@app.on_event("startup")
+async def start_ingest():
+    """Запуск фоновой групповой записи сообщений"""
+    ingest_queue.start()
+
+
+@app.on_event("startup")
+async def start_stream_relay():
+    """Подключение к обмену событиями потоков между воркерами"""
+    hub.start()
 
 
 @app.on_event("shutdown")
-def on_shutdown():
+async def on_shutdown():
     """Вызывается при остановке приложения"""
     logger.info("Server stopping...")
+    # Store what is still queued before the engines go away
+    await ingest_queue.stop()
+    metrics.mark_worker_stopped()
+    await hub.close()
+    await response_cache.close()
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+    if async_engine is not None:
+        await async_engine.dispose()
     engine.dispose()
 
 
@@ -80,27 +162,78 @@ def root():
         "description": "Сервер с поддержкой базы данных",
         "endpoints": {
             "send_message": "POST /api/data",
+            "queue_message": "POST /api/data?wait=false",
+            "send_batch": "POST /api/data/batch",
             "get_messages": "GET /api/data",
             "get_latest": "GET /api/data/latest",
+            "long_poll": "GET /api/data?since_id={id}&wait={seconds}",
+            "stream": "GET /api/stream",
+            "websocket": "WS /ws",
             "get_by_id": "GET /api/data/{id}",
             "get_stats": "GET /api/stats",
+            "get_range": "GET /api/data/range?since={time}&until={time}",
+            "aggregate": "GET /api/aggregate?bucket=1m&group_by=source",
             "search": "GET /api/search",
+            "export": "GET /api/export?format=ndjson|csv|parquet",
+            "import": "POST /api/import?format=ndjson|csv|parquet",
             "clear_all": "DELETE /api/data",
+            "delete_range": "DELETE /api/data?after_id={id}&before_id={id}",
             "delete_by_id": "DELETE /api/data/{id}",
             "health": "GET /health",
+            "metrics": "GET /metrics",
         },
     }
 
 
+class DatabaseProbe:
+    """Result of the last database check, refreshed at most every HEALTH_CACHE_SECONDS"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.checked_at = 0.0
+        self.result = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> dict:
+        if self.result is not None and time.monotonic() - self.checked_at < self.ttl:
+            return self.result
+        async with self._lock:
+            # Another request may have refreshed it while we waited
+            if self.result is not None and time.monotonic() - self.checked_at < self.ttl:
+                return self.result
+            try:
+                if async_engine is not None:
+                    latency = await probe_async_database()
+                else:
+                    latency = await run_in_threadpool(probe_database)
+                self.result = {"status": "connected", "latency_ms": round(latency * 1000, 3)}
+            except Exception as e:
+                logger.error(f"Database health check failed: {e}")
+                self.result = {"status": "unavailable", "error": str(e).splitlines()[0]}
+            self.checked_at = time.monotonic()
+            self.result["checked_at"] = datetime.now().isoformat()
+            return self.result
+
+
+database_probe = DatabaseProbe(conf.HEALTH_CACHE_SECONDS)
+
+
 @app.get("/health")
-def health_check():
-    """Проверка здоровья сервера"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "server": "ESP32 Message Server v2.0.0",
-        "database": "connected",
-    }
+async def health_check():
+    """Проверка здоровья сервера: доступность БД и загрузка пула соединений"""
+    database = await database_probe.get()
+    healthy = database["status"] == "connected"
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={
+            "status": "healthy" if healthy else "unhealthy",
+            "timestamp": datetime.now().isoformat(),
+            "server": "ESP32 Message Server v2.0.0",
+            "database": database["status"],
+            "database_check": database,
+            "pool": pool_status(async_engine if async_engine is not None else engine),
+        },
+    )
 
 
 @app.options("/{path:path}")
@@ -113,7 +246,8 @@ def main():
     """Запуск сервера"""
     print("=" * 50)
     print("ESP32 Message Server v2.0.0")
-    print("Logs saved to esp32_server.log")
+    if conf.LOG_FILE:
+        print(f"Logs saved to {conf.LOG_FILE}")
     print("Server available at http://localhost:7999")
     print("CORS configured for localhost:5173 and localhost:3000")
     print("Database: PostgreSQL or SQLite")
@@ -0,0 +1,272 @@
+"""
+Prometheus metrics: HTTP requests, SQL statements, connection pool and ingest.
+
+With several worker processes (src.serve) PROMETHEUS_MULTIPROC_DIR is set and
+every worker writes its samples there; /metrics then reports all of them.
+"""
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .database import pool_status
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Buckets for statements and pool waits, which are mostly well under the HTTP defaults
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status",
+    ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being processed",
+    ["method"], multiprocess_mode="livesum"
+)
+
+DB_STATEMENT_LATENCY = Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time by kind",
+    ["engine", "operation"], buckets=DB_BUCKETS
+)
+DB_ERRORS = Counter(
+    "db_errors_total", "SQL statements that raised an error",
+    ["engine"]
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    ["engine"], buckets=DB_BUCKETS
+)
+
+MESSAGES_INGESTED = Counter(
+    "messages_ingested_total", "Messages stored, by endpoint",
+    ["endpoint"]
+)
+MESSAGES_REJECTED = Counter(
+    "messages_rejected_total", "Messages rejected by validation or storage errors, by endpoint",
+    ["endpoint"]
+)
+MESSAGE_BYTES_INGESTED = Counter(
+    "message_bytes_ingested_total", "Characters of message text stored"
+)
+
+INGEST_GROUP_SIZE = Histogram(
+    "ingest_group_size", "Messages committed together by the write-behind ingest writer",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "ingest_queue_depth", "Messages waiting in the write-behind ingest queue after the last group",
+    multiprocess_mode="livesum"
+)
+
+RESPONSE_CACHE_REQUESTS = Counter(
+    "response_cache_requests_total", "Cacheable GET requests by route and outcome (hit, miss, not_modified)",
+    ["route", "result"]
+)
+
+# Statement kinds used as a label; anything else is reported as OTHER
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"}
+
+
+def _operation(statement: str) -> str:
+    words = statement.split(None, 1)
+    keyword = words[0].upper() if words else ""
+    return keyword if keyword in SQL_OPERATIONS else "OTHER"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request.
+
+    Requests are labelled by route template (/api/data/{message_id}), not by
+    raw path, so the number of series stays bounded. The router stores the
+    matched route in the scope, so the label is only known once the request is
+    handled; requests in flight are therefore counted per method.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_LATENCY.labels(method, route).observe(elapsed)
+
+
+def instrument_engine(target_engine: Engine, name: str) -> None:
+    """
+    Time SQL statements and pool checkouts of an engine.
+
+    For an AsyncEngine pass its sync_engine; the pool is shared.
+    """
+    @event.listens_for(target_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(target_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        DB_STATEMENT_LATENCY.labels(name, _operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(target_engine, "handle_error")
+    def handle_error(context):
+        DB_ERRORS.labels(name).inc()
+        starts = context.connection.info.get("query_start_time") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    # The pool has no "before checkout" event, so time its internal getter directly
+    pool = target_engine.pool
+    do_get = pool._do_get
+    wait = DB_POOL_WAIT.labels(name)
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            wait.observe(time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
+
+
+POOL_GAUGE_HELP = {
+    "size": "Configured number of pooled connections",
+    "checkedout": "Connections currently in use",
+    "overflow": "Connections opened beyond the pool size",
+    "saturation": "Connections in use as a share of the pool capacity",
+}
+
+
+class PoolCollector:
+    """Reports pool occupancy at scrape time instead of tracking every checkout"""
+
+    def __init__(self):
+        self.engines = {}
+
+    def add(self, name: str, target_engine: Engine) -> None:
+        self.engines[name] = target_engine
+
+    def collect(self):
+        families = {
+            key: GaugeMetricFamily(f"db_pool_{key}", help_text, labels=["engine"])
+            for key, help_text in POOL_GAUGE_HELP.items()
+        }
+        for name, target_engine in self.engines.items():
+            status = pool_status(target_engine)
+            for key, family in families.items():
+                if status.get(key) is not None:
+                    family.add_metric([name], status[key])
+        return list(families.values())
+
+
+pool_collector = PoolCollector()
+if MULTIPROCESS:
+    # A scrape is answered by one worker from the files of all of them, so a
+    # collector would only see its own pool; each worker pushes changes instead
+    POOL_GAUGES = {
+        key: Gauge(
+            f"db_pool_{key}", help_text, ["engine"],
+            multiprocess_mode="livemax" if key == "saturation" else "livesum"
+        )
+        for key, help_text in POOL_GAUGE_HELP.items()
+    }
+else:
+    REGISTRY.register(pool_collector)
+
+
+def track_pool(target_engine: Engine, name: str) -> None:
+    """Update the multiprocess pool gauges whenever a connection is taken or returned"""
+    def update(returning: int = 0):
+        status = pool_status(target_engine, returning)
+        for key, gauge in POOL_GAUGES.items():
+            if status.get(key) is not None:
+                gauge.labels(name).set(status[key])
+
+    event.listen(target_engine.pool, "checkout", lambda *args: update())
+    # Fired before the pool takes the connection back
+    event.listen(target_engine.pool, "checkin", lambda *args: update(returning=1))
+    update()
+
+
+def setup_metrics(app, engines: dict) -> None:
+    """Install the middleware and instrument the given {name: Engine} mapping"""
+    app.add_middleware(MetricsMiddleware)
+    for name, target_engine in engines.items():
+        instrument_engine(target_engine, name)
+        if MULTIPROCESS:
+            track_pool(target_engine, name)
+        else:
+            pool_collector.add(name, target_engine)
+
+
+def mark_worker_stopped() -> None:
+    """Drop the live gauges of this worker process when it shuts down"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def record_ingested(endpoint: str, accepted: int, rejected: int = 0, characters: Optional[int] = None) -> None:
+    """Count messages accepted and rejected by an ingest endpoint"""
+    if accepted:
+        MESSAGES_INGESTED.labels(endpoint).inc(accepted)
+    if rejected:
+        MESSAGES_REJECTED.labels(endpoint).inc(rejected)
+    if characters:
+        MESSAGE_BYTES_INGESTED.inc(characters)
+
+
+def record_ingest_group(size: int, queue_depth: int) -> None:
+    """Record a group committed by the ingest writer and what is still queued"""
+    INGEST_GROUP_SIZE.observe(size)
+    INGEST_QUEUE_DEPTH.set(queue_depth)
+
+
+def record_cache(route: str, result: str) -> None:
+    """Count a response cache lookup"""
+    RESPONSE_CACHE_REQUESTS.labels(route, result).inc()
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of all metrics (of all workers in multiprocess mode)"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
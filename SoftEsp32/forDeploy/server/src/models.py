@@ -1,10 +1,12 @@
 """
 Database models for the ESP32 message server
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import BigInteger, Column, Index, Integer, String, DateTime, Text
 from sqlalchemy.sql import func
 from .database import Base
 
+DEFAULT_SOURCE = "esp32_color_sensor"
+
 
 class Message(Base):
     """
@@ -12,12 +14,60 @@ class Message(Base):
     """
     __tablename__ = "messages"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     message = Column(Text, nullable=False)
+    # As sent by the client; client_time holds it parsed, when it is a recognizable time
     client_timestamp = Column(String, nullable=True)
+    client_time = Column(DateTime(timezone=True), nullable=True)
     server_timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    source = Column(String, default="esp32_color_sensor", nullable=False)
+    source = Column(String, default=DEFAULT_SOURCE, nullable=False)
+    
+    __table_args__ = (
+        # Time-range reads and aggregates, overall and per source
+        Index("ix_messages_server_timestamp", "server_timestamp"),
+        Index("ix_messages_source_server_timestamp", "source", "server_timestamp"),
+        Index("ix_messages_client_time", "client_time"),
+    )
+    
+    # Fetch id and server_timestamp with INSERT ... RETURNING on flush
+    __mapper_args__ = {"eager_defaults": True}
     
     def __repr__(self):
         return f"<Message(id={self.id}, message='{self.message[:50]}...', source='{self.source}')>"
 
+
+# Columns selected by read paths that skip the ORM and build responses from tuples
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.message,
+    Message.client_timestamp,
+    Message.server_timestamp,
+    Message.source,
+)
+
+
+class SourceStats(Base):
+    """
+    Running per-source totals, maintained on every create/delete/clear
+    """
+    __tablename__ = "message_source_stats"
+
+    source = Column(String, primary_key=True)
+    message_count = Column(BigInteger, nullable=False, default=0)
+    total_length = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SourceStats(source='{self.source}', message_count={self.message_count})>"
+
+
+class MinuteStats(Base):
+    """
+    Per-minute message counts for recent activity, keyed by truncated server_timestamp
+    """
+    __tablename__ = "message_minute_stats"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<MinuteStats(bucket={self.bucket}, message_count={self.message_count})>"
@@ -0,0 +1,137 @@
+"""
+Monthly range partitions of the messages table on Postgres
+"""
+import re
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Engine, text
+from sqlalchemy.orm import Session
+
+from .search import POSTGRES_SEARCH_DDL
+
+# Partitions are named messages_pYYYYMM and cover one calendar month in UTC
+PARTITION_NAME = re.compile(r"^messages_p(\d{4})(\d{2})$")
+# Catches rows no monthly partition covers (imports of old data, missed upkeep)
+DEFAULT_PARTITION = "messages_default"
+
+# Same columns as models.Message; the primary key has to include the partition key
+PARTITIONED_MESSAGES_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS messages_id_seq",
+    "CREATE TABLE messages ("
+    "id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'), "
+    "message TEXT NOT NULL, "
+    "client_timestamp VARCHAR, "
+    "client_time TIMESTAMP WITH TIME ZONE, "
+    "server_timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(), "
+    "source VARCHAR NOT NULL, "
+    "PRIMARY KEY (id, server_timestamp)"
+    ") PARTITION BY RANGE (server_timestamp)",
+    "ALTER SEQUENCE messages_id_seq OWNED BY messages.id",
+    # Created on every partition, including those attached later
+    "CREATE INDEX ix_messages_server_timestamp ON messages (server_timestamp)",
+    "CREATE INDEX ix_messages_source_server_timestamp ON messages (source, server_timestamp)",
+    "CREATE INDEX ix_messages_client_time ON messages (client_time)",
+    f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF messages DEFAULT",
+]
+
+
+def month_start(timestamp: datetime) -> datetime:
+    """First instant of the UTC month containing timestamp (naive input is UTC)"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"messages_p{month:%Y%m}"
+
+
+def is_partitioned(db: Session) -> bool:
+    """Whether messages is a partitioned Postgres table"""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages')"
+    )).first() is not None
+
+
+def list_partitions(db: Session) -> List[Tuple[str, datetime]]:
+    """(name, month start) of the monthly partitions, oldest first; the default one is not listed"""
+    names = db.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('messages')"
+    )).scalars().all()
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            month = datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def ensure_partitions(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    existing: Optional[set] = None
+) -> List[str]:
+    """
+    Create the monthly partitions covering [start, end] that do not exist yet.
+
+    A partition is created empty and then attached, which only takes a SHARE
+    UPDATE EXCLUSIVE lock on messages, so inserts keep flowing. Rows that had
+    landed in the default partition for that month are moved into it first.
+    existing, if given, caches known partition names between calls.
+    Runs in the caller's transaction; returns the names of the new partitions.
+    """
+    if existing is None:
+        existing = set()
+    if not existing:
+        existing.update(name for name, _ in list_partitions(db))
+    created = []
+    month = month_start(start)
+    while month <= end:
+        name = partition_name(month)
+        if name not in existing:
+            bounds = {"start": month, "end": add_months(month, 1)}
+            db.execute(text(f"CREATE TABLE {name} (LIKE messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+            db.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                "WHERE server_timestamp >= :start AND server_timestamp < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), bounds)
+            db.execute(text(
+                f"ALTER TABLE messages ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+            ))
+            existing.add(name)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def create_partitioned_messages(target_engine: Engine) -> bool:
+    """
+    Create messages as a partitioned table on a Postgres database that has none yet,
+    so create_all does not make a plain one. Returns whether it did.
+    """
+    if target_engine.dialect.name != "postgresql":
+        return False
+    with Session(target_engine) as db:
+        if db.execute(text("SELECT to_regclass('messages')")).scalar() is not None:
+            return False
+        for statement in PARTITIONED_MESSAGES_DDL + POSTGRES_SEARCH_DDL:
+            db.execute(text(statement))
+        now = datetime.now(timezone.utc)
+        ensure_partitions(db, now, now)
+        db.commit()
+    return True
@@ -0,0 +1,36 @@
+"""
+Fast JSON responses for read endpoints built from column tuples
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy import Row
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON rendered by orjson.
+
+    Produces the same bytes as FastAPI's default encoder for message payloads:
+    compact separators, raw UTF-8 and UTC datetimes with a "Z" suffix like pydantic.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def message_row_to_dict(row: Row) -> dict:
+    """
+    A MESSAGE_COLUMNS row laid out exactly as MessageResponse serializes it,
+    including the field order and the always-null `timestamp` inherited from MessageBase
+    """
+    message_id, message, client_timestamp, server_timestamp, source = row
+    return {
+        "message": message,
+        "timestamp": None,
+        "source": source,
+        "id": message_id,
+        "client_timestamp": client_timestamp,
+        "server_timestamp": server_timestamp,
+    }
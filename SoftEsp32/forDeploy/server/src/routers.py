@@ -1,18 +1,33 @@
 """
 API routers for the ESP32 message server
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List
-from .database import get_db
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, status, Query
+from pydantic import ValidationError
+from typing import Any, List, Literal, Optional, Tuple
+from .config import config as conf
+from .database import DBSession, get_session
+from .models import DEFAULT_SOURCE
 from .schemas import (
     MessageCreate, 
     MessageResponse, 
+    MessageAcceptedResponse,
     MessageListResponse,
     MessageStatsResponse,
-    MessageDeleteResponse
+    MessageDeleteResponse,
+    MessageBatchItemResult,
+    MessageBatchResponse,
+    MessageRangeResponse,
+    MessageAggregateResponse
 )
-from .crud import message_crud
+from .broadcast import hub
+from .cache import response_cache
+from .ingest import IngestQueueFull, ingest_queue
+from .crud import AGGREGATE_BUCKETS, async_message_crud
+from .metrics import record_ingested
+from .responses import ORJSONResponse, message_row_to_dict
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,62 +36,280 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["messages"])
 
 
-@router.post("/data", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
-def create_message(
+def encode_cursor(direction: str, message_id: int) -> str:
+    """Build an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(f"{direction}:{message_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Parse a cursor produced by encode_cursor into (direction, message_id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, message_id = base64.urlsafe_b64decode(padded).decode().split(":")
+        if direction not in ("before", "after"):
+            raise ValueError(direction)
+        return direction, int(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+
+
+def encode_range_cursor(timestamp: datetime, message_id: int) -> str:
+    """Build an opaque cursor for time range pages from the last (time, id)"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{message_id}".encode()).decode().rstrip("=")
+
+
+def decode_range_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor produced by encode_range_cursor into (time, message_id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, message_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+
+
+def as_utc(timestamp: datetime) -> datetime:
+    """Aware UTC form of a query timestamp (naive values are taken as UTC)"""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+@router.post(
+    "/data",
+    response_model=MessageResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": MessageAcceptedResponse}}
+)
+async def create_message(
     message_data: MessageCreate,
-    db: Session = Depends(get_db)
+    wait: bool = Query(True),
+    db: DBSession = Depends(get_session)
 ):
     """
-    Create a new message from ESP32
+    Create a new message from ESP32.
+
+    With INGEST_GROUP_COMMIT the message is committed together with others
+    by the ingest writer; the response is the same once it is stored.
+    wait=false only queues it and answers 202. A full queue answers 503.
     """
+    if conf.INGEST_GROUP_COMMIT or not wait:
+        return await enqueue_message(message_data, wait)
+    
     try:
-        db_message = message_crud.create_message(db, message_data)
+        db_message = await async_message_crud.create_message(db, message_data)
+        await response_cache.invalidate()
+        record_ingested("single", 1, characters=len(db_message.message))
         logger.info(f"Received message #{db_message.id}: '{message_data.message}'")
         
-        return MessageResponse(
+        response = MessageResponse(
             id=db_message.id,
             message=db_message.message,
             client_timestamp=db_message.client_timestamp,
             server_timestamp=db_message.server_timestamp,
             source=db_message.source
         )
+        hub.publish_message(response.model_dump(mode="json"))
+        return response
+    except Exception as e:
+        record_ingested("single", 0, rejected=1)
+        logger.error(f"Ошибка создания сообщения: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ошибка обработки сообщения: {str(e)}"
+        )
+
+
+async def enqueue_message(message_data: MessageCreate, wait: bool):
+    """Hand a message to the ingest writer"""
+    try:
+        future = ingest_queue.submit(message_data, wait)
+    except IngestQueueFull:
+        record_ingested("queued", 0, rejected=1)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Очередь записи переполнена, повторите позже",
+            headers={"Retry-After": "1"}
+        )
+    if future is None:
+        return ORJSONResponse(
+            {"status": "accepted", "queued_count": ingest_queue.depth},
+            status_code=status.HTTP_202_ACCEPTED
+        )
+    
+    try:
+        message_id, server_timestamp = await future
     except Exception as e:
         logger.error(f"Ошибка создания сообщения: {e}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Ошибка обработки сообщения: {str(e)}"
         )
+    return MessageResponse(
+        id=message_id,
+        message=message_data.message,
+        client_timestamp=message_data.timestamp,
+        server_timestamp=server_timestamp,
+        source=message_data.source or DEFAULT_SOURCE
+    )
+
+
+@router.post("/data/batch", response_model=MessageBatchResponse, status_code=status.HTTP_201_CREATED)
+async def create_messages_batch(
+    items: List[Any] = Body(...),
+    db: DBSession = Depends(get_session)
+):
+    """
+    Create many messages from ESP32 gateways in a single transaction.
+
+    Invalid items are reported per index and do not fail the rest of the batch.
+    """
+    if len(items) > conf.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Слишком много сообщений в пакете (максимум {conf.BATCH_MAX_SIZE})"
+        )
+    
+    results: List[MessageBatchItemResult] = []
+    valid: List[MessageCreate] = []
+    valid_indexes: List[int] = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(MessageCreate.model_validate(item))
+            valid_indexes.append(index)
+            results.append(MessageBatchItemResult(index=index, status="created"))
+        except ValidationError as e:
+            results.append(MessageBatchItemResult(
+                index=index,
+                status="rejected",
+                error="; ".join(
+                    f"{'.'.join(str(loc) for loc in err['loc']) or 'item'}: {err['msg']}"
+                    for err in e.errors()
+                )
+            ))
+    
+    try:
+        created = await async_message_crud.create_messages(db, valid)
+    except Exception as e:
+        record_ingested("batch", 0, rejected=len(items))
+        logger.error(f"Ошибка пакетного создания сообщений: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ошибка обработки пакета: {str(e)}"
+        )
+    
+    if created:
+        await response_cache.invalidate()
+    for index, item, (message_id, server_timestamp) in zip(valid_indexes, valid, created):
+        results[index].id = message_id
+        results[index].server_timestamp = server_timestamp
+        hub.publish_message(MessageResponse(
+            id=message_id,
+            message=item.message,
+            client_timestamp=item.timestamp,
+            server_timestamp=server_timestamp,
+            source=item.source or DEFAULT_SOURCE
+        ).model_dump(mode="json"))
+    
+    record_ingested(
+        "batch", len(created), rejected=len(items) - len(created),
+        characters=sum(len(item.message) for item in valid)
+    )
+    logger.info(f"Received batch: {len(created)} created, {len(items) - len(created)} rejected")
+    
+    return MessageBatchResponse(
+        status="success",
+        accepted_count=len(created),
+        rejected_count=len(items) - len(created),
+        results=results
+    )
 
 
 @router.get("/data", response_model=MessageListResponse)
-def get_messages(
+async def get_messages(
+    request: Request,
     limit: int = Query(50, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    before_id: Optional[int] = Query(None, ge=1),
+    after_id: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(False),
+    since_id: Optional[int] = Query(None, ge=0),
+    wait: float = Query(0, ge=0, le=60),
+    db: DBSession = Depends(get_session)
 ):
     """
-    Get all messages with pagination
+    Get all messages with pagination.
+
+    Pass next_cursor (or before_id/after_id) for keyset pages; the total count
+    is only computed when include_total=true. since_id with wait=N is a
+    long-poll: it returns as soon as a newer message exists, or empty after N seconds.
+    The first page is served from the response cache.
     """
+    if since_id is not None:
+        after_id = since_id
+    if cursor is not None:
+        direction, cursor_id = decode_cursor(cursor)
+        if direction == "before":
+            before_id = cursor_id
+        else:
+            after_id = cursor_id
+    if offset and (before_id is not None or after_id is not None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="offset нельзя сочетать с курсором, before_id или after_id"
+        )
+    
+    if offset == 0 and before_id is None and after_id is None:
+        return await response_cache.respond(
+            request, lambda: build_messages_page(db, limit, offset, before_id, after_id, since_id, wait, include_total)
+        )
+    return await build_messages_page(db, limit, offset, before_id, after_id, since_id, wait, include_total)
+
+
+async def build_messages_page(
+    db: DBSession,
+    limit: int,
+    offset: int,
+    before_id: Optional[int],
+    after_id: Optional[int],
+    since_id: Optional[int],
+    wait: float,
+    include_total: bool
+) -> ORJSONResponse:
+    """One page of GET /api/data"""
     try:
-        messages = message_crud.get_messages(db, limit, offset)
-        total_count = message_crud.get_total_count(db)
+        rows = await async_message_crud.get_message_rows(db, limit, offset, before_id, after_id)
+        if since_id is not None and not rows and wait > 0:
+            # Do not hold a pooled connection while waiting
+            await async_message_crud.release(db)
+            if await hub.wait_for_newer(since_id, wait):
+                rows = await async_message_crud.get_message_rows(db, limit, offset, before_id, after_id)
+        total_count = await async_message_crud.get_total_count(db) if include_total else None
         
-        return MessageListResponse(
-            status="success",
-            total_count=total_count,
-            returned_count=len(messages),
-            limit=limit,
-            offset=offset,
-            messages=[
-                MessageResponse(
-                    id=msg.id,
-                    message=msg.message,
-                    client_timestamp=msg.client_timestamp,
-                    server_timestamp=msg.server_timestamp,
-                    source=msg.source
-                ) for msg in messages
-            ]
-        )
+        next_cursor = None
+        if len(rows) == limit:
+            if after_id is not None:
+                next_cursor = encode_cursor("after", rows[0].id)
+            else:
+                next_cursor = encode_cursor("before", rows[-1].id)
+        
+        # Column tuples straight to orjson, same bytes as MessageListResponse
+        return ORJSONResponse({
+            "status": "success",
+            "total_count": total_count,
+            "returned_count": len(rows),
+            "limit": limit,
+            "offset": offset,
+            "next_cursor": next_cursor,
+            "messages": [message_row_to_dict(row) for row in rows],
+        })
     except Exception as e:
         logger.error(f"Ошибка получения сообщений: {e}")
         raise HTTPException(
@@ -85,26 +318,128 @@ def get_messages(
         )
 
 
+@router.get("/data/range", response_model=MessageRangeResponse)
+async def get_messages_range(
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    source: Optional[str] = Query(None),
+    time_field: Literal["server", "client"] = Query("server"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: DBSession = Depends(get_session)
+):
+    """
+    Get messages with since <= time < until, oldest first.
+
+    time_field picks the server receive time or the parsed client timestamp
+    (messages without one are skipped). Pass next_cursor for the next page.
+    """
+    since = as_utc(since) if since is not None else None
+    until = as_utc(until) if until is not None else None
+    if since is not None and until is not None and since >= until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since должен быть раньше until"
+        )
+    after = decode_range_cursor(cursor) if cursor is not None else None
+    
+    try:
+        rows = await async_message_crud.get_range_rows(db, since, until, source, time_field, limit, after)
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_range_cursor(rows[-1][-1], rows[-1].id)
+        
+        return ORJSONResponse({
+            "status": "success",
+            "returned_count": len(rows),
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "messages": [message_row_to_dict(row[:-1]) for row in rows],
+        })
+    except Exception as e:
+        logger.error(f"Ошибка получения сообщений за период: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при получении сообщений за период"
+        )
+
+
+@router.get("/aggregate", response_model=MessageAggregateResponse)
+async def aggregate_messages(
+    bucket: Literal["1m", "5m", "15m", "1h", "1d"] = Query("1m"),
+    group_by: Optional[Literal["source"]] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    source: Optional[str] = Query(None),
+    time_field: Literal["server", "client"] = Query("server"),
+    db: DBSession = Depends(get_session)
+):
+    """
+    Count messages per time bucket, optionally per source, for since <= time < until.
+
+    Buckets are computed by the database (date_trunc/date_bin on Postgres,
+    strftime on SQLite) in UTC; empty buckets are omitted. The window
+    defaults to the last day.
+    """
+    until = as_utc(until) if until is not None else datetime.now(timezone.utc)
+    since = as_utc(since) if since is not None else until - timedelta(days=1)
+    bucket_seconds = AGGREGATE_BUCKETS[bucket]
+    if since >= until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since должен быть раньше until"
+        )
+    if (until - since).total_seconds() / bucket_seconds > conf.AGGREGATE_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Слишком много интервалов (максимум {conf.AGGREGATE_MAX_BUCKETS}), увеличьте bucket или сузьте период"
+        )
+    
+    try:
+        buckets = await async_message_crud.aggregate_messages(
+            db, bucket_seconds, since, until, source, group_by == "source", time_field
+        )
+        return ORJSONResponse({
+            "status": "success",
+            "bucket": bucket,
+            "group_by": group_by,
+            "since": since,
+            "until": until,
+            "buckets": buckets,
+        })
+    except Exception as e:
+        logger.error(f"Ошибка агрегации сообщений: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при агрегации сообщений"
+        )
+
+
 @router.get("/data/latest", response_model=MessageResponse)
-def get_latest_message(db: Session = Depends(get_db)):
+async def get_latest_message(request: Request, db: DBSession = Depends(get_session)):
     """
-    Get the latest message
+    Get the latest message (served from the response cache)
     """
+    return await response_cache.respond(request, lambda: build_latest_message(db))
+
+
+async def build_latest_message(db: DBSession) -> ORJSONResponse:
+    """Response of GET /api/data/latest"""
     try:
-        message = message_crud.get_latest_message(db)
+        message = await async_message_crud.get_latest_message(db)
         if not message:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Нет сообщений"
             )
         
-        return MessageResponse(
+        return ORJSONResponse(MessageResponse(
             id=message.id,
             message=message.message,
             client_timestamp=message.client_timestamp,
             server_timestamp=message.server_timestamp,
             source=message.source
-        )
+        ).model_dump(mode="json"))
     except HTTPException:
         raise
     except Exception as e:
@@ -116,15 +451,15 @@ def get_latest_message(db: Session = Depends(get_db)):
 
 
 @router.get("/data/{message_id}", response_model=MessageResponse)
-def get_message_by_id(
+async def get_message_by_id(
     message_id: int,
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_session)
 ):
     """
     Get message by ID
     """
     try:
-        message = message_crud.get_message_by_id(db, message_id)
+        message = await async_message_crud.get_message_by_id(db, message_id)
         if not message:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -149,16 +484,29 @@ def get_message_by_id(
 
 
 @router.get("/stats", response_model=MessageStatsResponse)
-def get_stats(db: Session = Depends(get_db)):
+async def get_stats(
+    request: Request,
+    exact: bool = Query(False),
+    db: DBSession = Depends(get_session)
+):
     """
-    Get server statistics
+    Get server statistics from incrementally maintained counters.
+
+    Served from the response cache, recomputed at least every STATS_CACHE_SECONDS.
     """
+    return await response_cache.respond(
+        request, lambda: build_stats(db, exact), slot_seconds=conf.STATS_CACHE_SECONDS
+    )
+
+
+async def build_stats(db: DBSession, exact: bool) -> ORJSONResponse:
+    """Response of GET /api/stats"""
     try:
-        stats = message_crud.get_stats(db)
-        return MessageStatsResponse(
+        stats = await async_message_crud.get_stats(db, exact)
+        return ORJSONResponse(MessageStatsResponse(
             status="success",
             statistics=stats
-        )
+        ).model_dump(mode="json"))
     except Exception as e:
         logger.error(f"Ошибка получения статистики: {e}")
         raise HTTPException(
@@ -168,17 +516,30 @@ def get_stats(db: Session = Depends(get_db)):
 
 
 @router.delete("/data", response_model=MessageDeleteResponse)
-def clear_all_messages(db: Session = Depends(get_db)):
+async def clear_all_messages(
+    after_id: Optional[int] = Query(None, ge=0),
+    before_id: Optional[int] = Query(None, ge=1),
+    db: DBSession = Depends(get_session)
+):
     """
-    Clear all messages
+    Clear all messages, or only those with after_id < id < before_id.
+
+    Either way it is a single set-based statement (TRUNCATE for everything on Postgres).
     """
     try:
-        count = message_crud.delete_all_messages(db)
-        logger.info(f"Cleared {count} messages")
+        if after_id is None and before_id is None:
+            count = await async_message_crud.delete_all_messages(db)
+            logger.info(f"Cleared {count} messages")
+            message = f"Очищено {count} сообщений"
+        else:
+            count = await async_message_crud.delete_messages_range(db, after_id, before_id)
+            logger.info(f"Deleted {count} messages in range ({after_id}, {before_id})")
+            message = f"Удалено {count} сообщений"
+        await response_cache.invalidate()
         
         return MessageDeleteResponse(
             status="success",
-            message=f"Очищено {count} сообщений"
+            message=message
         )
     except Exception as e:
         logger.error(f"Ошибка очистки сообщений: {e}")
@@ -189,21 +550,22 @@ def clear_all_messages(db: Session = Depends(get_db)):
 
 
 @router.delete("/data/{message_id}", response_model=MessageDeleteResponse)
-def delete_message(
+async def delete_message(
     message_id: int,
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_session)
 ):
     """
     Delete message by ID
     """
     try:
-        deleted_message = message_crud.delete_message(db, message_id)
+        deleted_message = await async_message_crud.delete_message(db, message_id)
         if not deleted_message:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Сообщение с ID {message_id} не найдено"
             )
         
+        await response_cache.invalidate()
         logger.info(f"Deleted message #{message_id}: '{deleted_message.message}'")
         
         return MessageDeleteResponse(
@@ -228,32 +590,24 @@ def delete_message(
 
 
 @router.get("/search")
-def search_messages(
+async def search_messages(
     query: str = Query(..., min_length=1),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_session)
 ):
     """
-    Search messages by text content
+    Search messages by text content using the full-text index, best matches first
     """
     try:
-        messages = message_crud.search_messages(db, query, limit)
+        rows, found_count = await async_message_crud.search_message_rows(db, query, limit)
         
-        return {
+        return ORJSONResponse({
             "status": "success",
             "query": query,
-            "found_count": len(messages),
-            "returned_count": min(limit, len(messages)),
-            "messages": [
-                MessageResponse(
-                    id=msg.id,
-                    message=msg.message,
-                    client_timestamp=msg.client_timestamp,
-                    server_timestamp=msg.server_timestamp,
-                    source=msg.source
-                ) for msg in messages
-            ]
-        }
+            "found_count": found_count,
+            "returned_count": len(rows),
+            "messages": [message_row_to_dict(row) for row in rows],
+        })
     except Exception as e:
         logger.error(f"Ошибка поиска сообщений: {e}")
         raise HTTPException(
@@ -32,10 +32,11 @@ class MessageResponse(MessageBase):
 class MessageListResponse(BaseModel):
     """Schema for message list response"""
     status: str
-    total_count: int
+    total_count: Optional[int] = None
     returned_count: int
     limit: int
     offset: int
+    next_cursor: Optional[str] = None
     messages: List[MessageResponse]
 
 
@@ -51,3 +52,57 @@ class MessageDeleteResponse(BaseModel):
     message: str
     deleted_message: Optional[MessageResponse] = None
 
+
+class MessageBatchItemResult(BaseModel):
+    """Schema for the outcome of a single item in a batch"""
+    index: int
+    status: str
+    id: Optional[int] = None
+    server_timestamp: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class MessageBatchResponse(BaseModel):
+    """Schema for batch create response"""
+    status: str
+    accepted_count: int
+    rejected_count: int
+    results: List[MessageBatchItemResult]
+
+
+class MessageAcceptedResponse(BaseModel):
+    """Schema for a message queued without waiting for storage"""
+    status: str
+    queued_count: int
+
+
+class MessageImportResponse(BaseModel):
+    """Schema for bulk import response"""
+    status: str
+    imported_count: int
+
+
+class MessageRangeResponse(BaseModel):
+    """Schema for time range response"""
+    status: str
+    returned_count: int
+    limit: int
+    next_cursor: Optional[str] = None
+    messages: List[MessageResponse]
+
+
+class AggregateBucket(BaseModel):
+    """Schema for one bucket of an aggregate"""
+    bucket: datetime
+    source: Optional[str] = None
+    count: int
+
+
+class MessageAggregateResponse(BaseModel):
+    """Schema for aggregate response"""
+    status: str
+    bucket: str
+    group_by: Optional[str] = None
+    since: datetime
+    until: datetime
+    buckets: List[AggregateBucket]
@@ -0,0 +1,154 @@
+"""
+Indexed full-text search over message text
+"""
+from sqlalchemy import Column, DDL, Float, Integer, MetaData, Row, Select, Table, Text, delete, event, func, select, text
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Sequence, Tuple
+from .models import MESSAGE_COLUMNS, Message
+
+# Trigram indexes need at least this many characters to narrow a search
+MIN_INDEXED_QUERY_LENGTH = 3
+
+# FTS5 shadow table over messages.message (external content, kept in sync by triggers)
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "message, content='messages', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, message) VALUES (new.id, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF message ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+    "INSERT INTO messages_fts(rowid, message) VALUES (new.id, new.message); END",
+]
+
+# Trigger that indexes every inserted row; bulk loads swap it for per-chunk inserts
+SQLITE_INSERT_TRIGGER = SQLITE_SEARCH_DDL[1]
+# Trigger that unindexes every deleted row; clearing the table swaps it for 'delete-all'
+SQLITE_DELETE_TRIGGER = SQLITE_SEARCH_DDL[2]
+
+# Trigram GIN index that serves ILIKE '%q%' directly
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_messages_message_trgm "
+    "ON messages USING gin (message gin_trgm_ops)",
+]
+
+# Let create_all build the search index too, not only the Alembic migration
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Message.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(Message.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+# Query-side description of the FTS5 table; kept out of Base.metadata on purpose
+messages_fts = Table(
+    "messages_fts",
+    MetaData(),
+    Column("rowid", Integer),
+    Column("message", Text),
+    Column("rank", Float),
+)
+
+
+def suspend_sqlite_index(db: Session) -> bool:
+    """
+    Drop the FTS insert trigger for the rest of the current transaction, so a
+    bulk load can index its rows per chunk with index_sqlite_rows. Returns
+    False when the database has no search index.
+
+    The transaction must already have written something: pysqlite only opens
+    it on DML, and DDL outside a transaction would commit on its own. While
+    the write lock is held no other connection can insert unindexed rows, and
+    resume_sqlite_index restores the trigger before the commit.
+    """
+    trigger = db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'messages_fts_ai'"
+    )).first()
+    if trigger is None:
+        return False
+    db.execute(text("DROP TRIGGER messages_fts_ai"))
+    return True
+
+
+def index_sqlite_rows(db: Session, rows: Iterable[Tuple[int, str]]) -> None:
+    """Add (id, message) rows to the FTS index in one executemany"""
+    db.execute(
+        text("INSERT INTO messages_fts(rowid, message) VALUES (:id, :message)"),
+        [{"id": message_id, "message": message} for message_id, message in rows]
+    )
+
+
+def resume_sqlite_index(db: Session) -> None:
+    """Restore the trigger dropped by suspend_sqlite_index"""
+    db.execute(text(SQLITE_INSERT_TRIGGER))
+
+
+def delete_all_sqlite(db: Session) -> int:
+    """
+    Empty messages and its FTS index; returns the number of deleted messages.
+
+    With no delete trigger SQLite truncates the table in one step instead of
+    visiting every row, so the trigger is dropped and restored around the
+    DELETE. As with suspend_sqlite_index, the transaction must already have written.
+    """
+    trigger = db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'messages_fts_ad'"
+    )).first()
+    if trigger is not None:
+        db.execute(text("DROP TRIGGER messages_fts_ad"))
+    count = db.execute(delete(Message)).rowcount
+    if trigger is not None:
+        db.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')"))
+        db.execute(text(SQLITE_DELETE_TRIGGER))
+    return count
+
+
+def _like_pattern(query: str) -> str:
+    """Substring LIKE pattern with wildcards in the query escaped"""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _fts_phrase(query: str) -> str:
+    """Quote the query as a single FTS5 phrase so it matches as a substring"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _search_statements(dialect: str, query: str, limit: int, entities: Sequence) -> Tuple[Select, Select]:
+    """Ranked page and total count statements selecting `entities`"""
+    if dialect == "sqlite" and len(query) >= MIN_INDEXED_QUERY_LENGTH:
+        match = text("messages_fts MATCH :phrase").bindparams(phrase=_fts_phrase(query))
+        page = (
+            select(*entities)
+            .join(messages_fts, messages_fts.c.rowid == Message.id)
+            .where(match)
+            .order_by(messages_fts.c.rank, Message.id.desc())
+            .limit(limit)
+        )
+        total = select(func.count()).select_from(messages_fts).where(match)
+        return page, total
+
+    condition = Message.message.ilike(_like_pattern(query), escape="\\")
+    ordering = [Message.id.desc()]
+    if dialect == "postgresql":
+        ordering.insert(0, func.word_similarity(query, Message.message).desc())
+
+    page = select(*entities).where(condition).order_by(*ordering).limit(limit)
+    total = select(func.count(Message.id)).where(condition)
+    return page, total
+
+
+def search_messages(db: Session, query: str, limit: int = 20) -> Tuple[List[Message], int]:
+    """
+    Search messages by text content, best matches first.
+
+    Returns the requested page and the total number of matches.
+    """
+    page, total = _search_statements(db.get_bind().dialect.name, query, limit, [Message])
+    return db.execute(page).scalars().all(), db.execute(total).scalar()
+
+
+def search_message_rows(db: Session, query: str, limit: int = 20) -> Tuple[List[Row], int]:
+    """Same as search_messages, but returns MESSAGE_COLUMNS tuples instead of ORM objects"""
+    page, total = _search_statements(db.get_bind().dialect.name, query, limit, MESSAGE_COLUMNS)
+    return db.execute(page).all(), db.execute(total).scalar()
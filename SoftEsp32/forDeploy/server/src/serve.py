@@ -0,0 +1,226 @@
+"""
+Production launcher: apply migrations once, then serve with one or more workers.
+
+    python -m src.serve [--workers N] [--host HOST] [--port PORT]
+    python -m src.serve --check-startup
+
+The launcher runs the Alembic migrations before any worker starts, so workers
+never issue DDL (--check-startup verifies it). A single worker runs in the
+launcher process and keeps the app's storage maintenance task; with several the
+launcher runs the maintenance loop itself, so it runs once rather than once per
+worker. Workers are uvicorn processes using uvloop and httptools when installed
+(pip install server[production]); on SIGTERM they stop accepting connections
+and finish in-flight requests for up to SERVER_GRACEFUL_TIMEOUT_SECONDS.
+
+One worker per available CPU is the default. Several workers need Redis
+(pip install server[redis]): the launcher turns on the stream relay, so
+/api/stream, /ws and long-polling GET /api/data see messages posted to any
+worker, moves the per-process response cache to Redis, and refuses to start
+when Redis cannot be reached. --workers 1 runs without Redis.
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import uvicorn
+
+from .config import config as conf
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+# Statements the app must not run at startup once the migrations are applied
+DDL_PREFIXES = ("CREATE", "ALTER", "DROP")
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity, e.g. taskset or cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def prepare_metrics_dir() -> str:
+    """Empty metrics directory shared by the workers; stale files would add up old counters"""
+    path = conf.PROMETHEUS_MULTIPROC_DIR or os.path.join(tempfile.gettempdir(), "esp32-server-metrics")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def run_migrations() -> None:
+    """Bring the database to the latest Alembic revision"""
+    from alembic import command
+    from alembic.config import Config as AlembicConfig
+    from sqlalchemy import inspect
+
+    from .database import engine
+
+    tables = inspect(engine).get_table_names()
+    if "messages" in tables and "alembic_version" not in tables:
+        # Created by create_all: Alembic would try to create everything again
+        raise SystemExit(
+            "База данных создана без Alembic: отметьте ревизию, соответствующую схеме, "
+            "командой `alembic stamp <revision>` и перезапустите сервер"
+        )
+    # Built without the ini file so env.py does not replace the logging configuration
+    alembic_config = AlembicConfig()
+    alembic_config.set_main_option("script_location", os.path.join(SERVER_DIR, "alembic"))
+    alembic_config.set_main_option("sqlalchemy.url", conf.DATABASE_URL.replace("%", "%%"))
+    command.upgrade(alembic_config, "head")
+    engine.dispose()
+
+
+def override(name: str, value) -> None:
+    """
+    Set a setting for the workers and for this process.
+
+    Spawned workers build their config from the environment; a single worker
+    runs in this process and reuses the config object that is already loaded.
+    """
+    os.environ[name] = str(value)
+    setattr(conf, name, value)
+
+
+def check_redis(url: str) -> None:
+    """Fail before the workers start when they could not share events through Redis"""
+    if not has_module("redis"):
+        raise SystemExit(
+            "Несколько воркеров обмениваются событиями через Redis: установите server[redis] "
+            "или запустите с --workers 1"
+        )
+    import redis
+
+    try:
+        redis.from_url(url).ping()
+    except redis.RedisError as e:
+        raise SystemExit(f"Redis {url} недоступен ({e}): запустите Redis или укажите --workers 1")
+
+
+def check_startup() -> int:
+    """Start and stop the app in this process, as one worker does, and fail if it issued DDL"""
+    from sqlalchemy import event
+
+    from .database import Base, async_engine, engine
+    from .main import app
+
+    statements = []
+
+    def on_execute(connection, cursor, statement, *args) -> None:
+        if statement.lstrip().upper().startswith(DDL_PREFIXES):
+            statements.append(statement)
+
+    def on_create_all(*args, **kwargs) -> None:
+        # create_all emits nothing when the tables exist, but must not run at all
+        statements.append("metadata.create_all()")
+
+    engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    for target_engine in engines:
+        event.listen(target_engine, "before_cursor_execute", on_execute)
+    event.listen(Base.metadata, "before_create", on_create_all)
+
+    async def cycle() -> None:
+        async with app.router.lifespan_context(app):
+            pass
+
+    asyncio.run(cycle())
+    for statement in statements:
+        logger.error(f"DDL at startup: {statement.strip().splitlines()[0]}")
+    if statements:
+        return 1
+    logger.info("Startup issued no DDL.")
+    return 0
+
+
+def start_maintenance() -> None:
+    """Run the storage maintenance loop in a daemon thread of the launcher"""
+    from .main import maintain_storage
+
+    thread = threading.Thread(
+        target=asyncio.run, args=(maintain_storage(),), name="storage-maintenance", daemon=True
+    )
+    thread.start()
+
+
+def main(argv=None) -> None:
+    """Запуск сервера в production-режиме"""
+    parser = argparse.ArgumentParser(description="ESP32 Message Server (production)")
+    parser.add_argument("--host", default=conf.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=conf.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=conf.SERVER_WORKERS,
+                        help="worker processes (0 = one per available CPU); more than one needs Redis")
+    parser.add_argument("--access-log", action="store_true", help="log every request")
+    parser.add_argument("--check-startup", action="store_true",
+                        help="apply migrations, start and stop the app once and fail if it issued DDL")
+    args = parser.parse_args(argv)
+    workers = args.workers if args.workers > 0 else available_cpus()
+    if args.check_startup:
+        workers = 1
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+
+    # Applied before the app is imported; the environment wins over .env
+    override("DB_CREATE_SCHEMA", False)
+    override("LOG_FILE", os.environ.get("LOG_FILE", ""))
+    # Several workers would each run maintenance; the launcher runs it instead
+    if workers > 1:
+        os.environ["STORAGE_MAINTENANCE_SECONDS"] = "0"
+    if conf.METRICS_ENABLED:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = prepare_metrics_dir()
+    if workers > 1 and conf.STREAM_RELAY_BACKEND == "off":
+        # Each worker has its own hub; without the relay streams miss other workers' messages
+        logger.info("Relaying stream events between workers through Redis")
+        override("STREAM_RELAY_BACKEND", "redis")
+    if workers > 1 and conf.RESPONSE_CACHE_BACKEND == "memory":
+        # Per-worker caches are not invalidated by writes handled by other workers
+        logger.info("RESPONSE_CACHE_BACKEND=memory is per process; using redis")
+        override("RESPONSE_CACHE_BACKEND", "redis")
+    if workers > 1:
+        check_redis(conf.STREAM_RELAY_REDIS_URL)
+        if conf.RESPONSE_CACHE_BACKEND == "redis":
+            check_redis(conf.RESPONSE_CACHE_REDIS_URL)
+
+    logger.info("Applying migrations...")
+    run_migrations()
+    logger.info("Database is at the latest revision.")
+
+    if args.check_startup:
+        override("STORAGE_MAINTENANCE_SECONDS", 0)
+        return check_startup()
+    if workers > 1 and conf.STORAGE_MAINTENANCE_SECONDS > 0:
+        start_maintenance()
+
+    loop = "uvloop" if has_module("uvloop") else "asyncio"
+    http = "httptools" if has_module("httptools") else "h11"
+    logger.info(f"Starting {workers} workers on {args.host}:{args.port} (loop={loop}, http={http})")
+    uvicorn.run(
+        "src.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=conf.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        access_log=args.access_log,
+        log_level="info",
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Server-push endpoints: Server-Sent Events and WebSocket streams of new messages
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Header, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
+
+from .broadcast import Subscription, hub
+from .config import config as conf
+from .crud import async_message_crud
+from .database import open_session
+from .schemas import MessageResponse
+
+logger = logging.getLogger(__name__)
+
+# Largest backlog replayed to an SSE client that reconnects with Last-Event-ID
+REPLAY_LIMIT = 1000
+
+router = APIRouter(tags=["stream"])
+
+
+def _sse_event(message: dict) -> str:
+    """Format a message as a Server-Sent Event"""
+    return f"id: {message['id']}\nevent: new_message\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+
+async def _replay_since(since_id: int) -> list:
+    """Messages newer than since_id, oldest first, as JSON-ready dicts"""
+    async with open_session() as db:
+        messages = await async_message_crud.get_messages(db, REPLAY_LIMIT, 0, None, since_id)
+    return [
+        MessageResponse(
+            id=msg.id,
+            message=msg.message,
+            client_timestamp=msg.client_timestamp,
+            server_timestamp=msg.server_timestamp,
+            source=msg.source
+        ).model_dump(mode="json") for msg in reversed(messages)
+    ]
+
+
+async def _sse_events(request: Request, since_id: Optional[int]) -> AsyncIterator[str]:
+    # Subscribe before replaying so nothing published in between is lost
+    with hub.subscribe() as subscription:
+        last_sent = 0
+        if since_id is not None:
+            for message in await _replay_since(since_id):
+                last_sent = message["id"]
+                yield _sse_event(message)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), conf.STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            # Skip events already delivered by the replay
+            if event["message"]["id"] <= last_sent:
+                continue
+            yield _sse_event(event["message"])
+
+
+@router.get("/api/stream")
+async def stream_messages(
+    request: Request,
+    since_id: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[int] = Header(None)
+):
+    """
+    Server-Sent Events stream of newly created messages.
+
+    Reconnecting clients resume after Last-Event-ID (or since_id).
+    """
+    return StreamingResponse(
+        _sse_events(request, since_id if since_id is not None else last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def websocket_messages(websocket: WebSocket):
+    """
+    WebSocket stream of newly created messages ({"type": "new_message", "message": {...}})
+    """
+    await websocket.accept()
+
+    async def send_events(subscription: Subscription):
+        while True:
+            event = await subscription.get()
+            if event is None:
+                return
+            await websocket.send_json(event)
+
+    async def receive_until_closed():
+        # Client frames are ignored; this only notices the disconnect
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    with hub.subscribe() as subscription:
+        tasks = {
+            asyncio.create_task(send_events(subscription)),
+            asyncio.create_task(receive_until_closed()),
+        }
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"WebSocket stream closed: {task.exception()}")
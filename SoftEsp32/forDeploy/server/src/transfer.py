@@ -0,0 +1,368 @@
+"""
+Bulk export and import of the messages table as NDJSON, CSV or (with pyarrow) Parquet
+"""
+import csv
+import io
+import logging
+import tempfile
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO, Iterator, List, Literal, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from .config import config as conf
+from .cache import response_cache
+from .crud import IMPORT_COLUMNS, ImportRow, async_message_crud, message_crud
+from .database import AsyncSessionLocal, DBSession, SessionLocal, get_session
+from .metrics import record_ingested
+from .responses import message_row_to_dict
+from .schemas import MessageImportResponse
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet is an optional extra (pip install server[parquet])
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+TransferFormat = Literal["ndjson", "csv", "parquet"]
+
+router = APIRouter(prefix="/api", tags=["transfer"])
+
+
+class ImportFormatError(ValueError):
+    """A record of an import file that cannot be loaded"""
+
+
+class NdjsonEncoder:
+    """One message per line, shaped exactly like the messages of GET /api/data"""
+    media_type = "application/x-ndjson"
+
+    def begin(self) -> bytes:
+        return b""
+
+    def encode(self, rows: List[Row]) -> bytes:
+        option = orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE
+        return b"".join(orjson.dumps(message_row_to_dict(row), option=option) for row in rows)
+
+    def end(self) -> bytes:
+        return b""
+
+
+class CsvEncoder:
+    """
+    RFC 4180 CSV with a header row. CSV has no NULL, so a missing
+    client_timestamp is written empty and an empty one imports back as missing.
+    """
+    media_type = "text/csv; charset=utf-8"
+
+    def begin(self) -> bytes:
+        return self._write([IMPORT_COLUMNS])
+
+    def encode(self, rows: List[Row]) -> bytes:
+        return self._write(
+            (message_id, message, client_timestamp, server_timestamp.isoformat(), source)
+            for message_id, message, client_timestamp, server_timestamp, source in rows
+        )
+
+    def end(self) -> bytes:
+        return b""
+
+    @staticmethod
+    def _write(rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only file handed to ParquetWriter; collects bytes until taken"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ParquetEncoder:
+    """Parquet file with one zstd row group per cursor batch, written as it goes"""
+    media_type = "application/vnd.apache.parquet"
+
+    def __init__(self):
+        self.schema = pa.schema([
+            ("id", pa.int64()),
+            ("message", pa.string()),
+            ("client_timestamp", pa.string()),
+            # SQLite hands out naive UTC, which pyarrow stores as is
+            ("server_timestamp", pa.timestamp("us", tz="UTC")),
+            ("source", pa.string()),
+        ])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def begin(self) -> bytes:
+        return self.sink.take()
+
+    def encode(self, rows: List[Row]) -> bytes:
+        columns = list(zip(*rows))
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        return self.sink.take()
+
+    def end(self) -> bytes:
+        self.writer.close()
+        return self.sink.take()
+
+
+ENCODERS = {
+    "ndjson": NdjsonEncoder,
+    "csv": CsvEncoder,
+    "parquet": ParquetEncoder,
+}
+
+
+def _require_parquet(transfer_format: str) -> None:
+    if transfer_format == "parquet" and pq is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Формат parquet недоступен: на сервере не установлен pyarrow"
+        )
+
+
+def _export_chunks_sync(filters: dict, encoder) -> Iterator[bytes]:
+    """Encoded chunks from a server-side cursor of a sync session"""
+    db = SessionLocal()
+    try:
+        yield encoder.begin()
+        result = db.execute(
+            message_crud.export_statement(db, **filters),
+            execution_options={"yield_per": conf.EXPORT_BATCH_SIZE}
+        )
+        for rows in result.partitions():
+            yield encoder.encode(rows)
+        yield encoder.end()
+    finally:
+        db.close()
+
+
+async def _export_chunks_async(filters: dict, encoder) -> AsyncIterator[bytes]:
+    """Encoded chunks from a server-side cursor of an async session"""
+    async with AsyncSessionLocal() as db:
+        yield encoder.begin()
+        result = await db.stream(
+            message_crud.export_statement(db, **filters),
+            execution_options={"yield_per": conf.EXPORT_BATCH_SIZE}
+        )
+        async for rows in result.partitions():
+            yield encoder.encode(rows)
+        yield encoder.end()
+
+
+async def _export_chunks(filters: dict, encoder) -> AsyncIterator[bytes]:
+    try:
+        if conf.DB_ASYNC:
+            async for chunk in _export_chunks_async(filters, encoder):
+                if chunk:
+                    yield chunk
+        else:
+            chunks = _export_chunks_sync(filters, encoder)
+            try:
+                # Fetching and encoding run on worker threads, one batch at a time
+                async for chunk in iterate_in_threadpool(chunks):
+                    if chunk:
+                        yield chunk
+            finally:
+                # Releases the cursor and session if the client went away mid-stream
+                await run_in_threadpool(chunks.close)
+    except Exception as e:
+        logger.error(f"Ошибка экспорта сообщений: {e}")
+        raise
+
+
+@router.get("/export")
+async def export_messages(
+    export_format: TransferFormat = Query("ndjson", alias="format"),
+    after_id: Optional[int] = Query(None, ge=0),
+    before_id: Optional[int] = Query(None, ge=1),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None)
+):
+    """
+    Stream messages oldest first as NDJSON, CSV or Parquet.
+
+    Rows are read from a server-side cursor EXPORT_BATCH_SIZE at a time, so
+    memory use does not grow with the table. Optional filters: id range
+    (after_id, before_id) and server_timestamp range [since, until).
+    The output loads back through POST /api/import.
+    """
+    _require_parquet(export_format)
+    encoder = ENCODERS[export_format]()
+    filters = {"after_id": after_id, "before_id": before_id, "since": since, "until": until}
+    filename = f"messages-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{export_format}"
+    return StreamingResponse(
+        _export_chunks(filters, encoder),
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def _import_row(record: dict, preserve_ids: bool) -> ImportRow:
+    """Validate one decoded record; raises ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError("ожидался объект")
+    message = record.get("message")
+    if not isinstance(message, str):
+        raise ValueError("нет текста сообщения")
+    message_id = record.get("id")
+    if preserve_ids:
+        if message_id is None:
+            raise ValueError("нет id (передайте preserve_ids=false, чтобы назначить новые)")
+        if isinstance(message_id, str) and message_id.isascii() and message_id.isdigit():
+            message_id = int(message_id)
+        elif not isinstance(message_id, int) or isinstance(message_id, bool):
+            raise ValueError("id должен быть целым числом")
+    client_timestamp = record.get("client_timestamp")
+    if client_timestamp is not None and not isinstance(client_timestamp, str):
+        raise ValueError("client_timestamp должен быть строкой")
+    server_timestamp = record.get("server_timestamp")
+    if isinstance(server_timestamp, str):
+        server_timestamp = datetime.fromisoformat(server_timestamp)
+    elif server_timestamp is not None and not isinstance(server_timestamp, datetime):
+        raise ValueError("server_timestamp должен быть датой ISO 8601")
+    return message_id, message, client_timestamp, server_timestamp, record.get("source") or None
+
+
+def _read_ndjson(file: BinaryIO, preserve_ids: bool) -> Iterator[ImportRow]:
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield _import_row(orjson.loads(line), preserve_ids)
+        except ValueError as e:
+            raise ImportFormatError(f"Строка {number}: {e}")
+
+
+# Columns whose empty CSV fields are read as missing values
+CSV_NULLABLE = ("id", "client_timestamp", "server_timestamp", "source")
+
+
+def _read_csv(file: BinaryIO, preserve_ids: bool) -> Iterator[ImportRow]:
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    try:
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None or "message" not in reader.fieldnames:
+            raise ImportFormatError("В заголовке CSV нет столбца message")
+        for record in reader:
+            for key in CSV_NULLABLE:
+                if record.get(key) == "":
+                    record[key] = None
+            try:
+                yield _import_row(record, preserve_ids)
+            except ValueError as e:
+                raise ImportFormatError(f"Строка {reader.line_num}: {e}")
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(f"Файл не в кодировке UTF-8: {e}")
+    finally:
+        # Leave the spooled file open for the caller to close
+        text.detach()
+
+
+def _read_parquet(file: BinaryIO, preserve_ids: bool) -> Iterator[ImportRow]:
+    try:
+        batches = pq.ParquetFile(file).iter_batches(batch_size=conf.IMPORT_CHUNK_SIZE)
+    except pa.ArrowException as e:
+        raise ImportFormatError(f"Некорректный файл Parquet: {e}")
+    number = 0
+    for batch in batches:
+        for record in batch.to_pylist():
+            number += 1
+            try:
+                yield _import_row(record, preserve_ids)
+            except ValueError as e:
+                raise ImportFormatError(f"Запись {number}: {e}")
+
+
+READERS = {
+    "ndjson": _read_ndjson,
+    "csv": _read_csv,
+    "parquet": _read_parquet,
+}
+
+
+@router.post("/import", response_model=MessageImportResponse, status_code=status.HTTP_201_CREATED)
+async def import_messages(
+    request: Request,
+    import_format: TransferFormat = Query("ndjson", alias="format"),
+    preserve_ids: bool = Query(True),
+    db: DBSession = Depends(get_session)
+):
+    """
+    Load a file produced by GET /api/export (the raw request body) in one transaction.
+
+    Postgres receives the rows through COPY FROM STDIN, SQLite through large
+    executemany chunks. With preserve_ids=true (the default) message ids are
+    kept and clashing ids fail the whole import with 409; pass false to
+    append the messages with new ids.
+    """
+    _require_parquet(import_format)
+    # Buffer the upload before touching the database so no connection waits on the network
+    spool = tempfile.SpooledTemporaryFile(max_size=conf.IMPORT_SPOOL_MEMORY_BYTES)
+    rows = READERS[import_format](spool, preserve_ids)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        imported = await async_message_crud.import_messages(
+            db, rows, preserve_ids, conf.IMPORT_CHUNK_SIZE
+        )
+    except ImportFormatError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except IntegrityError as e:
+        logger.error(f"Ошибка импорта сообщений: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Сообщения с такими id уже есть в базе (передайте preserve_ids=false)"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка импорта сообщений: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при импорте сообщений"
+        )
+    finally:
+        # A failed import leaves the reader suspended; finish it before its file goes
+        rows.close()
+        spool.close()
+
+    await response_cache.invalidate()
+    record_ingested("import", imported)
+    logger.info(f"Imported {imported} messages ({import_format})")
+    return MessageImportResponse(status="success", imported_count=imported)
@@ -1,48 +1,81 @@
 #include <Wire.h>
 
 
-int redPin = 6;    
-int greenPin = 5;  
-int bluePin = 3;   
+int redPin = 6;
+int greenPin = 5;
+int bluePin = 3;
 
 
-const unsigned long DOT_DURATION = 500;         
+const unsigned long DOT_DURATION = 500;
 
 
+// Сообщение хранится готовой последовательностью цветов: 2 бита на символ
+// (1 — красный, 2 — синий, 3 — зелёный), символ i в битах 2*(i%4) байта i/4.
+// MinBackend присылает её кадром: 0x02, число символов (2 байта, младший
+// первым), упакованные символы, XOR всех байтов после 0x02. Кадр целиком
+// помещается в 64-байтный приёмный буфер, пока горит очередной символ.
+// Линейный код (Морзе или другой из LineCodec) выбирает MinBackend: прошивка
+// кадр не разбирает, а только зажигает цвета
+const byte FRAME_START = 0x02;
+const int MAX_FRAME_SYMBOLS = 224;
+const int MAX_FRAME_BYTES = MAX_FRAME_SYMBOLS / 4;
+
+struct Frame {
+  uint16_t length;
+  byte symbols[MAX_FRAME_BYTES];
+};
+
 
 const int MAX_QUEUE_SIZE = 10;
-String messageQueue[MAX_QUEUE_SIZE];
+// Кольцевой буфер сообщений, ожидающих воспроизведения: место освобождается,
+// как только сообщение начинает воспроизводиться
+Frame messageQueue[MAX_QUEUE_SIZE];
+int queueHead = 0;
 int queueSize = 0;
-int currentIndex = 0;
 bool isPlaying = false;
-String currentMorseCode = "";
-String currentOriginalMessage = "";
+Frame current;
+bool hasCurrent = false;
+// Принимаемое сообщение (кадр или введённый текст)
+Frame incoming;
+
+
+// Коды букв A-Z по индексу (c - 'A'), пробел отдельно
+const char* const morseAlphabet[26] = {
+  "12", "2111", "2121", "211", "1",
+  "1121", "221", "1111", "11", "1222",
+  "212", "1211", "22", "21", "222",
+  "1221", "2212", "121", "111", "2",
+  "112", "1112", "122", "2112", "2122", "2211"
+};
+const char* const MORSE_SPACE = "2222";
 
 
-struct MorseEntry {
-  char letter;
-  const char* code;
-};
+const char* getMorseCode(char c) {
+  if (c >= 'A' && c <= 'Z') return morseAlphabet[c - 'A'];
+  if (c == ' ') return MORSE_SPACE;
+  return "";
+}
 
 
-MorseEntry morseAlphabet[] = {
-  {'A',"12"}, {'B',"2111"}, {'C',"2121"}, {'D',"211"}, {'E',"1"},
-  {'F',"1121"}, {'G',"221"}, {'H',"1111"}, {'I',"11"}, {'J',"1222"},
-  {'K',"212"}, {'L',"1211"}, {'M',"22"}, {'N',"21"}, {'O',"222"},
-  {'P',"1221"}, {'Q',"2212"}, {'R',"121"}, {'S',"111"}, {'T',"2"},
-  {'U',"112"}, {'V',"1112"}, {'W',"122"}, {'X',"2112"}, {'Y',"2122"}, {'Z',"2211"},
-  {' ', "2222"} 
-};
-const int morseSize = sizeof(morseAlphabet)/sizeof(morseAlphabet[0]);
+byte symbolAt(const Frame &frame, int i) {
+  return (frame.symbols[i >> 2] >> ((i & 3) * 2)) & 3;
+}
 
 
-String getMorseCode(char c) {
-  for (int i=0; i<morseSize; i++) {
-    if (morseAlphabet[i].letter == c) {
-      return String(morseAlphabet[i].code);
-    }
+bool appendSymbol(Frame &frame, byte symbol) {
+  if (frame.length >= MAX_FRAME_SYMBOLS) return false;
+  int i = frame.length++;
+  if ((i & 3) == 0) frame.symbols[i >> 2] = 0;
+  frame.symbols[i >> 2] |= symbol << ((i & 3) * 2);
+  return true;
+}
+
+
+bool appendCode(Frame &frame, const char* code) {
+  for (; *code; code++) {
+    if (!appendSymbol(frame, *code - '0')) return false;
   }
-  return "";
+  return true;
 }
 
 
@@ -59,134 +92,161 @@ void setLEDColor(int color) {
 }
 
 
-String textToMorseCode(String text) {
-  String result = "";
-  text.toUpperCase();
-
-  Serial.println("=== Соответствие букв и кодов Морзе ===");
-
-  
-  result += "333"; 
+// Текст, введённый вручную (монитор порта): то же, что делает codec.py на хосте
+bool textToFrame(const String &text, Frame &frame) {
+  frame.length = 0;
+  if (!appendCode(frame, "333")) return false;
 
   for(int i = 0; i < text.length(); i++){
     char c = text[i];
-    String code = getMorseCode(c);
-    if (code.length() > 0) {
-      Serial.print(c); 
-      Serial.print(" - "); 
-      Serial.println(code);
-      result += code;
-
-      
-      if(c != ' ' && i < text.length() - 1 && text[i+1] != ' ') {
-        result += "3"; 
-      }
+    if (!appendCode(frame, getMorseCode(c))) return false;
+    if(c != ' ' && i < text.length() - 1 && text[i+1] != ' ') {
+      if (!appendSymbol(frame, 3)) return false;
     }
   }
-
-  
-  Serial.println("================================");
-  return result;
+  return true;
 }
 
 
-void addToQueue(String message) {
+void addToQueue(const Frame &frame) {
   if (queueSize < MAX_QUEUE_SIZE) {
-    messageQueue[queueSize] = message;
+    messageQueue[(queueHead + queueSize) % MAX_QUEUE_SIZE] = frame;
     queueSize++;
-    Serial.print("Сообщение добавлено в очередь. В очереди: ");
+    Serial.print(F("Сообщение добавлено в очередь. В очереди: "));
     Serial.println(queueSize);
-    
-    
+
+
     if (!isPlaying) {
       startNextMessage();
     }
   } else {
-    Serial.println("Очередь переполнена! Сообщение не добавлено.");
+    Serial.println(F("Очередь переполнена! Сообщение не добавлено."));
   }
 }
 
 
 void startNextMessage() {
-  if (currentIndex < queueSize) {
-    String message = messageQueue[currentIndex];
-    currentOriginalMessage = message;
-    currentMorseCode = textToMorseCode(message);
+  if (queueSize > 0) {
+    current = messageQueue[queueHead];
+    queueHead = (queueHead + 1) % MAX_QUEUE_SIZE;
+    queueSize--;
+    hasCurrent = true;
     isPlaying = true;
-    
-    Serial.print("Начинаем воспроизведение: ");
-    Serial.println(message);
-    Serial.print("Осталось в очереди: ");
-    Serial.println(queueSize - currentIndex - 1);
+
+    Serial.print(F("Начинаем воспроизведение: "));
+    Serial.print(current.length);
+    Serial.println(F(" символов"));
+    Serial.print(F("Осталось в очереди: "));
+    Serial.println(queueSize);
   } else {
-    
-    if (currentOriginalMessage != "") {
-      Serial.println("Очередь пуста. Повтор последнего сообщения...");
+
+    if (hasCurrent) {
+      Serial.println(F("Очередь пуста. Повтор последнего сообщения..."));
       isPlaying = true;
     } else {
       isPlaying = false;
-      Serial.println("Нет сообщений для воспроизведения.");
+      Serial.println(F("Нет сообщений для воспроизведения."));
+    }
+  }
+}
+
+
+// Кадр от MinBackend: байт FRAME_START уже прочитан
+void readFrame() {
+  Frame &frame = incoming;
+  byte header[2];
+  if (Serial.readBytes(header, 2) != 2) {
+    Serial.println(F("Ошибка: повреждённый кадр (нет длины)"));
+    return;
+  }
+  frame.length = header[0] | (header[1] << 8);
+  int size = (frame.length + 3) / 4;
+  byte checksum = header[0] ^ header[1];
+  byte expected = 0;
+
+  if (frame.length == 0 || frame.length > MAX_FRAME_SYMBOLS
+      || Serial.readBytes(frame.symbols, size) != size
+      || Serial.readBytes(&expected, 1) != 1) {
+    Serial.println(F("Ошибка: повреждённый кадр (длина)"));
+    while (Serial.available() > 0) Serial.read();
+    return;
+  }
+  for (int i = 0; i < size; i++) {
+    checksum ^= frame.symbols[i];
+  }
+  if (checksum != expected) {
+    Serial.println(F("Ошибка: повреждённый кадр (контрольная сумма)"));
+    return;
+  }
+  addToQueue(frame);
+}
+
+
+// Одно сообщение за вызов: остальные ждут в буфере порта до следующего,
+// так что сообщения, отправленные подряд, не склеиваются и не теряются
+void readSerialInput(bool duringPlayback) {
+  if (Serial.available() == 0) return;
+
+  if (Serial.peek() == FRAME_START) {
+    Serial.read();
+    readFrame();
+    return;
+  }
+
+  String inputWord = Serial.readStringUntil('\n');
+  inputWord.trim();
+  if (inputWord.length() == 0) return;
+
+  inputWord.toUpperCase();
+  String cleanWord = "";
+  for(int i = 0; i < inputWord.length(); i++) {
+    char c = inputWord[i];
+    if((c >= 'A' && c <= 'Z') || c == ' ') {
+      cleanWord += c;
+    }
+  }
+
+  if(cleanWord.length() > 0){
+    if (duringPlayback) {
+      Serial.print(F("Новое сообщение получено во время воспроизведения: "));
+    } else {
+      Serial.print(F("Получено слово: "));
+    }
+    Serial.println(cleanWord);
+    if (textToFrame(cleanWord, incoming)) {
+      addToQueue(incoming);
+    } else {
+      Serial.println(F("Ошибка: сообщение слишком длинное"));
     }
+  } else {
+    Serial.println(F("Ошибка: введите только буквы A-Z и пробелы"));
   }
 }
 
 
 void playMorseSequence() {
-  if (currentMorseCode == "") return;
-  
-  for (int i = 0; i < currentMorseCode.length(); i++) {
-    char symbol = currentMorseCode[i];
-    int color = (symbol == ' ') ? 0 : (symbol - '0');
-    
+  if (!hasCurrent) return;
+
+  for (int i = 0; i < current.length; i++) {
+    int color = symbolAt(current, i);
+
     if(color > 0) {
       setLEDColor(color);
       delay(DOT_DURATION);
       setLEDColor(0); // выключить
     }
-    
-    
-    if (Serial.available() > 0) {
-      String inputWord = Serial.readString();
-      inputWord.trim();
-      
-      while(Serial.available() > 0) {
-        Serial.read();
-      }
-      
-      if(inputWord.length() > 0){
-        inputWord.toUpperCase();
-        String cleanWord = "";
-        for(int i = 0; i < inputWord.length(); i++) {
-          char c = inputWord[i];
-          if((c >= 'A' && c <= 'Z') || c == ' ') {
-            cleanWord += c;
-          }
-        }
-        
-        if(cleanWord.length() > 0){
-          Serial.print("Новое сообщение получено во время воспроизведения: ");
-          Serial.println(cleanWord);
-          addToQueue(cleanWord);
-        }
-      }
-    }
+
+
+    readSerialInput(true);
   }
-  
- 
-  currentIndex++;
-  
-  if (currentIndex < queueSize) {
-    
+
+
+  if (queueSize > 0) {
+
     startNextMessage();
-  } else if (queueSize > 0) {
-    
-    currentIndex = queueSize - 1;
-    Serial.println("Повтор последнего сообщения...");
   } else {
-    
-    isPlaying = false;
-    currentMorseCode = "";
-    currentOriginalMessage = "";
+
+    Serial.println(F("Повтор последнего сообщения..."));
   }
 }
 
@@ -199,46 +259,20 @@ void setup() {
   while (!Serial) { ; }
 
   Serial.println();
-  Serial.println("Передатчик Morse готов!");
-  Serial.println("Введите слово для кодирования в Морзе:");
-  Serial.println("Сообщения добавляются в очередь и воспроизводятся по порядку");
+  Serial.println(F("Передатчик Morse готов!"));
+  Serial.println(F("Введите слово для кодирования в Морзе:"));
+  Serial.println(F("Сообщения добавляются в очередь и воспроизводятся по порядку"));
 }
 
 void loop() {
-  
-  if (Serial.available() > 0) {
-    String inputWord = Serial.readString();
-    inputWord.trim();
-    
-    while(Serial.available() > 0) {
-      Serial.read();
-    }
-    
-    if(inputWord.length() > 0){
-      inputWord.toUpperCase();
-      String cleanWord = "";
-      for(int i = 0; i < inputWord.length(); i++) {
-        char c = inputWord[i];
-        if((c >= 'A' && c <= 'Z') || c == ' ') {
-          cleanWord += c;
-        }
-      }
-      
-      if(cleanWord.length() > 0){
-        Serial.print("Получено слово: ");
-        Serial.println(cleanWord);
-        addToQueue(cleanWord);
-      } else {
-        Serial.println("Ошибка: введите только буквы A-Z и пробелы");
-      }
-    }
-  }
 
-  
-  if (isPlaying && currentMorseCode != "") {
+  readSerialInput(false);
+
+
+  if (isPlaying && hasCurrent) {
     playMorseSequence();
   } else if (queueSize > 0) {
-    
+
     startNextMessage();
   }
-}
\ No newline at end of file
+}
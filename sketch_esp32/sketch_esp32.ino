@@ -20,6 +20,12 @@ const unsigned long READ_INTERVAL = 500;
 bool isRecording = false;
 int greenCount = 0;
 
+// Режим сырых отсчётов: вместо декодирования на плате выводятся строки
+// SAMPLE:<millis>,<r>,<g>,<b>,<c>, которые декодирует SoftEsp32/Client/decoder.py
+const bool RAW_SAMPLES = false;
+const unsigned long SAMPLE_INTERVAL = 25;
+unsigned long lastSampleTime = 0;
+
 String decodeMorseSequence(String seq) {
     String morseAlphabet[26] = {
     "12","2111","2121","211","1","1121","221","1111","11","1222",
@@ -95,7 +101,8 @@ void setRGBColor(int color) {
 }
 
 void setup() {
-  Serial.begin(9600);
+  // 40 строк SAMPLE в секунду не помещаются в 9600 бод
+  Serial.begin(RAW_SAMPLES ? 115200 : 9600);
   Wire.begin();
   
   pinMode(redPin, OUTPUT);
@@ -105,6 +112,9 @@ void setup() {
   setRGBColor(0);
 
   if (tcs.begin()) {
+    if (RAW_SAMPLES) {
+      tcs.setIntegrationTime(TCS34725_INTEGRATIONTIME_24MS);
+    }
     Serial.println("READY");
   } else {
     Serial.println("ERROR");
@@ -116,6 +126,17 @@ void setup() {
 
 void loop() {
   unsigned long currentTime = millis();
+
+  if (RAW_SAMPLES) {
+    if (currentTime - lastSampleTime >= SAMPLE_INTERVAL) {
+      uint16_t red, green, blue, clear;
+      tcs.getRawData(&red, &green, &blue, &clear);
+      Serial.printf("SAMPLE:%lu,%u,%u,%u,%u\n", currentTime, red, green, blue, clear);
+      lastSampleTime = currentTime;
+    }
+    return;
+  }
+
   if (currentTime - lastReadTime >= READ_INTERVAL) {
     uint16_t red, green, blue, clear;
     tcs.getRawData(&red, &green, &blue, &clear);